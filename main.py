@@ -2,19 +2,24 @@
 
 import os
 from pathlib import Path
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import RedirectResponse, StreamingResponse
 import gradio as gr
-from src.ui import build_ui
+from src.ui import MOUNT_TAKES_HEAD, build_ui, pipeline
+from src.constants import CATALOG_WARMING, PROJECT_NAME
+from src.packaging import stream_zip
+from src.static import PrecompressedStaticFiles
+from src.store import get_stores
+from src.workspace import is_valid_job_id
 
 # Create FastAPI app with custom docs URLs
 app = FastAPI(
     docs_url="/api-docs", redoc_url="/api-redoc", openapi_url="/api-openapi.json"
 )
 
-# Get docs path
+# Get docs and assets paths
 docs_path = Path(__file__).parent / "docs"
+assets_path = Path(__file__).parent / "assets"
 
 
 # Add redirect from /docs to /docs/ (must come BEFORE mounting)
@@ -24,15 +29,61 @@ async def redirect_to_docs():
     return RedirectResponse(url="/docs/")
 
 
-# Mount your documentation
+@app.get("/download/{job_id}.zip")
+async def download_archive(job_id: str):
+    """Stream every file of a job as a ZIP archive built on the fly."""
+    if not is_valid_job_id(job_id):
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    # Any worker sharing the stores can serve any job's files
+    paths = get_stores()[1].paths(job_id)
+    if not paths:
+        raise HTTPException(status_code=404, detail="No files for this job")
+
+    filename = f"{PROJECT_NAME}_{job_id}.zip"
+    return StreamingResponse(
+        stream_zip(paths),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Report a job's status, progress stage and result from the shared store."""
+    job = get_stores()[0].get_job(job_id) if is_valid_job_id(job_id) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+# Mount your documentation, precompressed and served with ETags
 if docs_path.exists():
-    app.mount("/docs", StaticFiles(directory=str(docs_path), html=True), name="docs")
+    app.mount(
+        "/docs",
+        PrecompressedStaticFiles(directory=str(docs_path), html=True),
+        name="docs",
+    )
+
+# Serve the stylesheet as a cacheable file instead of inlining it in every page
+head = ""
+if assets_path.exists():
+    assets = PrecompressedStaticFiles(directory=str(assets_path))
+    app.mount("/assets", assets, name="assets")
+    if (assets_path / "styles.css").exists():
+        stylesheet = assets.versioned_url("styles.css", "/assets")
+        head = f'<link rel="stylesheet" href="{stylesheet}">'
 
 # Build Gradio UI
-demo = build_ui()
+demo = build_ui(head)
+
+# Generate popular specs in the background while the server is idle
+if CATALOG_WARMING:
+    pipeline.warmer.start()
 
 # Mount Gradio to the root path (this should come LAST)
-app = gr.mount_gradio_app(app, demo, path="")
+options = {"head": head} if MOUNT_TAKES_HEAD else {}
+app = gr.mount_gradio_app(app, demo, path="", **options)
 
 # Main application entry point
 if __name__ == "__main__":
@@ -0,0 +1,244 @@
+"""Offline batch completions: many prompts in one job file, at batch prices.
+
+Requests go to the Batch API in files of up to BATCH_MAX_REQUESTS lines.
+Each file is polled on its own, so results reach the caller batch by
+batch. LocalBatchServer stands in for the API in tests.
+"""
+
+import itertools
+import json
+import threading
+from types import SimpleNamespace
+from .cancellation import JobCancelled
+from .constants import (
+    BATCH_COMPLETION_WINDOW,
+    BATCH_MAX_REQUESTS,
+    BATCH_POLL_SECONDS,
+    MAX_TOKENS,
+    OPENAI_MODEL,
+    logger,
+)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Batch states after which nothing more will be processed
+FINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request(custom_id, system_message, prompt, max_tokens=MAX_TOKENS):
+    """Build one line of a batch file: a chat completion request."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": max_tokens,
+        },
+    }
+
+
+def parse_results(text):
+    """Parse a batch output or error file into {custom_id: result}.
+
+    Each result has the reply "content" (None on error), "error" and the
+    call's token "usage".
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        error = record.get("error") or body.get("error")
+        content = None
+        if not error and response.get("status_code") == 200:
+            content = body["choices"][0]["message"]["content"]
+        usage = body.get("usage") or {}
+        results[record["custom_id"]] = {
+            "content": content,
+            "error": (error or {}).get("message") if content is None else None,
+            "usage": {
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "batch": True,
+            },
+        }
+    return results
+
+
+def submit_batch(client, requests):
+    """Upload a batch file of requests and start it; return the batch id."""
+    data = "".join(json.dumps(request) + "\n" for request in requests).encode()
+    batch_file = client.files.create(file=("batch.jsonl", data), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    logger.info("📨 Submitted batch %s with %d request(s)", batch.id, len(requests))
+    return batch.id
+
+
+def collect_results(client, batch, custom_ids):
+    """Download a finished batch's results; requests without one get an error."""
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            results.update(parse_results(client.files.content(file_id).text))
+    for custom_id in custom_ids:
+        results.setdefault(
+            custom_id,
+            {
+                "content": None,
+                "error": f"Batch {batch.id} ended as {batch.status}",
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "batch": True},
+            },
+        )
+    return results
+
+
+def run_batches(
+    client,
+    requests,
+    on_result,
+    batch_size=BATCH_MAX_REQUESTS,
+    poll_seconds=BATCH_POLL_SECONDS,
+    cancel_token=None,
+):
+    """Submit requests in batches and pass each result to on_result.
+
+    on_result(custom_id, result) is called as each batch finishes (see
+    parse_results for the result fields). Cancelling cancel_token, an
+    interrupt or a failed submission cancels the unfinished batches;
+    cancelling raises JobCancelled.
+    """
+    pending = {}
+    wake = threading.Event()
+    unregister = cancel_token.register(wake.set) if cancel_token else None
+    try:
+        # A failed submission cancels the batches already submitted too
+        for start in range(0, len(requests), batch_size):
+            chunk = requests[start : start + batch_size]
+            pending[submit_batch(client, chunk)] = [r["custom_id"] for r in chunk]
+
+        while pending:
+            for batch_id in list(pending):
+                batch = client.batches.retrieve(batch_id)
+                if batch.status not in FINAL_STATES:
+                    continue
+                logger.info("📬 Batch %s %s", batch_id, batch.status)
+                results = collect_results(client, batch, pending.pop(batch_id))
+                for custom_id, result in results.items():
+                    on_result(custom_id, result)
+            if pending and wake.wait(poll_seconds):
+                raise JobCancelled("Batch run was cancelled.")
+    except BaseException:
+        # Cancelled or interrupted: don't pay for replies nobody will use
+        for batch_id in pending:
+            try:
+                client.batches.cancel(batch_id)
+            except Exception as e:
+                logger.warning("Could not cancel batch %s: %s", batch_id, e)
+        raise
+    finally:
+        if unregister:
+            unregister()
+
+
+class LocalBatchServer:
+    """In-process stand-in for the Batch API's files and batches endpoints.
+
+    respond(body) returns the reply content for a request body, or raises
+    to make that request fail. A batch completes on its polls_until_done-th
+    status check.
+    """
+
+    def __init__(self, respond, polls_until_done=1):
+        """Initialize with no files or batches."""
+        self.respond = respond
+        self.polls_until_done = polls_until_done
+        self.stored = {}
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self.files = SimpleNamespace(create=self.create_file, content=self.content)
+        self.batches = SimpleNamespace(
+            create=self.create_batch, retrieve=self.retrieve, cancel=self.cancel
+        )
+
+    def create_file(self, file, purpose):
+        """Store an uploaded (name, bytes) file."""
+        file_id = f"file-{next(self._ids)}"
+        self.stored[file_id] = file[1].decode()
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def content(self, file_id):
+        """Return a stored file's text."""
+        return SimpleNamespace(text=self.stored[file_id])
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        """Start a batch over an uploaded file."""
+        batch = SimpleNamespace(
+            id=f"batch-{next(self._ids)}",
+            status="in_progress",
+            input_file_id=input_file_id,
+            output_file_id=None,
+            error_file_id=None,
+            polls=0,
+        )
+        self.jobs[batch.id] = batch
+        return batch
+
+    def retrieve(self, batch_id):
+        """Return a batch, running its requests once enough polls happened."""
+        batch = self.jobs[batch_id]
+        batch.polls += 1
+        if batch.status == "in_progress" and batch.polls >= self.polls_until_done:
+            self.process(batch)
+        return batch
+
+    def cancel(self, batch_id):
+        """Cancel an unfinished batch."""
+        batch = self.jobs[batch_id]
+        if batch.status not in FINAL_STATES:
+            batch.status = "cancelled"
+        return batch
+
+    def process(self, batch):
+        """Answer every request of a batch into output and error files."""
+        output, errors = [], []
+        for line in self.stored[batch.input_file_id].splitlines():
+            request = json.loads(line)
+            record = {"id": f"req-{next(self._ids)}", "custom_id": request["custom_id"]}
+            try:
+                content = self.respond(request["body"])
+            except Exception as e:
+                errors.append(
+                    {**record, "response": None, "error": {"message": str(e)}}
+                )
+                continue
+            prompt_tokens = sum(len(m["content"]) for m in request["body"]["messages"])
+            body = {
+                "choices": [{"index": 0, "message": {"content": content}}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens // 4,
+                    "completion_tokens": len(content) // 4,
+                },
+            }
+            response = {"status_code": 200, "body": body}
+            output.append({**record, "response": response, "error": None})
+
+        for records, attribute in (
+            (output, "output_file_id"),
+            (errors, "error_file_id"),
+        ):
+            if records:
+                file_id = f"file-{next(self._ids)}"
+                self.stored[file_id] = "".join(json.dumps(r) + "\n" for r in records)
+                setattr(batch, attribute, file_id)
+        batch.status = "completed"
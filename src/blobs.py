@@ -0,0 +1,231 @@
+"""Content-addressed storage of dataset files, shared by every job.
+
+Each distinct file content is stored once, as a read-only blob named by
+its SHA-256. Job files are hard links (or reflinks, or as a last resort
+copies) of their blob, and a SQLite index counts the job files pointing
+at each blob. Unreferenced blobs stay as a cache for identical outputs
+until the store grows past its size limit.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import stat
+import time
+from contextlib import closing
+from .constants import BLOB_STORE_MAX_BYTES, ZIP_CHUNK_BYTES, logger
+
+try:
+    import fcntl
+except ImportError:  # Windows has no ioctl
+    fcntl = None
+
+# Linux ioctl that makes a file share another's extents (btrfs, XFS)
+FICLONE = 0x40049409
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(ZIP_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(source, destination):
+    """Clone a file's extents into a new file; raise OSError if unsupported."""
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+
+
+def deliver(source, destination):
+    """Place a copy of a file at destination as cheaply as possible.
+
+    Tries a hard link, then a reflink, then a plain copy. Returns the
+    method used.
+    """
+    try:
+        os.link(source, destination)
+        return "link"
+    except OSError:
+        pass
+    try:
+        reflink(source, destination)
+        return "reflink"
+    except OSError:
+        shutil.copyfile(source, destination)
+        return "copy"
+
+
+def unshare(path):
+    """Give a file its own copy before it is modified in place.
+
+    A hard link to a blob would otherwise change every job sharing it.
+    """
+    if os.stat(path).st_nlink > 1:
+        temporary = f"{path}.{os.getpid()}.unshare"
+        shutil.copyfile(path, temporary)
+        os.replace(temporary, path)
+
+
+class BlobStore:
+    """Blobs under root/<2 hex>/<sha256>, indexed in root/index.sqlite3."""
+
+    def __init__(self, root, max_bytes=BLOB_STORE_MAX_BYTES):
+        """Open (and create if needed) the store at root."""
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL DEFAULT 0,
+                    last_used REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS refs (
+                    job_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (job_id, name)
+                );
+                CREATE INDEX IF NOT EXISTS blobs_unused ON blobs (refcount, last_used);
+                """
+            )
+
+    def _connect(self):
+        """Open a connection; one per call keeps threads and processes apart."""
+        return sqlite3.connect(
+            os.path.join(self.root, "index.sqlite3"), timeout=30, isolation_level=None
+        )
+
+    def blob_path(self, digest):
+        """Return where the blob of a digest is stored."""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def add(self, job_id, path):
+        """Store a job file by content and make it a link to its blob.
+
+        Returns the file's digest. If the content is already stored, the
+        file is replaced by a link to the existing blob, freeing its space.
+        """
+        digest = file_digest(path)
+        name = os.path.basename(path)
+        size = os.path.getsize(path)
+
+        # Take the reference first so eviction can't remove the blob meanwhile
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, last_used) "
+                "VALUES (?, ?, ?)",
+                (digest, size, time.time()),
+            )
+            previous = db.execute(
+                "SELECT digest FROM refs WHERE job_id = ? AND name = ?",
+                (job_id, name),
+            ).fetchone()
+            if previous is None or previous[0] != digest:
+                db.execute(
+                    "INSERT OR REPLACE INTO refs (job_id, name, digest) "
+                    "VALUES (?, ?, ?)",
+                    (job_id, name, digest),
+                )
+                db.execute(
+                    "UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?",
+                    (digest,),
+                )
+            if previous is not None and previous[0] != digest:
+                # The file was rewritten since it was stored (e.g. extended)
+                db.execute(
+                    "UPDATE blobs SET refcount = MAX(refcount - 1, 0) WHERE digest = ?",
+                    previous,
+                )
+            db.execute(
+                "UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), digest)
+            )
+            db.execute("COMMIT")
+
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            if not os.path.samefile(blob, path):
+                # Same content as a stored blob: keep one copy on disk
+                temporary = f"{path}.{os.getpid()}.dedup"
+                method = deliver(blob, temporary)
+                os.replace(temporary, path)
+                logger.info("🔗 %s deduplicated (%s of %s)", name, method, digest[:12])
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            temporary = f"{blob}.{os.getpid()}.tmp"
+            deliver(path, temporary)
+            # Blobs are shared by every job linking them: never write in place
+            os.chmod(temporary, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(temporary, blob)
+            self.evict()
+        return digest
+
+    def release(self, job_id):
+        """Drop every reference of a job; its blobs may now be evicted."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                "DELETE FROM refs WHERE job_id = ? RETURNING digest", (job_id,)
+            ).fetchall()
+            for (digest,) in rows:
+                db.execute(
+                    "UPDATE blobs SET refcount = MAX(refcount - 1, 0) WHERE digest = ?",
+                    (digest,),
+                )
+            db.execute("COMMIT")
+        return len(rows)
+
+    def total_bytes(self):
+        """Return the size of every stored blob."""
+        with closing(self._connect()) as db:
+            return db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self):
+        """Delete least recently used unreferenced blobs down to max_bytes.
+
+        Referenced blobs are never evicted. Returns the bytes freed.
+        """
+        freed = 0
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            excess = total - self.max_bytes
+            victims = []
+            if excess > 0:
+                for digest, size in db.execute(
+                    "SELECT digest, size FROM blobs WHERE refcount = 0 "
+                    "ORDER BY last_used"
+                ):
+                    if freed >= excess:
+                        break
+                    victims.append(digest)
+                    freed += size
+                db.executemany(
+                    "DELETE FROM blobs WHERE digest = ?", [(d,) for d in victims]
+                )
+            db.execute("COMMIT")
+
+        for digest in victims:
+            try:
+                os.remove(self.blob_path(digest))
+            except FileNotFoundError:
+                pass
+        if victims:
+            logger.info("🧹 Evicted %d blob(s), %d bytes", len(victims), freed)
+        return freed
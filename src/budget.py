@@ -0,0 +1,85 @@
+"""Local token counting and per-dataset-type completion budgets."""
+
+import math
+import threading
+from collections import deque
+from functools import lru_cache
+import tiktoken
+from .constants import (
+    MAX_COMPLETION_TOKENS,
+    MAX_TOKENS,
+    MIN_COMPLETION_TOKENS,
+    OPENAI_MODEL,
+    TOKEN_BUDGET_HEADROOM,
+    TOKEN_HISTORY_MIN,
+    TOKEN_HISTORY_SIZE,
+    logger,
+)
+
+# Average characters per token of English text and code, for models
+# tiktoken doesn't know
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """Return the tokenizer of OPENAI_MODEL, or None if tiktoken doesn't know it.
+
+    Encodings are downloaded on first use (the Docker image has them
+    cached); if that fails counts are estimated too, and the error logged.
+    """
+    try:
+        return tiktoken.encoding_for_model(OPENAI_MODEL)
+    except KeyError:
+        logger.info("No tokenizer for %s; estimating token counts", OPENAI_MODEL)
+    except Exception as e:
+        logger.error("Could not load the tokenizer of %s: %s", OPENAI_MODEL, e)
+    return None
+
+
+def count_tokens(text):
+    """Count tokens in text, exactly with tiktoken or else approximately."""
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def count_prompt_tokens(system_message, prompt):
+    """Count the tokens of a chat request's system and user messages."""
+    return count_tokens(system_message) + count_tokens(prompt)
+
+
+class TokenBudget:
+    """Completion caps learned from recent completion sizes per request kind.
+
+    Until a kind has TOKEN_HISTORY_MIN completions the cap is MAX_TOKENS;
+    after that it is the largest recent completion times the headroom,
+    within [MIN_COMPLETION_TOKENS, MAX_COMPLETION_TOKENS]. A completion cut
+    off by the cap counts as twice the cap, so the next one gets more room.
+    """
+
+    def __init__(self, history_size=TOKEN_HISTORY_SIZE):
+        """Initialize with no history."""
+        self.history_size = history_size
+        self._history = {}
+        self._lock = threading.Lock()
+
+    def max_tokens(self, kind):
+        """Return the completion cap for a kind of request."""
+        with self._lock:
+            sizes = list(self._history.get(kind, ()))
+        if len(sizes) < TOKEN_HISTORY_MIN:
+            return MAX_TOKENS
+        cap = math.ceil(max(sizes) * TOKEN_BUDGET_HEADROOM)
+        return min(max(cap, MIN_COMPLETION_TOKENS), MAX_COMPLETION_TOKENS)
+
+    def record(self, kind, completion_tokens, max_tokens=None, truncated=False):
+        """Remember the size of one completion of a kind of request."""
+        size = completion_tokens
+        if truncated and max_tokens:
+            logger.warning("⚠️ %s completion hit its %d token cap", kind, max_tokens)
+            size = max(size, max_tokens * 2)
+        with self._lock:
+            history = self._history.setdefault(kind, deque(maxlen=self.history_size))
+            history.append(size)
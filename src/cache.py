@@ -0,0 +1,127 @@
+"""Local similarity cache for reusing previously generated dataset code."""
+
+import re
+import threading
+import zlib
+import numpy as np
+from .constants import (
+    CACHE_NGRAM_SIZE,
+    CACHE_SIMILARITY_THRESHOLD,
+    CACHE_VECTOR_DIM,
+    logger,
+)
+
+# Filler words that carry no meaning for dataset descriptions
+STOP_WORDS = {"a", "an", "and", "for", "in", "of", "on", "the", "to", "with"}
+
+
+def normalize_problem(text):
+    """Lowercase a business problem and reduce it to its meaningful words."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    # Strip plural "s" so "sneakers" and "sneaker" share the same n-grams
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words]
+    return [w for w in words if w not in STOP_WORDS]
+
+
+def vectorize(text, dim=CACHE_VECTOR_DIM, n=CACHE_NGRAM_SIZE):
+    """Embed text as an L2-normalized hashed character n-gram vector."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in normalize_problem(text):
+        # Pad each word so n-grams never span two words (word order is ignored)
+        padded = f" {word} "
+        for i in range(max(len(padded) - n + 1, 1)):
+            gram = padded[i : i + n].encode("utf-8")
+            vector[zlib.crc32(gram) % dim] += 1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Partition:
+    """Growable inverted index of vectors sharing the same cache key.
+
+    Vectors are stored bucket-major, one row per n-gram bucket, so a lookup
+    only reads the rows of the buckets its own n-grams fall into.
+    """
+
+    def __init__(self, dim):
+        self.postings = np.zeros((dim, 16), dtype=np.float32)
+        self.entries = []
+
+    def add(self, vector, entry):
+        """Append a vector, doubling the index capacity when full."""
+        size = len(self.entries)
+        if size == self.postings.shape[1]:
+            grown = np.zeros((self.postings.shape[0], size * 2), dtype=np.float32)
+            grown[:, :size] = self.postings
+            self.postings = grown
+        self.postings[:, size] = vector
+        self.entries.append(entry)
+
+    def best_match(self, vector):
+        """Return the (score, entry) of the most similar stored vector."""
+        size = len(self.entries)
+        if not size:
+            return 0.0, None
+        # Unit vectors: summing over the query's non-zero buckets gives cosines
+        buckets = np.flatnonzero(vector)
+        if not len(buckets):
+            return 0.0, self.entries[0]
+        scores = vector[buckets] @ self.postings[buckets, :size]
+        index = int(scores.argmax())
+        return float(scores[index]), self.entries[index]
+
+
+class SimilarityCache:
+    """In-memory cosine similarity index over previously seen business problems.
+
+    Entries are partitioned by dataset type, output format and sample count, so
+    a lookup only scores code that would produce a compatible dataset.
+    """
+
+    def __init__(self, threshold=CACHE_SIMILARITY_THRESHOLD, dim=CACHE_VECTOR_DIM):
+        """Initialize an empty cache with a similarity threshold."""
+        self.threshold = threshold
+        self.dim = dim
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(dataset_type, output_format, num_samples):
+        """Build the partition key for a dataset request."""
+        return (dataset_type.lower(), output_format.lower(), int(num_samples))
+
+    def __len__(self):
+        """Return the total number of cached entries."""
+        return sum(len(p.entries) for p in self._partitions.values())
+
+    def add(self, business_problem, dataset_type, output_format, num_samples, **entry):
+        """Store validated code for a business problem."""
+        key = self.make_key(dataset_type, output_format, num_samples)
+        entry["business_problem"] = business_problem
+        vector = vectorize(business_problem, self.dim)
+        with self._lock:
+            partition = self._partitions.setdefault(key, _Partition(self.dim))
+            partition.add(vector, entry)
+
+    def lookup(self, business_problem, dataset_type, output_format, num_samples):
+        """Return (score, entry) for the closest match, or (score, None) if none."""
+        key = self.make_key(dataset_type, output_format, num_samples)
+        partition = self._partitions.get(key)
+        if partition is None:
+            return 0.0, None
+
+        vector = vectorize(business_problem, self.dim)
+        with self._lock:
+            score, entry = partition.best_match(vector)
+
+        if entry is None or score < self.threshold:
+            return score, None
+
+        logger.info(
+            "♻️ Cache hit (%.2f): '%s' ~ '%s'",
+            score,
+            business_problem,
+            entry["business_problem"],
+        )
+        return score, entry
@@ -0,0 +1,79 @@
+"""Cooperative cancellation of a generation job and the work it started."""
+
+import threading
+from .constants import logger
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancellation token has been cancelled."""
+
+
+class CancellationToken:
+    """Thread-safe flag that also runs callbacks to abort blocking work.
+
+    Code that blocks (an HTTP stream, a child process, a wait for memory
+    budget) registers a callback that unblocks it; cancel() runs them all.
+    """
+
+    def __init__(self):
+        """Initialize an uncancelled token."""
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """Whether cancel() has been called."""
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the job and run every registered callback once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        logger.info("🛑 Job cancelled")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("Cancellation callback failed: %s", e)
+
+    def register(self, callback):
+        """Run callback on cancel (now if already cancelled); return an undo."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def child(self):
+        """Return a token cancelled along with this one, or on its own."""
+        token = CancellationToken()
+        # Once the child is cancelled, the parent no longer needs to reach it
+        token.register(self.register(token.cancel))
+        return token
+
+    def _unregister(self, callback):
+        """Forget a callback whose work finished."""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        """Raise JobCancelled if the job was cancelled."""
+        if self._event.is_set():
+            raise JobCancelled("Job was cancelled.")
+
+
+def raise_if_cancelled(cancel_token):
+    """Raise JobCancelled if an optional token was cancelled."""
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+def child_token(cancel_token):
+    """Return a child of an optional token, or a fresh token if None."""
+    return CancellationToken() if cancel_token is None else cancel_token.child()
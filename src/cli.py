@@ -0,0 +1,397 @@
+"""Headless bulk generation from a manifest of dataset specs.
+
+Usage: python -m src.cli manifest.yaml [--llm-concurrency N] [--exec-concurrency N]
+       python -m src.cli manifest.yaml --batch
+       python -m src.cli --extend JOB_ID --rows N
+
+Only the generator is imported, not the web UI. Finished jobs are appended
+to a JSONL checkpoint, so an interrupted run picks up where it stopped.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from .batch import batch_request, run_batches
+from .cancellation import CancellationToken, JobCancelled
+from .datagen import DataGen
+from .logs import log_context
+from .models import openai
+from .relational import parse_entities
+from .workspace import new_job_id
+from .constants import (
+    BATCH_PRICE_FACTOR,
+    EXEC_CONCURRENCY,
+    LLM_CONCURRENCY,
+    LLM_INPUT_PRICE_PER_M,
+    LLM_OUTPUT_PRICE_PER_M,
+    OUTPUT_DIR,
+    logger,
+)
+
+REQUIRED_FIELDS = ("business_problem", "dataset_type", "output_format", "num_samples")
+
+
+def load_manifest(path):
+    """Read dataset specs from a YAML or JSON manifest.
+
+    The manifest is either a list of specs or a mapping with a "jobs" list
+    and optional "defaults" merged into every spec. Raises ValueError for
+    specs missing a required field.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    defaults = manifest.get("defaults", {})
+    specs = [{**defaults, **job} for job in manifest.get("jobs", [])]
+
+    for index, spec in enumerate(specs):
+        missing = [field for field in REQUIRED_FIELDS if field not in spec]
+        if missing:
+            raise ValueError(f"Job {index} is missing {', '.join(missing)}")
+        if "entities" in spec:
+            try:
+                parse_entities(
+                    spec["entities"], spec["num_samples"], spec["output_format"]
+                )
+            except ValueError as e:
+                raise ValueError(f"Job {index}: {e}") from e
+    return specs
+
+
+def job_key(spec):
+    """Return a stable identifier for a spec: its "id", or a hash of it."""
+    if "id" in spec:
+        return str(spec["id"])
+    payload = json.dumps(spec, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def load_checkpoint(path):
+    """Return the records of jobs that already succeeded, keyed by job key."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interruption
+                continue
+            if record.get("status") == "done":
+                done[record["key"]] = record
+    return done
+
+
+def llm_cost(llm_usage):
+    """Estimate the USD cost of a job's model calls; batch calls cost less."""
+    prompt = sum(u["prompt_tokens"] for u in llm_usage)
+    completion = sum(u["completion_tokens"] for u in llm_usage)
+    cost = sum(
+        (
+            u["prompt_tokens"] * LLM_INPUT_PRICE_PER_M
+            + u["completion_tokens"] * LLM_OUTPUT_PRICE_PER_M
+        )
+        * (BATCH_PRICE_FACTOR if u.get("batch") else 1)
+        for u in llm_usage
+    )
+    return prompt, completion, round(cost / 1e6, 6)
+
+
+def job_input(spec):
+    """Return the generator inputs of a spec."""
+    return {k: v for k, v in spec.items() if k != "id"}
+
+
+def run_job(generator, key, spec, cancel_token, job_id=None, stats=None, **options):
+    """Generate one dataset and return its report record.
+
+    options (e.g. a batch reply as code) are passed to generate_dataset.
+    """
+    stats = {} if stats is None else stats
+    start = time.monotonic()
+    job_id = job_id or new_job_id()
+    record = {"key": key, "job_id": job_id, "spec": spec}
+    try:
+        input_data = {**job_input(spec), **options}
+        with log_context(job_id=job_id, key=key):
+            file_path = generator.generate_dataset(
+                stats=stats, job_id=job_id, cancel_token=cancel_token, **input_data
+            )
+        if isinstance(file_path, str) and os.path.exists(file_path):
+            record.update(status="done", file_path=file_path)
+        else:
+            record.update(status="failed", error="File not created or path invalid.")
+    except JobCancelled:
+        record.update(status="cancelled")
+    except Exception as e:
+        record.update(status="failed", error=str(e))
+
+    executions = stats.get("executions", [])
+    prompt, completion, cost = llm_cost(stats.get("llm", []))
+    record.update(
+        wall_seconds=round(time.monotonic() - start, 3),
+        script_runs=len(executions),
+        cpu_seconds=round(sum(u.get("cpu_seconds", 0) for u in executions), 3),
+        peak_rss_mb=max((u.get("peak_rss_mb", 0) for u in executions), default=0),
+        prompt_tokens=prompt,
+        completion_tokens=completion,
+        cost_usd=cost,
+        files=len((stats.get("manifest") or {}).get("files", [])),
+    )
+    if stats.get("profiles"):
+        record["profile"] = stats["profiles"][-1]
+    return record
+
+
+def summarize(records, wall_seconds):
+    """Build the run report from every job record."""
+    count = {}
+    for record in records:
+        count[record["status"]] = count.get(record["status"], 0) + 1
+    return {
+        "jobs": len(records),
+        "done": count.get("done", 0),
+        "failed": count.get("failed", 0),
+        "cancelled": count.get("cancelled", 0),
+        "wall_seconds": round(wall_seconds, 3),
+        "cost_usd": round(sum(r.get("cost_usd", 0) for r in records), 6),
+        "records": records,
+    }
+
+
+def run_manifest(
+    specs,
+    checkpoint_path,
+    output_dir=OUTPUT_DIR,
+    llm_concurrency=LLM_CONCURRENCY,
+    exec_concurrency=EXEC_CONCURRENCY,
+    generator=None,
+    profile=None,
+):
+    """Run every spec not yet in the checkpoint and return the run report.
+
+    Model calls and script runs are capped separately, so slow LLM replies
+    and heavy scripts overlap. On KeyboardInterrupt, running jobs are
+    cancelled and the jobs finished so far stay in the checkpoint. With
+    profile, each record gets its script's profile report.
+    """
+    generator = generator or DataGen(
+        output_dir=output_dir,
+        llm_concurrency=llm_concurrency,
+        exec_concurrency=exec_concurrency,
+        profile=profile,
+    )
+    done = load_checkpoint(checkpoint_path)
+    pending = [(job_key(spec), spec) for spec in specs]
+    pending = [(key, spec) for key, spec in pending if key not in done]
+    logger.info("📋 %d job(s), %d already done", len(specs), len(specs) - len(pending))
+
+    records = list(done.values())
+    lock = threading.Lock()
+    cancel_token = CancellationToken()
+    start = time.monotonic()
+
+    def run_and_record(key, spec):
+        record = run_job(generator, key, spec, cancel_token)
+        with lock:
+            records.append(record)
+            if record["status"] != "cancelled":
+                with open(checkpoint_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+        logger.info("🧾 %s: %s in %.1fs", key, record["status"], record["wall_seconds"])
+
+    # Enough workers to keep both kinds of slots busy
+    executor = ThreadPoolExecutor(max_workers=llm_concurrency + exec_concurrency)
+    try:
+        futures = [executor.submit(run_and_record, *job) for job in pending]
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        logger.warning("Interrupted, cancelling running jobs...")
+        cancel_token.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+    return summarize(records, time.monotonic() - start)
+
+
+def run_manifest_batch(
+    specs,
+    checkpoint_path,
+    output_dir=OUTPUT_DIR,
+    exec_concurrency=EXEC_CONCURRENCY,
+    client=None,
+    generator=None,
+    profile=None,
+):
+    """Run every spec not yet in the checkpoint with batched model calls.
+
+    Every prompt is submitted up front through the Batch API (see
+    src.batch); scripts run as each batch's replies come back. Repairs of
+    failing scripts still use regular calls. Returns the run report.
+    """
+    client = client or openai
+    generator = generator or DataGen(
+        output_dir=output_dir, exec_concurrency=exec_concurrency, profile=profile
+    )
+    done = load_checkpoint(checkpoint_path)
+    pending = {job_key(spec): spec for spec in specs}
+    pending = {key: spec for key, spec in pending.items() if key not in done}
+    logger.info("📋 %d job(s), %d already done", len(specs), len(specs) - len(pending))
+
+    # Fix each job's workspace and timestamp now: the prompt names its files
+    jobs, requests = {}, []
+    timestamp = generator.get_timestamp()
+    for key, spec in pending.items():
+        job_id = new_job_id()
+        prompt, system = generator.job_prompt(
+            job_id, timestamp=timestamp, **job_input(spec)
+        )
+        max_tokens = generator.budget.max_tokens(spec["dataset_type"])
+        jobs[key] = job_id
+        requests.append(batch_request(key, system, prompt, max_tokens))
+
+    records = list(done.values())
+    lock = threading.Lock()
+    cancel_token = CancellationToken()
+    start = time.monotonic()
+
+    def run_and_record(key, result):
+        stats = {"llm": [result["usage"]]}
+        if result["content"] is None:
+            record = {"key": key, "spec": pending[key], "status": "failed"}
+            record.update(error=result["error"], cost_usd=llm_cost(stats["llm"])[2])
+        else:
+            record = run_job(
+                generator,
+                key,
+                pending[key],
+                cancel_token,
+                job_id=jobs[key],
+                stats=stats,
+                code=result["content"],
+                timestamp=timestamp,
+            )
+        record["batch"] = True
+        with lock:
+            records.append(record)
+            if record["status"] != "cancelled":
+                with open(checkpoint_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+        logger.info("🧾 %s: %s", key, record["status"])
+
+    executor = ThreadPoolExecutor(max_workers=exec_concurrency)
+    futures = []
+    try:
+        run_batches(
+            client,
+            requests,
+            lambda key, result: futures.append(
+                executor.submit(run_and_record, key, result)
+            ),
+            cancel_token=cancel_token,
+        )
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        logger.warning("Interrupted, cancelling batches and running jobs...")
+        cancel_token.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+    return summarize(records, time.monotonic() - start)
+
+
+def main(argv=None):
+    """Parse arguments, run the manifest and write the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "manifest", nargs="?", help="YAML or JSON file of dataset specs"
+    )
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--exec-concurrency", type=int, default=EXEC_CONCURRENCY)
+    parser.add_argument(
+        "--checkpoint", help="JSONL of finished jobs (default: <manifest>.done.jsonl)"
+    )
+    parser.add_argument(
+        "--report", help="JSON summary report (default: <output-dir>/report.json)"
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="send prompts through the Batch API: slower, but cheaper",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile scripts and add their hot lines to the report",
+    )
+    parser.add_argument("--extend", metavar="JOB_ID", help="grow a finished job")
+    parser.add_argument("--rows", type=int, help="rows to add with --extend")
+    args = parser.parse_args(argv)
+
+    if args.extend:
+        if not args.rows:
+            parser.error("--extend needs --rows")
+        generator = DataGen(output_dir=args.output_dir)
+        file_path = generator.extend_dataset(args.extend, args.rows)
+        logger.info("✅ Added %d rows to %s", args.rows, file_path)
+        return 0
+    if not args.manifest:
+        parser.error("a manifest or --extend is required")
+
+    specs = load_manifest(args.manifest)
+    checkpoint = args.checkpoint or f"{os.path.splitext(args.manifest)[0]}.done.jsonl"
+    report_path = args.report or os.path.join(args.output_dir, "report.json")
+
+    if args.batch:
+        report = run_manifest_batch(
+            specs,
+            checkpoint,
+            output_dir=args.output_dir,
+            exec_concurrency=args.exec_concurrency,
+            profile=args.profile or None,
+        )
+    else:
+        report = run_manifest(
+            specs,
+            checkpoint,
+            output_dir=args.output_dir,
+            llm_concurrency=args.llm_concurrency,
+            exec_concurrency=args.exec_concurrency,
+            profile=args.profile or None,
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(
+        "✅ %d done, %d failed in %.1fs, ~$%.4f. Report: %s",
+        report["done"],
+        report["failed"],
+        report["wall_seconds"],
+        report["cost_usd"],
+        report_path,
+    )
+    return 0 if report["done"] == report["jobs"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
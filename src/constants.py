@@ -5,6 +5,7 @@ import os
 import tomllib
 from pathlib import Path
 import logging
+from .logs import setup_logging
 
 # ==================== PROJECT METADATA ====================
 root = Path(__file__).parent.parent
@@ -19,15 +20,155 @@ OPENAI_MODEL = "gpt-4o-mini"
 
 # Other constants can go here
 OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "output")
-MAX_TOKENS = 2000
+MAX_TOKENS = 2000  # Completion cap until a dataset type has usage history
+
+# ==================== TOKEN BUDGET ====================
+TOKEN_HISTORY_SIZE = 50  # Recent completion sizes kept per dataset type
+TOKEN_HISTORY_MIN = 5  # Completions needed before the history sets the cap
+TOKEN_BUDGET_HEADROOM = 1.3  # Cap = headroom x the largest recent completion
+MIN_COMPLETION_TOKENS = 512
+MAX_COMPLETION_TOKENS = int(os.environ.get("MAX_COMPLETION_TOKENS", 8000))
+
+# ==================== SIMILARITY CACHE ====================
+CACHE_SIMILARITY_THRESHOLD = 0.85  # Minimum cosine score to reuse cached code
+CACHE_VECTOR_DIM = 256  # Hashed n-gram buckets per business problem
+CACHE_NGRAM_SIZE = 3  # Character n-gram length
+
+# ==================== MULTI-CANDIDATE ====================
+# Scripts requested per dataset; the first valid output wins
+NUM_CANDIDATES = int(os.environ.get("NUM_CANDIDATES", 1))
+
+# ==================== DRY RUN ====================
+# Rows written by the small trial run before the full run (0 disables it)
+DRY_RUN_SAMPLES = int(os.environ.get("DRY_RUN_SAMPLES", 20))
+
+PREVIEW_ROWS = 10  # Rows shown in the UI preview table
+PREVIEW_HEAD_BYTES = 64 * 1024  # Bytes read from the start of text formats
+# How often the UI refreshes progress (and the elapsed time) while a job runs
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+# ==================== REPAIR LOOP ====================
+MAX_REPAIR_ATTEMPTS = 2  # Follow-up fixes before giving up on a failed script
+REPAIR_TRACEBACK_LINES = 15  # Last stderr lines sent back to the model
+
+# ==================== OUTPUT VALIDATION ====================
+# Columns at least this share null are reported (1.0: only all-null columns)
+VALIDATION_MAX_NULL_RATIO = float(os.environ.get("VALIDATION_MAX_NULL_RATIO", 1.0))
+VALIDATION_BATCH_ROWS = 128 * 1024  # Rows per batch when streaming a file
+# Bytes parsed at a time when streaming CSV and JSON; larger blocks parse
+# faster, and bound the memory validation takes
+VALIDATION_BLOCK_BYTES = int(os.environ.get("VALIDATION_BLOCK_BYTES", 16 << 20))
+
+# ==================== EXECUTION LIMITS ====================
+# Wall-clock limit for one script run before its process group is killed
+EXECUTION_TIMEOUT_SECONDS = int(os.environ.get("EXECUTION_TIMEOUT_SECONDS", 120))
+EXECUTION_CPU_SECONDS = int(os.environ.get("EXECUTION_CPU_SECONDS", 120))
+EXECUTION_MEMORY_MB = int(os.environ.get("EXECUTION_MEMORY_MB", 4096))  # RLIMIT_AS
+# Memory all running scripts may use together, and the guess before any ran
+HOST_MEMORY_BUDGET_MB = int(os.environ.get("HOST_MEMORY_BUDGET_MB", 8192))
+EXECUTION_MEMORY_ESTIMATE_MB = 300
+# "subprocess", or "subinterpreter" to run scripts in sub-interpreters of a
+# long-lived host process (Python 3.12+; otherwise subprocesses are used)
+EXECUTION_ENGINE = os.environ.get("EXECUTION_ENGINE", "subprocess")
+
+# ==================== RELATIONAL DATASETS ====================
+# Default exponent of "zipf" fan-out: higher puts more children on few parents
+RELATIONAL_ZIPF_EXPONENT = 1.1
+RELATIONAL_SEED = int(os.environ.get("RELATIONAL_SEED", 42))  # Key sampling seed
+
+# ==================== PROFILING ====================
+# Profile every full-size script run: hot lines and memory in the job result
+PROFILE_SCRIPTS = os.environ.get("PROFILE_SCRIPTS", "false").lower() == "true"
+PROFILE_INTERVAL_MS = 5  # Stack sampling period
+# Frames kept per allocation to find its script line (0: don't trace memory)
+PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", 25))
+PROFILE_TOP_LINES = 10  # Hot lines and allocating lines in a report
+# Also keep collapsed stacks ("a;b;c count" lines) for flamegraph tools
+PROFILE_COLLAPSED_STACKS = (
+    os.environ.get("PROFILE_COLLAPSED_STACKS", "false").lower() == "true"
+)
+PROFILE_MAX_STACKS = 200
+
+# ==================== FAIR SCHEDULING ====================
+# Generation jobs running at once across all web clients, and per client
+GENERATION_SLOTS = int(os.environ.get("GENERATION_SLOTS", 4))
+CLIENT_MAX_JOBS = int(os.environ.get("CLIENT_MAX_JOBS", 1))
+# Per-client usage allowed in a sliding window (0 means unlimited)
+CLIENT_QUOTA_WINDOW_SECONDS = 3600
+CLIENT_TOKEN_QUOTA = int(os.environ.get("CLIENT_TOKEN_QUOTA", 0))
+CLIENT_CPU_QUOTA_SECONDS = float(os.environ.get("CLIENT_CPU_QUOTA_SECONDS", 0))
+# Share weights of named clients, e.g. "key:3f2a...=2,ip:10.0.0.5=0.5"
+CLIENT_WEIGHTS = os.environ.get("CLIENT_WEIGHTS", "")
+# Comma-separated API keys whose x-api-key header identifies a client;
+# any other key is ignored
+CLIENT_API_KEYS = os.environ.get("CLIENT_API_KEYS", "")
+# Comma-separated addresses or CIDRs of proxies whose X-Forwarded-For is
+# believed; without one, clients are told apart by their browser session
+TRUSTED_PROXIES = os.environ.get("TRUSTED_PROXIES", "")
+
+# ==================== CATALOG WARMING ====================
+# Popular specs generated ahead of time so their first request is instant
+CATALOG_PATH = os.environ.get("CATALOG_PATH", str(root / "assets" / "catalog.json"))
+CATALOG_WARMING = os.environ.get("CATALOG_WARMING", "true").lower() == "true"
+CATALOG_REFRESH_SECONDS = int(os.environ.get("CATALOG_REFRESH_SECONDS", 6 * 3600))
+CATALOG_IDLE_POLL_SECONDS = 5  # Wait between checks for a moment without jobs
+
+# ==================== BATCH CLI ====================
+# Model calls and script runs in flight at once during bulk generation
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", 4))
+EXEC_CONCURRENCY = int(os.environ.get("EXEC_CONCURRENCY", 2))
+# USD per million tokens of OPENAI_MODEL, for cost estimates in reports
+LLM_INPUT_PRICE_PER_M = float(os.environ.get("LLM_INPUT_PRICE_PER_M", 0.15))
+LLM_OUTPUT_PRICE_PER_M = float(os.environ.get("LLM_OUTPUT_PRICE_PER_M", 0.60))
+# Batch mode: requests per batch file, status poll period, price vs. sync calls
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", 500))
+BATCH_POLL_SECONDS = int(os.environ.get("BATCH_POLL_SECONDS", 30))
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_PRICE_FACTOR = 0.5
 
 # ==================== LOGGING CONFIG ====================
 
-# Configure logging once
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "json" for structured lines
+# Keep 1 in N DEBUG records of each message (per-token and per-row events)
+LOG_DEBUG_SAMPLE_EVERY = int(os.environ.get("LOG_DEBUG_SAMPLE_EVERY", 100))
+
+# Configure logging once, for every module
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_EVERY)
 
 # Create a shared logger
 logger = logging.getLogger(__name__)
 
+# ==================== OUTPUT FORMATS ====================
+# Codec and rows per row group the model is told to use for Parquet
+PARQUET_COMPRESSION = os.environ.get("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", 100_000))
+
+# ==================== STATIC FILES ====================
+# Docs and assets are precompressed at startup: text files in this size range
+STATIC_COMPRESS_MIN_BYTES = 256
+STATIC_COMPRESS_MAX_BYTES = 5 * 1024**2
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+# Versioned URLs (?v=<content hash>) never change; others are revalidated
+STATIC_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = "no-cache"
+
 # ==================== FILE MANAGEMENT ====================
 FILE_CLEANUP_SECONDS = 60  # 5 minutes
+# Job state shared by every worker; put it on a shared volume for replicas
+JOB_STORE_PATH = os.environ.get(
+    "JOB_STORE_PATH", os.path.join(OUTPUT_DIR, "jobs.sqlite3")
+)
+# Running jobs renew a lease; past it, workers requeue them (or fail them
+# after JOB_MAX_ATTEMPTS tries, or if a web worker started them)
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 120))
+JOB_HEARTBEAT_SECONDS = int(os.environ.get("JOB_HEARTBEAT_SECONDS", 15))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+WORKER_POLL_SECONDS = float(os.environ.get("WORKER_POLL_SECONDS", 2))
+ZIP_CHUNK_BYTES = 1 << 20  # Read size when streaming files into a ZIP
+# "blobs" stores each distinct dataset file once; "local" keeps plain copies
+ARTIFACT_STORE = os.environ.get("ARTIFACT_STORE", "blobs")
+BLOB_STORE_PATH = os.environ.get("BLOB_STORE_PATH", os.path.join(OUTPUT_DIR, "blobs"))
+# Unreferenced blobs are evicted, least recently used first, past this size
+BLOB_STORE_MAX_BYTES = int(os.environ.get("BLOB_STORE_MAX_BYTES", 5 * 1024**3))
@@ -1,45 +1,767 @@
 """Main data generation class for creating synthetic datasets using AI models."""
 
 import os
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from .prompts import build_user_prompt, system_message
-from .models import get_gpt_completion
-from .utils import execute_code_in_virtualenv
-from .constants import OUTPUT_DIR, logger
+from .prompts import (
+    build_relational_prompt,
+    build_repair_prompt,
+    build_system_message,
+    build_user_prompt,
+    relational_message,
+    repair_message,
+)
+from .models import get_gpt_completion, get_gpt_completions
+from .utils import (
+    add_filename_suffix,
+    apply_patch,
+    execute_code_in_virtualenv,
+    extract_code,
+    extract_file_paths,
+    make_shard_code,
+    trim_traceback,
+)
+from .budget import TokenBudget, count_prompt_tokens
+from .cache import SimilarityCache
+from .cancellation import JobCancelled, child_token
+from .logs import run_in_context
+from .progress import report
+from .extend import (
+    PART_FILE_FORMATS,
+    append_shard,
+    count_keys_up_to,
+    part_path,
+    restore_tail,
+    scan_dataset,
+    shift_keys,
+    snapshot_tail,
+)
+from .relational import build_script, check_integrity, file_names, parse_entities
+from .validation import check_output, validate_dataset
+from .workspace import (
+    SCRIPT_NAME,
+    create_workspace,
+    new_job_id,
+    read_manifest,
+    save_script,
+    workspace_path,
+    write_manifest,
+)
+from .constants import (
+    DRY_RUN_SAMPLES,
+    MAX_REPAIR_ATTEMPTS,
+    NUM_CANDIDATES,
+    OUTPUT_DIR,
+    PROFILE_SCRIPTS,
+    REPAIR_TRACEBACK_LINES,
+    logger,
+)
+
+
+def is_execution_error(result):
+    """Check whether execute_code_in_virtualenv reported a failed run."""
+    return isinstance(result, tuple) and result[1] is None
+
+
+def discard_output(result):
+    """Delete the file produced by a losing candidate, if any."""
+    if isinstance(result, str) and os.path.exists(result):
+        os.remove(result)
+
+
+def discard_candidate_files(code):
+    """Delete every file a losing candidate's script may have written."""
+    preview_code = add_filename_suffix(code, "_preview")
+    for path in extract_file_paths(code) + extract_file_paths(preview_code):
+        discard_output(path)
+
+
+def dataset_state(manifest, target, files, output_format):
+    """Return the row count and last key of a dataset before an extension.
+
+    Extensions keep them in the manifest's "datasets". A job never extended
+    takes them from the validation report of its main file; only files
+    extended before that was recorded are read in full.
+    """
+    name = os.path.basename(target)
+    state = manifest.get("datasets", {}).get(name)
+    if state is not None:
+        return state
+    report = manifest.get("validation") or {}
+    if (
+        not manifest.get("extensions")
+        and report.get("file") == name
+        and report.get("rows") is not None
+        and "key_range" in report
+    ):
+        key_range = report["key_range"]
+        return {"rows": report["rows"], "last_key": key_range and key_range[1]}
+    return scan_dataset(files, output_format)
+
+
+def job_spec(input_data):
+    """Return the request fields needed to re-run or extend a job."""
+    fields = ("business_problem", "dataset_type", "output_format", "num_samples")
+    spec = {field: input_data[field] for field in fields}
+    if input_data.get("entities"):
+        spec["entities"] = input_data["entities"]
+    return spec
+
+
+def limit(concurrency):
+    """Return a semaphore allowing concurrency holders, or no limit if None."""
+    return threading.BoundedSemaphore(concurrency) if concurrency else nullcontext()
 
 
 class DataGen:
     """Handles synthetic data generation using AI models."""
 
-    def __init__(self, output_dir=None):
-        """Initialize the data generator with output directory."""
+    def __init__(
+        self,
+        output_dir=None,
+        use_cache=True,
+        num_candidates=None,
+        dry_run_samples=None,
+        llm_concurrency=None,
+        exec_concurrency=None,
+        profile=None,
+    ):
+        """Initialize the data generator with output directory.
+
+        llm_concurrency and exec_concurrency cap the model calls and script
+        runs in flight across all jobs sharing this generator (no cap if None).
+        With profile (default: PROFILE_SCRIPTS), full-size script runs are
+        profiled and their reports kept in the job's stats and manifest.
+        """
         # Use provided output_dir, or fall back to OUTPUT_DIR constant
         self.output_dir = output_dir or OUTPUT_DIR
         os.makedirs(self.output_dir, exist_ok=True)
 
+        # Number of candidate scripts to race for each dataset
+        self.num_candidates = num_candidates or NUM_CANDIDATES
+
+        # Size of the trial run that validates a script before the full run
+        self.dry_run_samples = (
+            DRY_RUN_SAMPLES if dry_run_samples is None else dry_run_samples
+        )
+
+        # Similarity cache of validated code, keyed by business problem
+        self.cache = SimilarityCache() if use_cache else None
+
+        # Counters for the repair loop: failed runs, follow-ups sent, fixes
+        self.repair_stats = {"failures": 0, "attempts": 0, "repaired": 0}
+        self._stats_lock = threading.Lock()
+
+        # Slots shared by every job run through this generator
+        self.llm_slots = limit(llm_concurrency)
+        self.exec_slots = limit(exec_concurrency)
+
+        # Completion caps learned from past completion sizes per dataset type
+        self.budget = TokenBudget()
+
+        self.profile = PROFILE_SCRIPTS if profile is None else profile
+
+    def repair_success_rate(self):
+        """Return the share of failed runs that a repair follow-up fixed."""
+        with self._stats_lock:
+            failures = self.repair_stats["failures"]
+            return self.repair_stats["repaired"] / failures if failures else 0.0
+
+    def _count(self, stat):
+        """Increment a repair counter."""
+        with self._stats_lock:
+            self.repair_stats[stat] += 1
+
+    def complete(self, prompt, system, options, kind, n=None):
+        """Call the model in an LLM slot, with the job's token and callbacks.
+
+        kind names the request (a dataset type, or "repair"): its completion
+        cap comes from the sizes of its past completions, and this one's
+        size is added to them. Returns one completion, or a list of n
+        completions if n is given.
+        """
+        max_tokens = self.budget.max_tokens(kind)
+        on_llm_usage = options.get("on_llm_usage")
+
+        def on_usage(usage):
+            # Completion tokens are summed over the n choices
+            per_choice = usage["completion_tokens"] // (n or 1)
+            self.budget.record(kind, per_choice, max_tokens, usage.get("truncated"))
+            logger.info(
+                "🪙 %s: %d prompt + %d completion tokens (cap %d per choice)",
+                kind,
+                usage["prompt_tokens"],
+                usage["completion_tokens"],
+                max_tokens,
+            )
+            if on_llm_usage:
+                on_llm_usage(usage)
+
+        logger.info(
+            "🧮 %s prompt: ~%d tokens", kind, count_prompt_tokens(system, prompt)
+        )
+        callbacks = {
+            "cancel_token": options.get("cancel_token"),
+            "on_progress": options.get("on_progress"),
+            "on_usage": on_usage,
+            "max_tokens": max_tokens,
+        }
+        with self.llm_slots:
+            if n:
+                return get_gpt_completions(prompt, system, n, **callbacks)
+            return get_gpt_completion(prompt, system, **callbacks)
+
+    def execute(self, code, **options):
+        """Run a script in an execution slot."""
+        options.pop("on_llm_usage", None)
+        with self.exec_slots:
+            return execute_code_in_virtualenv(code, **options)
+
+    def execute_with_repair(self, code, result=None, **options):
+        """Run generated code, patching it with short model follow-ups on failure.
+
+        Pass the result of a run that already happened to skip the first
+        execution. Options are forwarded to execute_code_in_virtualenv.
+        Returns the (possibly patched) code and the execution result.
+        """
+        if result is None:
+            result = self.execute(code, **options)
+        if not is_execution_error(result):
+            return code, result
+
+        self._count("failures")
+        for attempt in range(1, MAX_REPAIR_ATTEMPTS + 1):
+            self._count("attempts")
+            script = extract_code(code).strip()
+            error = trim_traceback(result[0], REPAIR_TRACEBACK_LINES)
+            logger.info("🔧 Repair attempt %d: %s", attempt, error.splitlines()[-1:])
+
+            try:
+                reply = self.complete(
+                    build_repair_prompt(script, error),
+                    repair_message,
+                    options,
+                    "repair",
+                )
+                code = "```python\n" + apply_patch(script, reply) + "\n```"
+            except ValueError as e:
+                # Unusable reply: keep the last script and ask again
+                logger.warning("Repair reply rejected: %s", e)
+                continue
+
+            result = self.execute(code, **options)
+            if not is_execution_error(result):
+                self._count("repaired")
+                logger.info("✅ Script repaired after %d attempt(s)", attempt)
+                return code, result
+
+        return code, result
+
+    def race_candidates(self, codes, timestamp, **options):
+        """Run candidate scripts in parallel and keep the first valid output.
+
+        Returns the winning code and its result. If no candidate is valid, the
+        first file produced (or else the first failure, after repair) is used.
+        Options are forwarded to execute_code_in_virtualenv and must include
+        output_format and num_samples.
+        """
+        # Give each candidate its own file name so they can't overwrite each other
+        codes = [
+            code.replace(timestamp, f"{timestamp}_c{i}") for i, code in enumerate(codes)
+        ]
+
+        # Hold each candidate's preview back: only the winner's is shown
+        on_preview = options.get("on_preview")
+        previews = {}
+
+        def keep_preview(code):
+            """Return a callback recording a candidate's preview, if wanted."""
+            if on_preview is None:
+                return None
+            return lambda path: previews.__setitem__(code, path)
+
+        # Each candidate can be stopped alone; cancelling the job stops them all
+        tokens = [child_token(options.get("cancel_token")) for _ in codes]
+        executor = ThreadPoolExecutor(max_workers=len(codes))
+        futures = {
+            executor.submit(
+                run_in_context(self.execute),
+                c,
+                **{**options, "cancel_token": t, "on_preview": keep_preview(c)},
+            ): (c, t)
+            for c, t in zip(codes, tokens, strict=True)
+        }
+        outcomes, consumed = [], set()
+        winner = None
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    result = (f"Execution error:\n{e}", None)
+                outcomes.append((futures[future][0], result))
+                consumed.add(future)
+
+                if check_output(
+                    result, options["output_format"], options["num_samples"]
+                ):
+                    winner = outcomes[-1]
+                    break
+        finally:
+            # Kill the losers still running and wait for them, so that their
+            # files are gone before the job's manifest is written
+            for future, (_, token) in futures.items():
+                if future not in consumed:
+                    token.cancel()
+            executor.shutdown(wait=True)
+            for future, (code, _) in futures.items():
+                if future not in consumed:
+                    discard_candidate_files(code)
+
+        if winner is None:
+            produced = [o for o in outcomes if isinstance(o[1], str)]
+            failed = [o for o in outcomes if is_execution_error(o[1])]
+            if produced:
+                winner = produced[0]
+            elif failed:
+                # The repaired run writes and reports its own preview
+                previews.pop(failed[0][0], None)
+                winner = self.execute_with_repair(*failed[0], **options)
+            else:
+                winner = outcomes[0]
+
+        for _, result in outcomes:
+            if result != winner[1]:
+                discard_output(result)
+        for code, path in previews.items():
+            if code == winner[0]:
+                on_preview(path)
+            else:
+                discard_output(path)
+
+        if winner[0] in codes:
+            logger.info("🏁 Candidate %d won", codes.index(winner[0]))
+        return winner
+
+    def workspace_for(self, job_id):
+        """Return the workspace directory of a job."""
+        return workspace_path(self.output_dir, job_id)
+
+    def job_prompt(self, job_id, **input_data):
+        """Return the user prompt and system message of a job's model call.
+
+        input_data must include the timestamp the job's files will carry.
+        With "entities", the model is only asked for the tables' columns.
+        """
+        input_data["file_path"] = self.workspace_for(job_id)
+        if input_data.get("entities"):
+            entities = parse_entities(
+                input_data["entities"],
+                input_data["num_samples"],
+                input_data["output_format"],
+            )
+            return build_relational_prompt(entities, **input_data), relational_message
+        prompt = build_user_prompt(**input_data)
+        return prompt, build_system_message(input_data["output_format"])
+
     def get_timestamp(self):
         """Return current timestamp for file naming."""
         return datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    def generate_dataset(self, **input_data):
-        """Generate synthetic dataset based on input parameters and model choice."""
+    def reuse_cached_code(self, directory, timestamp, options, **input_data):
+        """Re-run cached code for a similar business problem, if any."""
+        if self.cache is None:
+            return None
+
+        _, entry = self.cache.lookup(
+            input_data["business_problem"],
+            input_data["dataset_type"],
+            input_data["output_format"],
+            input_data["num_samples"],
+        )
+        if entry is None:
+            return None
+
+        # Point the cached script at this request's directory and timestamp
+        code = entry["code"].replace(entry["directory"], directory)
+        code = code.replace(entry["timestamp"], timestamp)
+
+        file_path = self.execute(code, **options)
+        if isinstance(file_path, str) and os.path.exists(file_path):
+            return code, file_path
+
+        logger.warning("Cached code failed, falling back to the model.")
+        return None
+
+    def validate_output(self, file_path, input_data):
+        """Check the main dataset file of a job and return the report."""
+        report = validate_dataset(
+            file_path, input_data["output_format"], input_data["num_samples"]
+        )
+        report["file"] = os.path.basename(file_path)
+        if report["valid"]:
+            logger.info("🔎 %s validated in %.3fs", report["file"], report["seconds"])
+        else:
+            logger.warning("🔎 %s has issues: %s", report["file"], report["issues"])
+        return report
+
+    def validate_relational(self, directory, entities, input_data):
+        """Validate a relational job's main table and every foreign key.
+
+        The report of the main table gets a "foreign_keys" list (see
+        relational.check_integrity); orphan keys are issues.
+        """
+        output_format = input_data["output_format"]
+        paths = [
+            os.path.join(directory, name)
+            for name in file_names(entities, output_format, input_data["timestamp"])
+        ]
+        report = self.validate_output(paths[0], input_data)
+        try:
+            report["foreign_keys"] = check_integrity(paths, entities, output_format)
+        except Exception as e:
+            report["issues"].append(f"Foreign keys not checked: {e}")
+        for fk in report.get("foreign_keys", []):
+            if fk["orphans"]:
+                report["issues"].append(
+                    f"{fk['orphans']} {fk['table']}.{fk['column']} value(s) match "
+                    f"no {fk['references']} row"
+                )
+        report["valid"] = not report["issues"]
+        if report.get("foreign_keys") and not any(
+            fk["orphans"] for fk in report["foreign_keys"]
+        ):
+            logger.info("🔗 %d foreign key(s) intact", len(report["foreign_keys"]))
+        return report
+
+    def generate_relational(self, code, directory, options, **input_data):
+        """Generate a relational dataset: the model writes columns, not keys.
+
+        The reply (from the model, or passed as code) is wrapped by
+        relational.build_script, which writes every table with matching
+        keys. Returns the script, the main table's path and its report.
+        """
+        entities = parse_entities(
+            input_data["entities"],
+            input_data["num_samples"],
+            input_data["output_format"],
+        )
+        if code is None:
+            code = self.complete(
+                build_relational_prompt(entities, **input_data),
+                relational_message,
+                options,
+                input_data["dataset_type"],
+            )
+        code = build_script(
+            entities,
+            extract_code(code),
+            directory,
+            input_data["timestamp"],
+            input_data["output_format"],
+        )
+        code, file_path = self.execute_with_repair(code, **options)
+        if not isinstance(file_path, str) or not os.path.exists(file_path):
+            return code, file_path, None
+        return (
+            code,
+            file_path,
+            self.validate_relational(directory, entities, input_data),
+        )
+
+    def finish_job(self, workspace, job_id, code, stats, spec=None, validation=None):
+        """Save the script and write the manifest of a successful job.
+
+        The spec is kept in the manifest so the job can be extended later,
+        with the validation report of the main dataset file if given.
+        """
+        save_script(workspace, extract_code(code).strip())
+        extra = {"spec": spec, "validation": validation}
+        if stats and stats.get("profiles"):
+            # With several candidates this is the last one profiled
+            extra["profile"] = stats["profiles"][-1]
+        manifest = write_manifest(
+            workspace, job_id, **{k: v for k, v in extra.items() if v}
+        )
+        if stats is not None:
+            stats["manifest"] = manifest
+            if validation:
+                stats["validation"] = validation
+        logger.info("📦 Job %s produced %d file(s)", job_id, len(manifest["files"]))
+        return manifest
+
+    def generate_dataset(
+        self,
+        on_preview=None,
+        stats=None,
+        job_id=None,
+        cancel_token=None,
+        on_progress=None,
+        code=None,
+        **input_data,
+    ):
+        """Generate synthetic dataset based on input parameters and model choice.
+
+        Each job writes into its own workspace, output_dir/<job_id>, where the
+        script and a manifest of every created file are saved on success.
+        If given, on_preview receives the path of the dry-run output file as
+        soon as it is validated, before the full-size run starts. If a stats
+        dict is given, it receives the resource usage of every script run in
+        its "executions" list, the token usage of every model call in "llm",
+        the job's "manifest", the main file's "validation" report and, when
+        profiling, every full-size run's profile in "profiles". Cancelling
+        cancel_token aborts the model call or script in progress and raises
+        JobCancelled. Progress events (see src.progress.STAGES) are passed to
+        on_progress.
+        Pass code, the model's reply to job_prompt() obtained elsewhere (e.g.
+        from a batch job), to skip the model call. With "entities" (see
+        src.relational), every table is written with matching foreign keys
+        and the main table's file is returned.
+        """
         try:
             # Ensure output directory exists before generating
             os.makedirs(self.output_dir, exist_ok=True)
 
-            # Add output directory path to input data for file generation
-            input_data["file_path"] = self.output_dir
+            # Give the job its own directory so concurrent jobs can't collide
+            job_id = job_id or new_job_id()
+            workspace = create_workspace(self.output_dir, job_id)
+
+            # Add workspace path to input data for file generation
+            input_data["file_path"] = workspace
+            input_data.setdefault("timestamp", self.get_timestamp())
+            directory = workspace.replace("\\", "/")
 
-            # Build the prompt to send to the selected LLM
-            prompt = build_user_prompt(**input_data)
+            # Execution settings shared by every run of this request
+            options = {
+                "num_samples": input_data["num_samples"],
+                "output_format": input_data["output_format"],
+                "dry_run_samples": self.dry_run_samples,
+                "on_preview": on_preview,
+                "on_usage": None,
+                "cancel_token": cancel_token,
+                "on_progress": on_progress,
+            }
+            if stats is not None:
+                options["on_usage"] = stats.setdefault("executions", []).append
+                options["on_llm_usage"] = stats.setdefault("llm", []).append
+                if self.profile:
+                    options["on_profile"] = stats.setdefault("profiles", []).append
 
-            code = get_gpt_completion(prompt, system_message)
+            if input_data.get("entities"):
+                # Keys come from the engine; no cache or candidates to race
+                code, file_path, validation = self.generate_relational(
+                    code, directory, options, **input_data
+                )
+                if validation is None:
+                    return file_path
+                manifest = self.finish_job(
+                    workspace, job_id, code, stats, job_spec(input_data), validation
+                )
+                report(on_progress, "finalized", files=len(manifest["files"]))
+                return file_path
+
+            # Reuse code from a near-duplicate request before calling the LLM
+            reused = None
+            if code is None:
+                reused = self.reuse_cached_code(
+                    directory, options=options, **input_data
+                )
+            if reused:
+                manifest = self.finish_job(
+                    workspace,
+                    job_id,
+                    reused[0],
+                    stats,
+                    job_spec(input_data),
+                    self.validate_output(reused[1], input_data),
+                )
+                report(on_progress, "finalized", files=len(manifest["files"]))
+                return reused[1]
+
+            # Build the prompt, with save instructions for the chosen format only
+            prompt, system_message = self.job_prompt(job_id, **input_data)
+            kind = input_data["dataset_type"]
+
+            if code is not None:
+                # The reply came from elsewhere: just run (and repair) it
+                code, file_path = self.execute_with_repair(code, **options)
+            elif self.num_candidates > 1:
+                # Race several scripts and keep the first valid dataset
+                codes = self.complete(
+                    prompt, system_message, options, kind, n=self.num_candidates
+                )
+                code, file_path = self.race_candidates(
+                    codes, input_data["timestamp"], **options
+                )
+            else:
+                code = self.complete(prompt, system_message, options, kind)
+
+                # Execute the generated code (repairing it if it fails)
+                code, file_path = self.execute_with_repair(code, **options)
+
+            if not isinstance(file_path, str) or not os.path.exists(file_path):
+                return file_path
+
+            manifest = self.finish_job(
+                workspace,
+                job_id,
+                code,
+                stats,
+                job_spec(input_data),
+                self.validate_output(file_path, input_data),
+            )
+            report(on_progress, "finalized", files=len(manifest["files"]))
+
+            # Only remember code that actually produced a file
+            if self.cache is not None:
+                self.cache.add(
+                    input_data["business_problem"],
+                    input_data["dataset_type"],
+                    input_data["output_format"],
+                    input_data["num_samples"],
+                    code=code,
+                    directory=directory,
+                    timestamp=input_data["timestamp"],
+                )
 
-            # Execute the generated code and return the output file path
-            file_path = execute_code_in_virtualenv(code)
             return file_path
 
         except Exception as e:
             # Log and re-raise any errors that occur during generation
             logger.error(f"Error in generate_dataset: {e}")
             raise
+
+    def extend_dataset(
+        self, job_id, extra_samples, seed_offset=None, stats=None, cancel_token=None
+    ):
+        """Grow a finished job's dataset by extra_samples rows.
+
+        The job's saved script is re-run for the new rows only, with its
+        literal seeds shifted (by the extension number unless seed_offset is
+        given) and row-numbered key columns continuing after the existing
+        rows. CSV, NDJSON and JSON rows are appended to the existing files,
+        compressed CSV as a new gzip/zstd stream; Parquet, Feather and ORC
+        shards are kept as "_part<n>" files with the same schema. Only the
+        new rows are read: each file's row count and last key are kept in
+        the manifest's "datasets", and the main shard's validation report
+        in its "extensions" entry. Returns the main dataset file. Raises
+        ValueError if the job can't be extended, or if the new rows would
+        repeat existing keys; the files are left as they were then, and
+        when an append fails or is interrupted.
+        """
+        workspace = self.workspace_for(job_id)
+        manifest = read_manifest(workspace)
+        if manifest is None or "spec" not in manifest:
+            raise ValueError(f"Job {job_id} has no saved spec to extend")
+
+        spec = manifest["spec"]
+        if spec.get("entities"):
+            # New rows would restart every table's keys at 1
+            raise ValueError(f"Job {job_id} is relational and can't be extended")
+        extensions = manifest.get("extensions", [])
+        part = len(extensions) + 1
+        seed_offset = part if seed_offset is None else seed_offset
+
+        with open(os.path.join(workspace, SCRIPT_NAME), encoding="utf-8") as f:
+            script = f.read()
+        shard_code = make_shard_code(
+            script, spec["num_samples"], extra_samples, part, seed_offset
+        )
+        targets = extract_file_paths(script)
+        shards = extract_file_paths(shard_code)
+        if not targets:
+            raise ValueError(f"Job {job_id}'s script has no output path")
+
+        options = {"cancel_token": cancel_token}
+        if stats is not None:
+            options["on_usage"] = stats.setdefault("executions", []).append
+        result = self.execute(f"```python\n{shard_code}\n```", **options)
+        if is_execution_error(result) or not all(os.path.exists(p) for p in shards):
+            for shard in shards:
+                discard_output(shard)
+            error = result[0] if is_execution_error(result) else "No shard written."
+            raise RuntimeError(f"Extending job {job_id} failed: {error}")
+
+        # Only the new rows are read: what came before is in the manifest
+        output_format = spec["output_format"].lower()
+        states, reports = [], []
+        try:
+            for target, shard in zip(targets, shards, strict=True):
+                files = [target]
+                if output_format in PART_FILE_FORMATS:
+                    files += [part_path(target, n) for n in range(1, part)]
+                state = dataset_state(manifest, target, files, output_format)
+                shift_keys(shard, output_format, state["rows"])
+                report = validate_dataset(shard, output_format, extra_samples)
+                repeated = report["duplicate_keys"]
+                key_range, last_key = report["key_range"], state["last_key"]
+                if key_range and last_key is not None and key_range[0] <= last_key:
+                    repeated += count_keys_up_to(shard, output_format, last_key)
+                if repeated:
+                    raise ValueError(
+                        f"Extending job {job_id} would repeat {repeated} key(s) "
+                        f"in {os.path.basename(target)}"
+                    )
+                states.append(state)
+                reports.append(report)
+        except BaseException:
+            for shard in shards:
+                discard_output(shard)
+            raise
+
+        rows = reports[0]["rows"]
+        if rows is not None and rows != int(extra_samples):
+            # The sample count may be computed rather than a literal; not fatal
+            logger.warning("Shard has %d rows instead of %s", rows, extra_samples)
+
+        snapshots, merged = [], []
+        try:
+            for target, shard in zip(targets, shards, strict=True):
+                snapshots.append(snapshot_tail(target))
+                merged.append(append_shard(target, shard, output_format))
+            for shard, was_merged in zip(shards, merged, strict=True):
+                if was_merged:
+                    os.remove(shard)
+        except BaseException:
+            # Undo every append, including one cut off halfway; part files
+            # leave their target untouched
+            if output_format not in PART_FILE_FORMATS:
+                for target, snapshot in zip(targets, snapshots, strict=False):
+                    restore_tail(target, snapshot)
+            for shard in shards:
+                discard_output(shard)
+            raise
+
+        datasets = dict(manifest.get("datasets", {}))
+        for target, state, report in zip(targets, states, reports, strict=True):
+            key_range = report["key_range"]
+            last_key = state["last_key"]
+            if key_range:
+                last_key = (
+                    key_range[1] if last_key is None else max(last_key, key_range[1])
+                )
+            datasets[os.path.basename(target)] = {
+                "rows": state["rows"] + (report["rows"] or int(extra_samples)),
+                "last_key": last_key,
+            }
+        extensions.append(
+            {
+                "rows": rows or int(extra_samples),
+                "seed_offset": seed_offset,
+                "validation": reports[0],
+            }
+        )
+        extra = {k: v for k, v in manifest.items() if k not in ("job_id", "files")}
+        manifest = write_manifest(
+            workspace,
+            job_id,
+            **{**extra, "extensions": extensions, "datasets": datasets},
+        )
+        if stats is not None:
+            stats["manifest"] = manifest
+        logger.info("➕ Job %s extended by %s rows", job_id, extra_samples)
+        return targets[0]
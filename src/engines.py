@@ -0,0 +1,346 @@
+"""Sub-interpreter execution engine, and a benchmark against subprocesses.
+
+With EXECUTION_ENGINE=subinterpreter, scripts run in a fresh sub-interpreter
+of a long-lived host process instead of a new Python process each, which
+saves interpreter startup and per-process memory. Sub-interpreters need
+Python 3.12+ and can't load most C extensions (numpy, pandas, pyarrow), so
+a script that imports one is run again in a subprocess.
+
+Usage: python -m src.engines [--runs N]   (prints the benchmark as JSON)
+"""
+
+import argparse
+import json
+import os
+import re
+import select
+import subprocess
+import sys
+import threading
+import time
+from .cancellation import raise_if_cancelled
+from .resources import (
+    LIMITS_BOOTSTRAP,
+    admission,
+    kill_process_group,
+    limits_env,
+)
+from .constants import EXECUTION_CPU_SECONDS, EXECUTION_TIMEOUT_SECONDS, logger
+
+try:
+    import _interpreters as interpreters  # Python 3.13+
+except ImportError:
+    try:
+        import _xxsubinterpreters as interpreters  # Python 3.12
+    except ImportError:  # Python 3.11 and older
+        interpreters = None
+
+# Runs in the host process: one script per line on stdin, one reply per line
+HOST_LOOP = """
+import json, math, os, resource, sys, time
+try:
+    import _interpreters as interpreters
+except ImportError:
+    import _xxsubinterpreters as interpreters
+
+# Scripts may print; keep stdout for replies only
+replies = os.fdopen(os.dup(1), "w", buffering=1)
+os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+def is_open(fd):
+    try:
+        os.fstat(fd)
+    except OSError:
+        return False
+    return True
+
+def open_fds():
+    try:
+        listed = [int(fd) for fd in os.listdir("/proc/self/fd")]
+    except OSError:
+        return set()
+    # Leave out the descriptor listdir used
+    return {fd for fd in listed if is_open(fd)}
+
+# Sub-interpreters share the process: undo what the last script changed.
+# A new interpreter's os.environ shows the process environment, which
+# scripts may have changed behind this interpreter's copy.
+fds = open_fds()
+RESET = "import os; os.chdir(%r); os.environ.clear(); os.environ.update(%r)" % (
+    os.getcwd(),
+    dict(os.environ),
+)
+
+def close_leaked_fds():
+    for fd in open_fds() - fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def limit_cpu(seconds):
+    # RLIMIT_CPU counts the host's whole life, so move it past what's used
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime) + seconds
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def run(code):
+    interpreter = interpreters.create()
+    try:
+        failure = interpreters.run_string(interpreter, RESET)
+        if failure is None:
+            failure = interpreters.run_string(interpreter, code)
+    except Exception as e:  # Python 3.12 raises instead of returning
+        return str(e)
+    finally:
+        interpreters.destroy(interpreter)
+    if failure is None:
+        return None
+    return getattr(failure, "formatted", None) or str(failure)
+
+for line in sys.stdin:
+    request = json.loads(line)
+    close_leaked_fds()
+    limit_cpu(request["cpu_seconds"])
+    start = time.thread_time()
+    error = run(request["code"])
+    cpu_seconds = round(time.thread_time() - start, 3)
+    replies.write(json.dumps({"error": error, "cpu_seconds": cpu_seconds}) + "\\n")
+"""
+
+# C extensions generated scripts commonly import; none load in sub-interpreters
+EXTENSION_MODULES = re.compile(
+    r"^\s*(?:import|from)\s+(numpy|pandas|pyarrow|polars|scipy)\b", re.MULTILINE
+)
+
+# Pure-Python script for the benchmark: sub-interpreters can't import numpy
+BENCHMARK_CODE = "rows = [{'id': i, 'value': i * i} for i in range(1000)]\n"
+
+
+class SubinterpreterUnsupported(Exception):
+    """Raised when a script needs modules that sub-interpreters can't load."""
+
+
+def subinterpreters_available(python_interpreter):
+    """Check whether scripts for this interpreter can run in sub-interpreters."""
+    return (
+        interpreters is not None
+        and sys.version_info >= (3, 12)
+        and os.name == "posix"
+        and python_interpreter == sys.executable
+    )
+
+
+def can_run_in_subinterpreter(code_str, python_interpreter):
+    """Check whether a script should be tried in a sub-interpreter first."""
+    return subinterpreters_available(
+        python_interpreter
+    ) and not EXTENSION_MODULES.search(code_str)
+
+
+def needs_subprocess(error):
+    """Check whether a script failed only because it ran in a sub-interpreter."""
+    return "ImportError" in error and "subinterpreter" in error.lower()
+
+
+def read_rss_mb(pid):
+    """Return a process's resident memory in MB, or None if unknown."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class InterpreterHost:
+    """A long-lived process that runs each script in a new sub-interpreter.
+
+    A host runs one script at a time. A script can't be stopped inside a
+    sub-interpreter, so on timeout or cancellation the whole host is killed.
+    The host gets the address space limit of a script process when it
+    starts, and each run EXECUTION_CPU_SECONDS more CPU time; the working
+    directory, environment and open files are reset before every run.
+    """
+
+    def __init__(self, python_interpreter=sys.executable):
+        """Start the host process."""
+        self.process = subprocess.Popen(
+            [python_interpreter, "-c", LIMITS_BOOTSTRAP + HOST_LOOP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True,
+            # The host moves its own CPU limit along from run to run
+            env={**os.environ, **limits_env(cpu=False)},
+        )
+
+    @property
+    def alive(self):
+        """Whether the host process is still running."""
+        return self.process.poll() is None
+
+    def run(self, code_str, timeout):
+        """Run a script and return its reply: {"error", "cpu_seconds"}.
+
+        Raises TimeoutError if no reply comes within timeout seconds and
+        RuntimeError if the host died.
+        """
+        request = {"code": code_str, "cpu_seconds": EXECUTION_CPU_SECONDS}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError(f"script ran longer than {timeout}s")
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("interpreter host exited")
+        return json.loads(line)
+
+    def kill(self):
+        """Kill the host and anything its scripts started."""
+        kill_process_group(self.process)
+        self.process.wait()
+
+
+class HostPool:
+    """Idle interpreter hosts, reused across runs."""
+
+    def __init__(self):
+        """Initialize with no hosts."""
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def checkout(self, python_interpreter):
+        """Return an idle live host, or start a new one."""
+        with self._lock:
+            while self._idle:
+                host = self._idle.pop()
+                if host.alive:
+                    return host
+        return InterpreterHost(python_interpreter)
+
+    def checkin(self, host):
+        """Keep a host that is still alive for the next run."""
+        if host.alive:
+            with self._lock:
+                self._idle.append(host)
+
+
+hosts = HostPool()
+
+
+def run_in_subinterpreter(
+    code_str, python_interpreter, on_usage=None, cancel_token=None
+):
+    """Run a script in a sub-interpreter; return None or an error tuple.
+
+    Behaves like utils.run_script: killed after EXECUTION_TIMEOUT_SECONDS
+    or on cancellation (raising JobCancelled), usage passed to on_usage.
+    Raises SubinterpreterUnsupported if the script must run in a subprocess.
+    """
+    reservation = admission.acquire(cancel_token=cancel_token)
+    host = unregister = usage = None
+    start = time.monotonic()
+    try:
+        host = hosts.checkout(python_interpreter)
+        if cancel_token is not None:
+            unregister = cancel_token.register(host.kill)
+        try:
+            reply = host.run(code_str, EXECUTION_TIMEOUT_SECONDS)
+        except TimeoutError as e:
+            host.kill()
+            reply = {"error": f"TimeoutError: {e}", "cpu_seconds": 0.0}
+        except (OSError, RuntimeError, ValueError) as e:
+            host.kill()
+            raise_if_cancelled(cancel_token)
+            reply = {"error": f"Interpreter host failed: {e}", "cpu_seconds": 0.0}
+
+        usage = {
+            "wall_seconds": round(time.monotonic() - start, 3),
+            "cpu_seconds": reply["cpu_seconds"],
+            "engine": "subinterpreter",
+        }
+        logger.info("📊 Script usage: %s", usage)
+        if on_usage:
+            on_usage(usage)
+
+        raise_if_cancelled(cancel_token)
+        error = reply["error"]
+        if error and needs_subprocess(error):
+            raise SubinterpreterUnsupported(error.strip().splitlines()[-1])
+        return (f"Execution error:\n{error.strip()}", None) if error else None
+    finally:
+        if unregister:
+            unregister()
+        if host is not None:
+            hosts.checkin(host)
+        admission.release(reservation, usage)
+
+
+def benchmark(runs=20, code_str=BENCHMARK_CODE):
+    """Compare startup latency and per-job memory of both engines.
+
+    Returns, per engine, the mean wall time of a small script and the
+    memory each job costs: a subprocess's peak RSS, or the growth of the
+    host's RSS per sub-interpreter run.
+    """
+    from .utils import run_script
+
+    usages = []
+    for _ in range(runs):
+        run_script(code_str, sys.executable, on_usage=usages.append)
+    results = {
+        "subprocess": {
+            "runs": runs,
+            "mean_ms": round(1000 * sum(u["wall_seconds"] for u in usages) / runs, 1),
+            "memory_mb_per_job": round(
+                sum(u.get("peak_rss_mb", 0) for u in usages) / runs, 1
+            ),
+        }
+    }
+
+    if not subinterpreters_available(sys.executable):
+        results["subinterpreter"] = {"available": False}
+        return results
+
+    host = InterpreterHost()
+    try:
+        host.run(code_str, EXECUTION_TIMEOUT_SECONDS)  # Start-up isn't per job
+        rss_before = read_rss_mb(host.process.pid)
+        start = time.monotonic()
+        for _ in range(runs):
+            host.run(code_str, EXECUTION_TIMEOUT_SECONDS)
+        elapsed = time.monotonic() - start
+        rss_after = read_rss_mb(host.process.pid)
+    finally:
+        host.kill()
+    growth = None
+    if rss_before is not None and rss_after is not None:
+        growth = round((rss_after - rss_before) / runs, 2)
+    results["subinterpreter"] = {
+        "runs": runs,
+        "mean_ms": round(1000 * elapsed / runs, 1),
+        "memory_mb_per_job": growth,
+        "host_rss_mb": rss_after,
+    }
+    return results
+
+
+def main(argv=None):
+    """Run the benchmark and print it as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark the execution engines")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.runs), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Appending newly generated shards to an existing dataset without rewriting it."""
+
+import csv
+import io
+import json
+import os
+import shutil
+from functools import partial
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.orc as orc
+import pyarrow.parquet as pq
+from .blobs import unshare
+from .constants import PARQUET_COMPRESSION, ZIP_CHUNK_BYTES
+from .validation import (
+    find_key_column,
+    iter_batches,
+    split_extension,
+)
+
+# Columnar files can't grow in place; shards stay next to them as part files
+PART_FILE_FORMATS = {"parquet", "feather", "orc"}
+
+# Codec of each compressed text format; concatenated streams stay readable
+STREAM_CODECS = {"csv.gz": "gzip", "csv.zst": "zstd"}
+
+# Bytes read from the end of a JSON file to find its closing bracket
+JSON_TAIL_BYTES = 4096
+
+# Compact, like pandas' to_json
+JSON_OPTIONS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def ensure_trailing_newline(path):
+    """Terminate the last line of a text file so appended lines start fresh."""
+    with open(path, "rb+") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def append_csv(target, shard):
+    """Append the shard's rows to a CSV file, dropping its header line."""
+    with open(target, "rb") as f:
+        header = f.readline()
+    ensure_trailing_newline(target)
+    with open(shard, "rb") as source, open(target, "ab") as destination:
+        if source.readline() != header:
+            raise ValueError(f"Columns of {shard} don't match {target}")
+        shutil.copyfileobj(source, destination, ZIP_CHUNK_BYTES)
+
+
+def split_first_line(stream, chunk_size=64 * 1024):
+    """Read a stream up to its first newline; return (line, bytes read past it).
+
+    Compressed pyarrow streams have no readline.
+    """
+    data = b""
+    while b"\n" not in data and (chunk := stream.read(chunk_size)):
+        data += chunk
+    line, newline, rest = data.partition(b"\n")
+    return line + newline, rest
+
+
+def append_compressed_csv(target, shard, output_format):
+    """Append the shard's rows to a gzip/zstd CSV as a new compressed stream.
+
+    gzip members and zstd frames can be concatenated, so the existing bytes
+    are never decompressed (past the header) or rewritten.
+    """
+    with pa.input_stream(target, compression="detect") as f:
+        header, _ = split_first_line(f)
+    codec = STREAM_CODECS[output_format]
+    with (
+        pa.input_stream(shard, compression="detect") as source,
+        pa.CompressedOutputStream(pa.OSFile(target, "ab"), codec) as destination,
+    ):
+        shard_header, chunk = split_first_line(source)
+        if shard_header != header:
+            raise ValueError(f"Columns of {shard} don't match {target}")
+        while chunk:
+            destination.write(chunk)
+            chunk = source.read(ZIP_CHUNK_BYTES)
+
+
+def append_ndjson(target, shard):
+    """Append the shard's records to a newline-delimited JSON file."""
+    ensure_trailing_newline(target)
+    with open(shard, "rb") as source, open(target, "ab") as destination:
+        shutil.copyfileobj(source, destination, ZIP_CHUNK_BYTES)
+
+
+def append_json(target, shard):
+    """Splice the shard's records into a JSON array before its closing bracket.
+
+    Only the tail of the existing file is read and rewritten.
+    """
+    with open(shard, "rb") as f:
+        records = f.read().strip()
+    if not (records.startswith(b"[") and records.endswith(b"]")):
+        raise ValueError(f"{shard} is not a JSON array")
+    records = records[1:-1].strip()
+    if not records:
+        return
+
+    with open(target, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(size - JSON_TAIL_BYTES, 0)
+        f.seek(start)
+        tail = f.read()
+        end = tail.rfind(b"]")
+        if end < 0 or tail[end + 1 :].strip():
+            raise ValueError(f"{target} is not a JSON array")
+        # An empty array gets no separating comma
+        empty = tail[:end].rstrip().endswith(b"[")
+        f.seek(start + end)
+        f.truncate()
+        f.write((b"" if empty else b",") + records + b"]")
+
+
+def read_schema(path, output_format):
+    """Return the Arrow schema of a columnar dataset file."""
+    if output_format == "parquet":
+        return pq.read_schema(path)
+    if output_format == "feather":
+        return pa.ipc.open_file(pa.memory_map(path)).schema
+    return orc.ORCFile(path).schema
+
+
+def check_part_file(target, shard, output_format):
+    """Check a columnar shard can be read together with the original file."""
+    if not read_schema(shard, output_format).equals(read_schema(target, output_format)):
+        raise ValueError(f"Schema of {shard} doesn't match {target}")
+
+
+def append_shard(target, shard, output_format):
+    """Merge a shard into its dataset file, or keep it as a matching part file.
+
+    Returns True if the shard was merged and can be deleted. Raises
+    ValueError for formats that can't be extended or mismatched columns.
+    """
+    output_format = output_format.lower()
+    if output_format in PART_FILE_FORMATS:
+        check_part_file(target, shard, output_format)
+        return False
+    if output_format == "csv":
+        append = append_csv
+    elif output_format in STREAM_CODECS:
+        append = partial(append_compressed_csv, output_format=output_format)
+    elif output_format == "ndjson":
+        append = append_ndjson
+    elif output_format == "json":
+        append = append_json
+    else:
+        raise ValueError(f"{output_format} datasets can't be extended")
+    # The target may be a link to a stored blob other jobs share
+    unshare(target)
+    append(target, shard)
+    return True
+
+
+def part_path(target, part):
+    """Return the path of a dataset file's part<n> shard."""
+    directory, name = os.path.split(target)
+    stem, extension = split_extension(name)
+    return os.path.join(directory, f"{stem}_part{part}{extension}")
+
+
+def snapshot_tail(path):
+    """Save the end of a file, so an append to it can be undone."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(size - JSON_TAIL_BYTES, 0)
+        f.seek(start)
+        return start, f.read()
+
+
+def restore_tail(path, snapshot):
+    """Undo appends to a file made after snapshot_tail."""
+    start, tail = snapshot
+    with open(path, "rb+") as f:
+        f.seek(start)
+        f.write(tail)
+        f.truncate()
+
+
+class NotSequential(Exception):
+    """Raised when a key column isn't a 0- or 1-based row number."""
+
+
+class KeySequence:
+    """Check keys count up from 0 or 1 and shift them by an offset."""
+
+    def __init__(self, offset):
+        """Shift keys by offset."""
+        self.offset = offset
+        self.expected = None
+
+    def shift(self, key):
+        """Return key + offset, raising NotSequential if it breaks the count."""
+        if isinstance(key, str) and key.isdigit():
+            value = int(key)
+        elif isinstance(key, int) and not isinstance(key, bool):
+            value = key
+        else:
+            raise NotSequential(key)
+        if value != self.expected and not (self.expected is None and value < 2):
+            raise NotSequential(key)
+        self.expected = value + 1
+        shifted = value + self.offset
+        return str(shifted) if isinstance(key, str) else shifted
+
+
+def shift_csv_keys(source, destination, offset):
+    """Copy CSV text with its key column shifted."""
+    reader = csv.reader(source)
+    writer = csv.writer(destination, lineterminator="\n")
+    header = next(reader, None)
+    if not find_key_column(header):
+        raise NotSequential(header)
+    writer.writerow(header)
+    keys = KeySequence(offset)
+    for row in reader:
+        row[0] = keys.shift(row[0])
+        writer.writerow(row)
+
+
+def shift_record_keys(records, offset):
+    """Yield JSON records with their key field shifted."""
+    keys = KeySequence(offset)
+    for record in records:
+        key = find_key_column(list(record)) if isinstance(record, dict) else None
+        if key is None:
+            raise NotSequential(record)
+        record[key] = keys.shift(record[key])
+        yield record
+
+
+def shift_table_keys(table, offset):
+    """Return a columnar table with its key column shifted."""
+    column = table.column(0) if table.num_columns else None
+    if (
+        not find_key_column(table.column_names)
+        or not pa.types.is_integer(column.type)
+        or column.null_count
+    ):
+        raise NotSequential(table.column_names[:1])
+    values = column.to_numpy()
+    if len(values) and (
+        values[0] > 1 or not np.array_equal(values, values[0] + np.arange(len(values)))
+    ):
+        raise NotSequential(values[0])
+    shifted = pc.add(column, pa.scalar(offset, column.type))
+    return table.set_column(0, table.field(0), shifted)
+
+
+def rewrite_shard(shard, temporary, output_format, offset):
+    """Write a copy of the shard with its keys shifted to temporary."""
+    if output_format in ("csv", *STREAM_CODECS):
+        codec = STREAM_CODECS.get(output_format)
+        with (
+            pa.input_stream(shard, compression="detect") as raw_source,
+            pa.output_stream(temporary, compression=codec) as raw_destination,
+            io.TextIOWrapper(raw_source, encoding="utf-8", newline="") as source,
+            io.TextIOWrapper(
+                raw_destination, encoding="utf-8", newline=""
+            ) as destination,
+        ):
+            shift_csv_keys(source, destination, offset)
+    elif output_format == "ndjson":
+        with (
+            open(shard, encoding="utf-8") as source,
+            open(temporary, "w", encoding="utf-8") as destination,
+        ):
+            records = (json.loads(line) for line in source if line.strip())
+            for record in shift_record_keys(records, offset):
+                destination.write(json.dumps(record, **JSON_OPTIONS) + "\n")
+    elif output_format == "json":
+        with open(shard, encoding="utf-8") as f:
+            records = json.load(f)
+        if not isinstance(records, list):
+            raise NotSequential(records)
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(list(shift_record_keys(records, offset)), f, **JSON_OPTIONS)
+    elif output_format == "parquet":
+        table = shift_table_keys(pq.read_table(shard), offset)
+        pq.write_table(table, temporary, compression=PARQUET_COMPRESSION)
+    elif output_format == "feather":
+        table = shift_table_keys(feather.read_table(shard), offset)
+        feather.write_feather(table, temporary, compression="zstd")
+    else:
+        table = shift_table_keys(orc.read_table(shard), offset)
+        orc.write_table(table, temporary)
+    return temporary
+
+
+def shift_keys(shard, output_format, offset):
+    """Renumber a shard's key column to follow the rows already written.
+
+    A re-run script numbers its rows from 0 or 1 again, so its key column
+    (see validation.find_key_column) would repeat the existing keys. Keys
+    that aren't such a row number are left alone. Returns True if the
+    shard was rewritten.
+    """
+    temporary = shard + ".keys"
+    try:
+        rewrite_shard(shard, temporary, output_format.lower(), offset)
+    except (NotSequential, pa.ArrowInvalid, ValueError):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+    os.replace(temporary, shard)
+    return True
+
+
+def integer_keys(batch):
+    """Return a batch's key column if it holds integers, else None."""
+    if not find_key_column(batch.schema.names):
+        return None
+    column = batch.column(0)
+    return column if pa.types.is_integer(column.type) else None
+
+
+def scan_dataset(paths, output_format):
+    """Count the rows and find the largest integer key of dataset files.
+
+    Returns {"rows", "last_key"}; last_key is None without an integer key
+    column (see validation.find_key_column).
+    """
+    rows, last_key = 0, None
+    for path in paths:
+        for batch in iter_batches(path, output_format.lower()):
+            rows += batch.num_rows
+            keys = integer_keys(batch)
+            value = pc.max(keys).as_py() if keys is not None else None
+            if value is not None:
+                last_key = value if last_key is None else max(last_key, value)
+    return {"rows": rows, "last_key": last_key}
+
+
+def count_keys_up_to(path, output_format, last_key):
+    """Count the integer keys of a dataset file that are at most last_key."""
+    count = 0
+    for batch in iter_batches(path, output_format.lower()):
+        keys = integer_keys(batch)
+        if keys is None:
+            return 0
+        count += pc.sum(pc.less_equal(keys, last_key)).as_py() or 0
+    return count
@@ -0,0 +1,155 @@
+"""Logging setup: records are formatted and written by a background thread.
+
+Request threads only put records on a queue, so a slow sink (a pipe, a
+log shipper) never stalls generation. Each record carries the job ID and
+progress stage of the code that logged it.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from contextlib import contextmanager
+
+# Job fields of the code running in the current thread or task
+_context = contextvars.ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; anything else was passed as extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None)))
+RECORD_ATTRIBUTES |= {"message", "asctime", "taskName"}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def current_fields():
+    """Return the log fields of the current thread or task."""
+    return _context.get() or {}
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (e.g. job_id) to every record logged inside the block."""
+    token = _context.set({**current_fields(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def update_log_context(**fields):
+    """Change fields of the enclosing log_context (e.g. the current stage).
+
+    Outside a log_context this does nothing, so fields can't outlive a job
+    in a reused thread.
+    """
+    if _context.get() is not None:
+        _context.set({**_context.get(), **fields})
+
+
+def run_in_context(function):
+    """Bind a function to a copy of the caller's log fields, for a worker thread.
+
+    Wrap once per task: one copy can't run in two threads at a time.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current log context onto records, in the logging thread."""
+
+    def filter(self, record):
+        """Add the context fields the record doesn't already have."""
+        for key, value in current_fields().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Let through the first and then every nth DEBUG record of each message.
+
+    High-frequency debug events (per token, per row batch) cost a queue put
+    each; sampling keeps them visible at a fraction of the cost.
+    """
+
+    def __init__(self, every):
+        """Initialize with the sampling period (1 keeps everything)."""
+        super().__init__()
+        self.every = max(int(every), 1)
+        self._counts = {}
+
+    def filter(self, record):
+        """Drop all but one in every DEBUG records of the same message."""
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        """Serialize the message, its level and logger, and any extra fields."""
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines, with the job ID and stage when there is one."""
+
+    def format(self, record):
+        """Prefix the message with the record's job fields."""
+        line = super().format(record)
+        job_id, stage = getattr(record, "job_id", None), getattr(record, "stage", None)
+        if job_id:
+            return f"[{job_id}{'/' + stage if stage else ''}] {line}"
+        return line
+
+
+def setup_logging(level="INFO", log_format="text", debug_sample_every=100):
+    """Route every log record through a queue to a background writer thread.
+
+    Safe to call more than once; only the first call installs handlers.
+    log_format is "json" for structured lines or "text" for plain ones.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream = logging.StreamHandler()
+        if log_format == "json":
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(TextFormatter("%(levelname)s: %(message)s"))
+
+        handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        handler.addFilter(DebugSampler(debug_sample_every))
+        handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(handler)
+
+        _listener = logging.handlers.QueueListener(handler.queue, stream)
+        _listener.start()
+        # Write out whatever is still queued when the process exits
+        atexit.register(_listener.stop)
@@ -3,6 +3,8 @@
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
+from .cancellation import JobCancelled, raise_if_cancelled
+from .progress import report
 from .constants import OPENAI_MODEL, logger
 
 # Load environment variables from .env file
@@ -18,9 +20,93 @@ if not openai_api_key:
 openai = OpenAI(api_key=openai_api_key)
 
 
-def get_gpt_completion(prompt, system_message):
-    """Call OpenAI's GPT model with prompt and system message."""
+def report_usage(on_usage, usage, truncated=False):
+    """Pass the token counts of a finished call to on_usage, if both exist.
+
+    truncated tells whether a completion was cut off by max_tokens.
+    """
+    if on_usage and usage:
+        on_usage(
+            {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "truncated": truncated,
+            }
+        )
+
+
+def token_limit(max_tokens):
+    """Return the create() keyword capping the completion, if a cap is set."""
+    return {"max_tokens": max_tokens} if max_tokens else {}
+
+
+def read_stream(stream, n, cancel_token=None, on_progress=None, on_usage=None):
+    """Collect streamed choices, closing the HTTP stream if the job is cancelled.
+
+    Each chunk carries about one token; the running count is reported to
+    on_progress as "llm" events. The final usage chunk goes to on_usage.
+    Returns one content string per choice, in choice index order.
+    """
+    unregister = cancel_token.register(stream.close) if cancel_token else None
+    parts = [[] for _ in range(n)]
+    tokens = 0
+    truncated = False
     try:
+        for chunk in stream:
+            raise_if_cancelled(cancel_token)
+            if not chunk.choices:
+                # Sent last when the request asks for stream usage
+                report_usage(on_usage, chunk.usage, truncated)
+            for choice in chunk.choices:
+                truncated = truncated or choice.finish_reason == "length"
+                if choice.delta.content:
+                    parts[choice.index].append(choice.delta.content)
+                    tokens += 1
+            report(on_progress, "llm", tokens=tokens)
+    except JobCancelled:
+        raise
+    except Exception:
+        # Closing the stream mid-read surfaces as a connection error
+        raise_if_cancelled(cancel_token)
+        raise
+    finally:
+        if unregister:
+            unregister()
+        stream.close()
+    raise_if_cancelled(cancel_token)
+    return ["".join(part) for part in parts]
+
+
+def get_gpt_completion(
+    prompt,
+    system_message,
+    cancel_token=None,
+    on_progress=None,
+    on_usage=None,
+    max_tokens=None,
+):
+    """Call OpenAI's GPT model with prompt and system message.
+
+    With a cancel_token or on_progress the reply is streamed, so cancelling
+    aborts the request instead of waiting for (and paying for) the whole
+    completion, and tokens received are reported as they arrive. Token usage
+    of the call is passed to on_usage. max_tokens caps the completion length.
+    """
+    try:
+        raise_if_cancelled(cancel_token)
+        if cancel_token is not None or on_progress is not None:
+            stream = openai.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt},
+                ],
+                stream=True,
+                stream_options={"include_usage": True},
+                **token_limit(max_tokens),
+            )
+            return read_stream(stream, 1, cancel_token, on_progress, on_usage)[0]
+
         # Create chat completion with system and user messages
         response = openai.chat.completions.create(
             model=OPENAI_MODEL,
@@ -29,9 +115,60 @@ def get_gpt_completion(prompt, system_message):
                 {"role": "user", "content": prompt},
             ],
             stream=False,
+            **token_limit(max_tokens),
         )
+        truncated = any(c.finish_reason == "length" for c in response.choices)
+        report_usage(on_usage, response.usage, truncated)
         # Extract and return the generated content
         return response.choices[0].message.content
     except Exception as e:
         logger.error(f"GPT error: {e}")
         raise
+
+
+def get_gpt_completions(
+    prompt,
+    system_message,
+    n,
+    cancel_token=None,
+    on_progress=None,
+    on_usage=None,
+    max_tokens=None,
+):
+    """Request n alternative completions in a single GPT call.
+
+    Cancellation, progress and usage callbacks work as in get_gpt_completion.
+    """
+    try:
+        raise_if_cancelled(cancel_token)
+        if cancel_token is not None or on_progress is not None:
+            stream = openai.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt},
+                ],
+                n=n,
+                stream=True,
+                stream_options={"include_usage": True},
+                **token_limit(max_tokens),
+            )
+            return read_stream(stream, n, cancel_token, on_progress, on_usage)
+
+        response = openai.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+            n=n,
+            stream=False,
+            **token_limit(max_tokens),
+        )
+        truncated = any(c.finish_reason == "length" for c in response.choices)
+        report_usage(on_usage, response.usage, truncated)
+        # One entry per candidate, in the order the API returned them
+        return [choice.message.content for choice in response.choices]
+    except Exception as e:
+        logger.error(f"GPT error: {e}")
+        raise
@@ -0,0 +1,68 @@
+"""Streaming ZIP packaging of multi-file datasets."""
+
+import io
+import os
+import zipfile
+from .constants import ZIP_CHUNK_BYTES
+
+# Formats that are already compressed gain nothing from deflate
+STORED_EXTENSIONS = {".parquet", ".feather", ".arrow", ".orc", ".gz", ".zst", ".zip"}
+
+
+class StreamSink(io.RawIOBase):
+    """Write-only, unseekable buffer that hands out what was written so far."""
+
+    def __init__(self):
+        """Initialize an empty sink."""
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        """Report that the sink accepts writes."""
+        return True
+
+    def write(self, data):
+        """Buffer bytes until the next drain."""
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        """Return the number of bytes written, which zipfile needs for offsets."""
+        return self._offset
+
+    def drain(self):
+        """Return and forget the bytes buffered since the last drain."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compression_for(path):
+    """Store compressed formats as-is and deflate text formats."""
+    extension = os.path.splitext(path)[1].lower()
+    return (
+        zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    )
+
+
+def stream_zip(paths, chunk_size=ZIP_CHUNK_BYTES):
+    """Yield a ZIP archive of the given files while it is being written.
+
+    Nothing is written to disk and at most about one chunk per entry is held
+    in memory, so the archive can be sent to a client as it is built.
+    """
+    sink = StreamSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for path in paths:
+            info = zipfile.ZipInfo.from_file(path, arcname=os.path.basename(path))
+            info.compress_type = compression_for(path)
+            with open(path, "rb") as source, archive.open(info, "w") as entry:
+                while chunk := source.read(chunk_size):
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    # Central directory is written when the archive closes
+    yield sink.drain()
@@ -1,11 +1,22 @@
 """Pipeline orchestration for dataset generation."""
 
 import os
+import queue
 import logging
 import threading
+import time
 import gradio as gr
+from src.cancellation import CancellationToken, JobCancelled
 from src.datagen import DataGen
-from src.constants import FILE_CLEANUP_SECONDS
+from src.logs import log_context
+from src.preview import describe_row_count, read_preview
+from src.progress import render_progress
+from src.scheduler import FairScheduler, client_id, predict_cost
+from src.store import RUNNING, WORKER_ID, get_stores
+from src.warmup import CatalogWarmer
+from src.worker import Heartbeat, QueueWorker, commit_artifacts
+from src.workspace import new_job_id, remove_workspace
+from src.constants import FILE_CLEANUP_SECONDS, PROGRESS_INTERVAL_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -19,19 +30,175 @@ def safe_delete(file_path):
         pass  # Ignore deletion errors
 
 
+def archive_link(job_id, manifest):
+    """Return a Markdown link to the ZIP of a multi-file job, or ""."""
+    files = (manifest or {}).get("files", [])
+    if len(files) < 2:
+        return ""
+    return f"[📦 Download all {len(files)} files (ZIP)](/download/{job_id}.zip)"
+
+
+def preview_table(preview):
+    """Label preview columns with their types for display."""
+    rows = preview["rows"]
+    if rows is None:
+        return None
+    types = dict(preview["schema"])
+    return rows.rename(columns=lambda c: f"{c} ({types.get(str(c), '?')})")
+
+
+def progress_message(progress, elapsed, num_samples):
+    """Render the latest (stage, details) progress event, if any, as status."""
+    if progress is None:
+        return f"⏳ Generating dataset... · {elapsed:.0f}s"
+    stage, details = progress
+    return render_progress(stage, details, elapsed, num_samples)
+
+
+def load_preview(file_path, output_format, delete=False):
+    """Read a preview of a dataset file, or None if it can't be previewed."""
+    try:
+        return read_preview(file_path, output_format)
+    except Exception as e:
+        logger.warning("Could not load preview: %s", e)
+        return None
+    finally:
+        # Dry-run outputs are only needed for the preview
+        if delete:
+            safe_delete(file_path)
+
+
 class DatasetPipeline:
     """Handles the dataset generation pipeline."""
 
-    def __init__(self):
-        """Initialize the pipeline with a DataGen instance."""
+    def __init__(self, job_store=None, artifact_store=None, scheduler=None):
+        """Initialize the pipeline with a DataGen instance and shared stores."""
         self.generator = DataGen()
+        # Shares generation slots fairly between web clients
+        self.scheduler = scheduler or FairScheduler()
+        # Popular specs generated ahead of time; started by the app at boot
+        self.warmer = CatalogWarmer(self.generator, self.scheduler)
+        if job_store is None or artifact_store is None:
+            default_jobs, default_artifacts = get_stores()
+            job_store = job_store or default_jobs
+            artifact_store = artifact_store or default_artifacts
+        self.job_store = job_store
+        self.artifact_store = artifact_store
+
+        # Cancellation token of the running job of each browser session
+        self.active_tokens = {}
+        self._tokens_lock = threading.Lock()
+
+    def track(self, action, job_id, *args, **kwargs):
+        """Record job state in the shared store without failing the job."""
+        try:
+            getattr(self.job_store, action)(job_id, *args, **kwargs)
+        except Exception as e:
+            logger.warning("Could not record %s for job %s: %s", action, job_id, e)
 
-    def generate(self, business_problem, dataset_type, output_format, num_samples):
-        """Generate synthetic dataset based on user inputs."""
+    def enqueue_job(self, **input_data):
+        """Queue a job for any worker sharing the store, and return its id."""
+        job_id = new_job_id()
+        self.job_store.create_job(job_id, input_data)
+        return job_id
+
+    def run_queued_job(self, worker_id=WORKER_ID):
+        """Claim the oldest queued job and run it here; return it, or None.
+
+        Dedicated workers run `python -m src.worker` instead.
+        """
+        worker = QueueWorker(
+            self.generator, self.job_store, self.artifact_store, worker_id
+        )
+        return worker.run_once()
+
+    def commit(self, job_id, stats):
+        """Hand a finished job's files to the artifact store."""
+        commit_artifacts(self.artifact_store, job_id, stats)
+
+    def discard(self, workspace, job_id):
+        """Remove a finished job's workspace and release its stored files."""
+        try:
+            self.artifact_store.release(job_id)
+        except Exception as e:
+            logger.warning("Could not release files of job %s: %s", job_id, e)
+        remove_workspace(workspace)
+
+    def charge(self, client, stats):
+        """Count a job's model tokens and script CPU time against its client."""
+        tokens = sum(
+            u["prompt_tokens"] + u["completion_tokens"] for u in stats.get("llm", [])
+        )
+        cpu_seconds = sum(u.get("cpu_seconds", 0) for u in stats.get("executions", []))
+        if tokens or cpu_seconds:
+            self.scheduler.charge(client, tokens, cpu_seconds)
+
+    def run_generator(
+        self, events, input_data, stats, cancel_token=None, client="anonymous"
+    ):
+        """Run the generator in a worker thread, reporting through a queue.
+
+        The job first waits for a generation slot in fair-share order.
+        """
+
+        def on_progress(stage, **details):
+            events.put(("progress", (stage, details)))
+
+        cost = predict_cost(input_data["num_samples"], input_data["output_format"])
+        try:
+            with (
+                log_context(job_id=input_data["job_id"], client=client),
+                self.scheduler.slot(client, cost, cancel_token, on_progress),
+            ):
+                file_path = self.generator.generate_dataset(
+                    on_preview=lambda path: events.put(("preview", path)),
+                    on_progress=on_progress,
+                    stats=stats,
+                    cancel_token=cancel_token,
+                    **input_data,
+                )
+            events.put(("done", file_path))
+        except JobCancelled as e:
+            # The UI may have stopped listening, so clean up here
+            job_id = input_data["job_id"]
+            remove_workspace(self.generator.workspace_for(job_id))
+            self.track("fail_job", job_id, "Cancelled by user.")
+            events.put(("error", e))
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            self.charge(client, stats)
+
+    def cancel(self, request: gr.Request = None):
+        """Cancel the running job of the caller's session, if any."""
+        with self._tokens_lock:
+            token = self.active_tokens.get(getattr(request, "session_hash", None))
+        if token is not None:
+            token.cancel()
+        return ["🛑 Generation cancelled.", gr.update(visible=True)]
+
+    def generate(
+        self,
+        business_problem,
+        dataset_type,
+        output_format,
+        num_samples,
+        request: gr.Request = None,
+    ):
+        """Generate synthetic dataset based on user inputs.
+
+        Closing the generator (the client went away) or calling cancel() from
+        the same session aborts the model call and kills the running script.
+        """
         # Check if business problem is empty
         if not business_problem.strip():
             error_msg = "❌ Please enter a business problem before generating."
-            yield [gr.update(visible=False), gr.update(visible=True), error_msg]
+            yield [
+                gr.update(visible=False),
+                gr.update(visible=True),
+                error_msg,
+                gr.update(visible=False),
+            ]
             return
 
         # Initial feedback while generating
@@ -39,8 +206,19 @@ class DatasetPipeline:
             gr.update(visible=False),
             gr.update(visible=False),
             "⏳ Generating dataset...",
+            gr.update(visible=False),
         ]
 
+        # Every artifact of this request lives in the job's workspace
+        job_id = new_job_id()
+        workspace = self.generator.workspace_for(job_id)
+
+        session = getattr(request, "session_hash", None)
+        token = CancellationToken()
+        with self._tokens_lock:
+            self.active_tokens[session] = token
+        heartbeat = None
+
         try:
             # Pack inputs into a dictionary for the generator
             input_data = {
@@ -48,38 +226,157 @@ class DatasetPipeline:
                 "dataset_type": dataset_type,
                 "output_format": output_format,
                 "num_samples": num_samples,
+                "job_id": job_id,
             }
+            # Other workers can report on this job from the shared store
+            self.track(
+                "create_job",
+                job_id,
+                {k: v for k, v in input_data.items() if k != "job_id"},
+                status=RUNNING,
+                worker_id=WORKER_ID,
+            )
+            # Without heartbeats, workers would reap the job as abandoned
+            heartbeat = Heartbeat(self.job_store, job_id, WORKER_ID)
+
+            events = queue.Queue()
+            stats = {}
+            warmed = self.warmer.lookup(
+                business_problem, dataset_type, output_format, num_samples
+            )
+            if warmed is not None:
+                # Catalog spec generated ahead of time: hand out its files
+                file_path, stats["manifest"] = self.warmer.serve(warmed, job_id)
+                events.put(("done", file_path))
+            else:
+                # Generate in the background so the dry-run preview shows early
+                threading.Thread(
+                    target=self.run_generator,
+                    args=(events, input_data, stats, token, client_id(request)),
+                    daemon=True,
+                ).start()
 
-            # Generate dataset file
-            file_path = self.generator.generate_dataset(**input_data)
+            start = time.monotonic()
+            progress, last_update = None, 0.0
+            while True:
+                try:
+                    kind, value = events.get(timeout=PROGRESS_INTERVAL_SECONDS)
+                except queue.Empty:
+                    # Nothing new: refresh the elapsed time of the current stage
+                    kind, value = "tick", None
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    file_path = value
+                    break
+
+                if kind in ("progress", "tick"):
+                    elapsed = time.monotonic() - start
+                    if kind == "progress":
+                        stage_changed = progress is None or progress[0] != value[0]
+                        progress = value
+                        if stage_changed:
+                            self.track("update_progress", job_id, value[0])
+                        elif elapsed - last_update < PROGRESS_INTERVAL_SECONDS:
+                            # Token and row counts arrive faster than worth showing
+                            continue
+                    last_update = elapsed
+                    yield [
+                        gr.update(visible=False),
+                        gr.update(visible=False),
+                        progress_message(progress, elapsed, num_samples),
+                        gr.update(),
+                    ]
+                    continue
+
+                self.track("update_progress", job_id, "preview")
+                preview = load_preview(value, output_format, delete=True)
+                if preview is not None and preview["rows"] is not None:
+                    yield [
+                        gr.update(visible=False),
+                        gr.update(visible=False),
+                        "⏳ Preview ready, generating the full dataset...",
+                        gr.update(value=preview_table(preview), visible=True),
+                    ]
 
             # Check if file exists and return success message + file path
             if isinstance(file_path, str) and os.path.exists(file_path):
-                # Auto-delete after 5min with safe deletion
+                self.commit(job_id, stats)
+                # Auto-delete the whole workspace after the cleanup delay
                 threading.Timer(
-                    FILE_CLEANUP_SECONDS, safe_delete, args=[file_path]
+                    FILE_CLEANUP_SECONDS,
+                    self.discard,
+                    args=[workspace],
+                    kwargs={"job_id": job_id},
                 ).start()
+                # Show the real file's schema, row count and first rows
+                preview = load_preview(file_path, output_format)
+                table, row_count = gr.update(), ""
+                if preview is not None:
+                    row_count = describe_row_count(preview, num_samples)
+                    if preview["rows"] is not None:
+                        table = gr.update(value=preview_table(preview), visible=True)
+
+                # Multi-entity datasets are also offered as one archive
+                archive = archive_link(job_id, stats.get("manifest"))
+                self.track(
+                    "complete_job",
+                    job_id,
+                    {"file_path": file_path, "manifest": stats.get("manifest")},
+                )
+                message = f"✅ Dataset ready for download. {row_count}".strip()
+                validation = stats.get("validation")
+                if validation and validation["issues"]:
+                    issues = "; ".join(validation["issues"])
+                    message = f"{message}\n\n⚠️ Validation found: {issues}"
                 success_update = [
                     gr.update(value=file_path, visible=True),
                     gr.update(visible=True),
-                    "✅ Dataset ready for download.",
+                    f"{message}\n\n{archive}" if archive else message,
+                    table,
                 ]
                 yield success_update
             else:
                 # Handle invalid or missing file
+                remove_workspace(workspace)
+                self.track("fail_job", job_id, "File not created or path invalid.")
                 error_update = [
                     gr.update(visible=False),
                     gr.update(visible=True),
                     "❌ Error: File not created or path invalid.",
+                    gr.update(visible=False),
                 ]
                 yield error_update
 
+        except JobCancelled:
+            yield [
+                gr.update(visible=False),
+                gr.update(visible=True),
+                "🛑 Generation cancelled.",
+                gr.update(visible=False),
+            ]
+
+        except GeneratorExit:
+            # The client disconnected: stop paying for the model and the script
+            token.cancel()
+            raise
+
         except Exception as e:
             # Catch and display any errors in the pipeline
             logger.error("Pipeline error: %s", e)
+            remove_workspace(workspace)
+            self.track("fail_job", job_id, e)
             error_update = [
                 gr.update(visible=False),
                 gr.update(visible=True),
                 f"❌ Pipeline error: {e}",
+                gr.update(visible=False),
             ]
             yield error_update
+
+        finally:
+            if heartbeat is not None:
+                heartbeat.stop()
+            with self._tokens_lock:
+                if self.active_tokens.get(session) is token:
+                    del self.active_tokens[session]
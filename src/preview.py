@@ -0,0 +1,158 @@
+"""Fast dataset previews that read metadata and a bounded head only."""
+
+import io
+import json
+import mmap
+import pandas as pd
+import pyarrow as pa
+import pyarrow.orc as orc
+import pyarrow.parquet as pq
+from .validation import count_lines_in_stream
+from .constants import PREVIEW_HEAD_BYTES, PREVIEW_ROWS
+
+# Chunk size used when counting lines through a memory map
+LINE_COUNT_CHUNK = 1 << 24
+
+
+def count_lines(file_path):
+    """Count newline-terminated lines by scanning a memory map in chunks."""
+    with open(file_path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = sum(
+                mm[i : i + LINE_COUNT_CHUNK].count(b"\n")
+                for i in range(0, len(mm), LINE_COUNT_CHUNK)
+            )
+            # A last line without a trailing newline still counts
+            return lines + (mm[-1:] != b"\n")
+
+
+def read_head(file_path, max_bytes=PREVIEW_HEAD_BYTES, compression=None):
+    """Read up to max_bytes of text, cut back to the last complete line.
+
+    Compressed files are decompressed on the fly and only as far as needed.
+    """
+    with pa.input_stream(file_path, compression=compression) as f:
+        head = f.read(max_bytes)
+        if f.read(1):
+            head = head[: head.rfind(b"\n") + 1]
+    return head.decode("utf-8", errors="replace")
+
+
+def schema_of(df):
+    """Return (column, dtype) pairs for a dataframe."""
+    return [(str(name), str(dtype)) for name, dtype in df.dtypes.items()]
+
+
+def preview_parquet(file_path, max_rows):
+    """Read the footer and the first rows of the first row group."""
+    parquet_file = pq.ParquetFile(pa.memory_map(file_path, "r"))
+    schema = [(field.name, str(field.type)) for field in parquet_file.schema_arrow]
+
+    rows = parquet_file.schema_arrow.empty_table().to_pandas()
+    if parquet_file.num_row_groups:
+        batch = next(parquet_file.iter_batches(batch_size=max_rows, row_groups=[0]))
+        rows = batch.to_pandas()
+
+    return {"schema": schema, "num_rows": parquet_file.metadata.num_rows, "rows": rows}
+
+
+def preview_csv(file_path, max_rows):
+    """Parse the head of a CSV file; rows are counted from line breaks.
+
+    Quoted fields with embedded newlines make the row count an overestimate.
+    """
+    rows = pd.read_csv(io.StringIO(read_head(file_path)), nrows=max_rows)
+    num_rows = max(count_lines(file_path) - 1, 0)
+    return {"schema": schema_of(rows), "num_rows": num_rows, "rows": rows}
+
+
+def preview_compressed_csv(file_path, max_rows):
+    """Decompress the head of a gzip or zstd CSV file; rows need a full scan."""
+    head = read_head(file_path, compression="detect")
+    rows = pd.read_csv(io.StringIO(head), nrows=max_rows)
+    with pa.input_stream(file_path, compression="detect") as f:
+        num_rows = max(count_lines_in_stream(f) - 1, 0)
+    return {"schema": schema_of(rows), "num_rows": num_rows, "rows": rows}
+
+
+def preview_feather(file_path, max_rows):
+    """Read the schema and the first record batch of an Arrow IPC file."""
+    reader = pa.ipc.open_file(pa.memory_map(file_path, "r"))
+    schema = [(field.name, str(field.type)) for field in reader.schema]
+    rows = reader.schema.empty_table().to_pandas()
+    if reader.num_record_batches:
+        rows = reader.get_batch(0).slice(0, max_rows).to_pandas()
+    return {"schema": schema, "num_rows": reader.count_rows(), "rows": rows}
+
+
+def preview_orc(file_path, max_rows):
+    """Read the footer and the first stripe of an ORC file."""
+    orc_file = orc.ORCFile(file_path)
+    schema = [(field.name, str(field.type)) for field in orc_file.schema]
+    rows = orc_file.schema.empty_table().to_pandas()
+    if orc_file.nstripes:
+        rows = orc_file.read_stripe(0).slice(0, max_rows).to_pandas()
+    return {"schema": schema, "num_rows": orc_file.nrows, "rows": rows}
+
+
+def preview_ndjson(file_path, max_rows):
+    """Parse the first records of a newline-delimited JSON file."""
+    lines = read_head(file_path).splitlines()[:max_rows]
+    rows = pd.DataFrame([json.loads(line) for line in lines if line.strip()])
+    return {"schema": schema_of(rows), "num_rows": count_lines(file_path), "rows": rows}
+
+
+def preview_json(file_path, max_rows):
+    """Parse a JSON array of records.
+
+    Arrays have no line structure to bound the read, so the whole file is parsed.
+    """
+    with open(file_path, encoding="utf-8") as f:
+        records = json.load(f)
+    rows = pd.DataFrame(records[:max_rows])
+    return {"schema": schema_of(rows), "num_rows": len(records), "rows": rows}
+
+
+def preview_text(file_path, max_rows):
+    """Return the first lines of a free text file."""
+    text = "\n".join(read_head(file_path).splitlines()[: max_rows * 5])
+    return {"schema": [], "num_rows": None, "rows": None, "text": text}
+
+
+PREVIEW_READERS = {
+    "parquet": preview_parquet,
+    "csv": preview_csv,
+    "csv.gz": preview_compressed_csv,
+    "csv.zst": preview_compressed_csv,
+    "feather": preview_feather,
+    "orc": preview_orc,
+    "ndjson": preview_ndjson,
+    "json": preview_json,
+    "markdown": preview_text,
+}
+
+
+def read_preview(file_path, output_format, max_rows=PREVIEW_ROWS):
+    """Return schema, total row count and first rows of a dataset file.
+
+    The result is a dict with "schema" (list of (column, type) pairs),
+    "num_rows" (None for free text), "rows" (a dataframe, or None) and, for
+    text formats, "text". Raises ValueError for unknown formats.
+    """
+    reader = PREVIEW_READERS.get(output_format.lower())
+    if reader is None:
+        raise ValueError(f"No preview reader for format: {output_format}")
+    return reader(file_path, max_rows)
+
+
+def describe_row_count(preview, num_samples):
+    """Summarize the row count and whether it matches the request."""
+    num_rows = preview["num_rows"]
+    if num_rows is None:
+        return ""
+    columns = len(preview["schema"])
+    if num_rows == int(num_samples):
+        return f"📏 {num_rows:,} rows × {columns} columns, as requested."
+    return f"⚠️ {num_rows:,} rows × {columns} columns, expected {int(num_samples):,}."
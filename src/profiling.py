@@ -0,0 +1,204 @@
+"""Opt-in profiling of generated scripts: where their time and memory go.
+
+With profiling on, a script runs behind a bootstrap that samples the main
+thread's stack every few milliseconds and, from the first sample taken
+outside an import, traces allocations with tracemalloc. Tracing every
+allocation slows allocation-heavy Python code down several times over;
+set PROFILE_TRACEMALLOC_FRAMES=0 for timings only. When the script exits,
+the raw samples are written to a file and turned into a compact hot-spot
+report: the script lines most samples were in, peak traced memory, the
+lines holding the most memory near that peak and, optionally, collapsed
+stacks for flamegraph tools.
+"""
+
+import json
+import os
+import tempfile
+from .constants import (
+    PROFILE_COLLAPSED_STACKS,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_STACKS,
+    PROFILE_TOP_LINES,
+    PROFILE_TRACEMALLOC_FRAMES,
+)
+
+# Environment variable carrying the profiler settings and output path
+PROFILE_ENV = "DATAGEN_PROFILE"
+
+# File name scripts are compiled under by the bootstraps, to tell their
+# frames apart from the bootstrap's own
+SCRIPT_FILENAME = "<script>"
+
+# Runs before the script's bootstrap; reports when the interpreter exits
+PROFILE_BOOTSTRAP = """
+import atexit, json, os, sys, threading, tracemalloc
+
+def _start_profiler():
+    settings = json.loads(os.environ.pop("DATAGEN_PROFILE"))
+    main = threading.main_thread().ident
+    script = settings["script"]
+    hot, stacks, state = {}, {}, {"samples": 0, "snapshot": None, "size": 0}
+    stopped = threading.Event()
+
+    def label(frame):
+        code = frame.f_code
+        if code.co_filename == script:
+            return f"script:{code.co_name}:{frame.f_lineno}"
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        return f"{module}:{code.co_name}"
+
+    def sample():
+        while not stopped.wait(settings["interval_ms"] / 1000):
+            frame = sys._current_frames().get(main)
+            line, names, importing = None, [], False
+            while frame is not None:
+                if line is None and frame.f_code.co_filename == script:
+                    line = frame.f_lineno
+                importing = importing or "importlib" in frame.f_code.co_filename
+                if settings["stacks"]:
+                    names.append(label(frame))
+                frame = frame.f_back
+            if line is None:
+                continue
+            state["samples"] += 1
+            hot[line] = hot.get(line, 0) + 1
+            if settings["stacks"]:
+                key = ";".join(reversed(names))
+                stacks[key] = stacks.get(key, 0) + 1
+            if not tracemalloc.is_tracing():
+                # Tracing imports would take longer than most scripts run
+                if settings["frames"] and not importing:
+                    tracemalloc.start(settings["frames"])
+                continue
+            # Keep a snapshot from near the memory peak, retaken on 25% growth
+            current = tracemalloc.get_traced_memory()[0]
+            if current > max(1.25 * state["size"], 1 << 20):
+                state["snapshot"], state["size"] = tracemalloc.take_snapshot(), current
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    def dump():
+        # Let a sample in progress finish before reading what it updates
+        stopped.set()
+        sampler.join()
+        peak, allocations, traces = None, {}, []
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = state["snapshot"]
+            if snapshot is None or current >= state["size"]:
+                snapshot = tracemalloc.take_snapshot()
+            traces = snapshot.traces
+            tracemalloc.stop()
+        for trace in traces:
+            # Charge each block to the innermost script line that made it
+            for frame in reversed(trace.traceback):
+                if frame.filename == script:
+                    size, blocks = allocations.get(frame.lineno, (0, 0))
+                    allocations[frame.lineno] = (size + trace.size, blocks + 1)
+                    break
+        with open(settings["path"], "w") as f:
+            json.dump({
+                "interval_ms": settings["interval_ms"],
+                "samples": state["samples"],
+                "hot": hot,
+                "peak_bytes": peak,
+                "allocations": allocations,
+                "stacks": stacks,
+            }, f)
+    atexit.register(dump)
+
+_start_profiler()
+del _start_profiler
+"""
+
+# Runs a script passed as the next argument when no other bootstrap is used
+RUN_BOOTSTRAP = f"""
+import sys
+_code = sys.argv.pop(1)
+_main = {{"__name__": "__main__"}}
+exec(compile(_code, "{SCRIPT_FILENAME}", "exec"), _main)
+"""
+
+
+def start_profile():
+    """Return a fresh output path and the environment a profiled child needs."""
+    fd, path = tempfile.mkstemp(prefix="datagen_profile_", suffix=".json")
+    os.close(fd)
+    settings = {
+        "path": path,
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "frames": PROFILE_TRACEMALLOC_FRAMES,
+        "stacks": PROFILE_COLLAPSED_STACKS,
+        "script": SCRIPT_FILENAME,
+    }
+    return path, {PROFILE_ENV: json.dumps(settings)}
+
+
+def line_text(lines, number):
+    """Return a script line, stripped and shortened for a report."""
+    text = lines[number - 1].strip() if 0 < number <= len(lines) else ""
+    return text if len(text) <= 80 else text[:77] + "..."
+
+
+def build_report(raw, code_str, top=PROFILE_TOP_LINES):
+    """Turn a profiled child's raw samples into the hot-spot report."""
+    lines = code_str.splitlines()
+    samples = raw["samples"]
+    hot = sorted(raw["hot"].items(), key=lambda item: item[1], reverse=True)
+    allocations = sorted(
+        raw["allocations"].items(), key=lambda item: item[1][0], reverse=True
+    )
+    report = {
+        "samples": samples,
+        "interval_ms": raw["interval_ms"],
+        "sampled_seconds": round(samples * raw["interval_ms"] / 1000, 3),
+        "peak_memory_mb": (
+            round(raw["peak_bytes"] / 2**20, 2) if raw["peak_bytes"] else None
+        ),
+        "hot_lines": [
+            {
+                "line": int(line),
+                "share": round(count / samples, 3),
+                "code": line_text(lines, int(line)),
+            }
+            for line, count in hot[:top]
+        ],
+        "allocations": [
+            {
+                "line": int(line),
+                "size_mb": round(size / 2**20, 2),
+                "blocks": blocks,
+                "code": line_text(lines, int(line)),
+            }
+            for line, (size, blocks) in allocations[:top]
+        ],
+    }
+    if raw["stacks"]:
+        stacks = sorted(raw["stacks"].items(), key=lambda item: item[1], reverse=True)
+        # Collapsed format, one "frame;frame;frame count" line per stack
+        report["stacks"] = [f"{s} {n}" for s, n in stacks[:PROFILE_MAX_STACKS]]
+    return report
+
+
+def read_profile(path, code_str):
+    """Read and delete a profiled child's output; None if it wrote none."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        # Killed (timeout, cancellation) before its exit hooks ran
+        return None
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return build_report(raw, code_str)
+
+
+def format_report(report):
+    """Summarize a report in a few lines for the log."""
+    parts = [f"{report['sampled_seconds']}s sampled"]
+    if report["peak_memory_mb"] is not None:
+        parts[0] += f", peak {report['peak_memory_mb']} MB traced"
+    for hot in report["hot_lines"][:3]:
+        parts.append(f"line {hot['line']} {hot['share']:.0%}: {hot['code']}")
+    return "\n".join(parts)
@@ -0,0 +1,132 @@
+"""Stage-by-stage progress of a generation job, from the model call to the file."""
+
+import os
+import threading
+from .logs import update_log_context
+from .constants import logger
+
+# Environment variable telling a script which file descriptor to report to
+PROGRESS_FD_ENV = "DATAGEN_PROGRESS_FD"
+
+# Runs before a generated script: writers report cumulative rows over the pipe.
+# The script itself is passed as the next argument and run as __main__.
+PROGRESS_BOOTSTRAP = """
+import os, sys
+
+def _install_progress(code):
+    fd = int(os.environ.get("DATAGEN_PROGRESS_FD", "-1"))
+    if fd < 0:
+        return
+    pipe = os.fdopen(fd, "w", buffering=1)
+    written = [0]
+
+    def report(rows):
+        written[0] += rows
+        try:
+            pipe.write(f"rows {written[0]}\\n")
+        except OSError:
+            pass
+
+    def wrap(owner, name, count):
+        original = getattr(owner, name, None)
+        if original is None:
+            return
+
+        def writer(*args, **kwargs):
+            result = original(*args, **kwargs)
+            report(count(*args))
+            return result
+
+        setattr(owner, name, writer)
+
+    if "pandas" in code:
+        import pandas
+        for name in ("to_csv", "to_json", "to_parquet", "to_feather", "to_orc"):
+            wrap(pandas.DataFrame, name, lambda df, *args: len(df))
+    if "write_csv" in code:
+        import pyarrow.csv
+        wrap(pyarrow.csv, "write_csv", lambda table, *args: table.num_rows)
+
+_code = sys.argv.pop(1)
+_install_progress(_code)
+del _install_progress
+# Like a real __main__, the script's globals live until the interpreter exits
+_main = {"__name__": "__main__"}
+exec(compile(_code, "<script>", "exec"), _main)
+"""
+
+# Stages in the order a job goes through them, with their labels
+STAGES = {
+    "queued": "Waiting for a free worker",
+    "llm": "Writing the script",
+    "validated": "Script validated on a sample",
+    "rows": "Writing rows",
+    "finalized": "Finalizing files",
+}
+
+PROGRESS_BAR_WIDTH = 10
+
+
+def report(on_progress, stage, **details):
+    """Send a progress event if a callback was given.
+
+    The stage is also attached to the job's log records from here on.
+    """
+    update_log_context(stage=stage)
+    logger.debug("Progress %s: %s", stage, details)
+    if on_progress:
+        on_progress(stage, **details)
+
+
+def start_row_reader(on_progress):
+    """Open a pipe for a script to report rows on.
+
+    Returns the write end to pass to the child and a thread that forwards
+    "rows" events until the child closes its end. The caller must close the
+    write end once the child has started.
+    """
+    read_fd, write_fd = os.pipe()
+
+    def forward():
+        with os.fdopen(read_fd, encoding="utf-8", errors="replace") as pipe:
+            for line in pipe:
+                kind, _, value = line.partition(" ")
+                if kind == "rows" and value.strip().isdigit():
+                    report(on_progress, "rows", rows=int(value))
+
+    reader = threading.Thread(target=forward, daemon=True)
+    reader.start()
+    return write_fd, reader
+
+
+def describe_details(stage, details, num_samples=None):
+    """Describe the numbers attached to a progress event."""
+    if stage == "queued":
+        return f"{details.get('ahead', 0)} job(s) ahead"
+    if stage == "llm":
+        return f"{details.get('tokens', 0):,} tokens received"
+    if stage == "rows":
+        rows = details.get("rows", 0)
+        if num_samples:
+            return f"{rows:,} / {int(num_samples):,} rows"
+        return f"{rows:,} rows"
+    if stage == "finalized" and "files" in details:
+        return f"{details['files']} file(s)"
+    return ""
+
+
+def render_progress(stage, details, elapsed, num_samples=None):
+    """Render a progress event as a one-line Markdown progress bar."""
+    if stage not in STAGES:
+        logger.warning("Unknown progress stage: %s", stage)
+        return f"⏳ Generating dataset... · {elapsed:.0f}s"
+
+    position = list(STAGES).index(stage) + 1
+    filled = round(PROGRESS_BAR_WIDTH * position / len(STAGES))
+    bar = "█" * filled + "░" * (PROGRESS_BAR_WIDTH - filled)
+    parts = [f"⏳ `{bar}` {STAGES[stage]}"]
+    detail = describe_details(stage, details, num_samples)
+    if detail:
+        parts.append(detail)
+    parts.append(f"{elapsed:.0f}s")
+    return " · ".join(parts)
@@ -1,10 +1,10 @@
 """Prompt templates and management for AI model interactions."""
 
 from datetime import datetime
-from src.constants import logger
+from src.constants import PARQUET_COMPRESSION, PARQUET_ROW_GROUP_SIZE, logger
 
-# System message template that defines AI assistant behavior and rules
-system_message = """
+# Rules shared by every request; the save recipe for the format is appended
+base_system_message = """
 You are a helpful assistant whose main purpose is to generate synthetic datasets
 based on a given business problem.
 
@@ -30,31 +30,143 @@ based on a given business problem.
   for the code to work correctly.
 
 🔹 File Saving Instructions:
+"""
 
+# How to save each output format, keyed by lowercase format name
+save_instructions = {
+    "csv": """
 - ✅ CSV:
     df.to_csv(file_path, index=False, encoding="utf-8")
-
+""",
+    "csv.gz": """
+- ✅ CSV.GZ (extension .csv.gz):
+    df.to_csv(file_path, index=False, encoding="utf-8", compression="gzip")
+""",
+    "csv.zst": """
+- ✅ CSV.ZST (extension .csv.zst):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.CompressedOutputStream(file_path, "zstd") as out:
+        pacsv.write_csv(table, out)
+""",
+    "json": """
 - ✅ JSON:
     with open(file_path, "w", encoding="utf-8") as f:
-        df.to_json(f, orient="records", lines=False, force_ascii=False, indent=2)
-
+        df.to_json(f, orient="records", lines=False, force_ascii=False)
+""",
+    "ndjson": """
+- ✅ NDJSON (extension .ndjson, one record per line):
+    df.to_json(file_path, orient="records", lines=True, force_ascii=False)
+""",
+    "parquet": f"""
 - ✅ Parquet:
-    df.to_parquet(file_path, engine="pyarrow", index=False)
-
+    df.to_parquet(file_path, engine="pyarrow", index=False,
+                  compression="{PARQUET_COMPRESSION}",
+                  row_group_size={PARQUET_ROW_GROUP_SIZE})
+""",
+    "feather": """
+- ✅ Feather (Arrow IPC, extension .feather):
+    df.reset_index(drop=True).to_feather(file_path, compression="zstd")
+""",
+    "orc": """
+- ✅ ORC (extension .orc):
+    df.reset_index(drop=True).to_orc(file_path)
+""",
+    "markdown": """
 - ✅ Markdown (for Text):
     - Generate properly formatted Markdown content.
     - Save it as a `.md` file using UTF-8 encoding.
+""",
+}
+
+# System message template that defines AI assistant behavior and rules
+system_message = base_system_message + "".join(save_instructions.values())
+
+
+def build_system_message(output_format):
+    """Build the system message with only the save recipe the request needs.
+
+    Unknown formats get every recipe, as in system_message.
+    """
+    recipe = save_instructions.get(output_format.lower())
+    if recipe is None:
+        return system_message
+    return base_system_message + recipe
+
+
+# System message for follow-up requests that fix a failing script
+repair_message = """
+You fix Python scripts that generate synthetic datasets.
+You receive a failing script and the end of its traceback.
+
+🔹 Reply Rules:
+- Reply only with one or more edit blocks inside a ```diff code block.
+- Each block replaces an exact, contiguous excerpt of the script, copied
+  verbatim, with the markers at the start of their lines. For example:
+<<<<<<< SEARCH
+df = pd.DataFrame(rows)
+=======
+df = pd.DataFrame(rows, columns=columns)
+>>>>>>> REPLACE
+- Keep edits minimal. Do not change file paths or the output format.
+- Do not use f-strings.
+"""
+
+
+def build_repair_prompt(code, error):
+    """Build a compact follow-up prompt asking the model to patch failing code."""
+    return f"Script:\n```python\n{code}\n```\nError:\n```\n{error}\n```"
+
+
+# System message for relational datasets, whose keys the engine generates
+relational_message = """
+You are a helpful assistant whose main purpose is to generate synthetic datasets
+based on a given business problem. The dataset has several related tables.
+Their key columns are generated for you; you write the other columns.
+
+🔹 Reply Rules:
+- Reply only with Python code inside a ```python code block.
+- For each table, define exactly one function named <table>_columns(n, rng).
+  - n is the number of rows, rng a numpy.random.Generator.
+  - Return a dict of column name -> array (or list) of exactly n values.
+  - Do not return the key columns listed for the table.
+  - Build whole columns at once with numpy (rng.choice, rng.integers,
+    rng.normal, np.where, ...) — no Python loops over rows.
+- Use only pandas, numpy and standard Python libraries, imported inside the
+  functions or at the top of the code.
+- Do not read or write files and do not print.
+- Do not use f-strings.
 """
 
 
+def build_relational_prompt(tables, **input_data):
+    """Build the user prompt for a relational dataset's column functions.
+
+    tables are the entities returned by relational.parse_entities.
+    """
+    lines = []
+    for table in tables:
+        keys = [table["key"]] + [fk["column"] for fk in table["foreign_keys"]]
+        lines.append(f"- {table['name']}: {table['rows']} rows, keys {', '.join(keys)}")
+    return (
+        f"Generate a synthetic {input_data['dataset_type'].lower()} "
+        "relational dataset.\n"
+        f"Business problem: {input_data['business_problem']}\n"
+        "Tables:\n" + "\n".join(lines)
+    )
+
+
 def build_user_prompt(**input_data):
     """Build user prompt for AI model based on dataset generation parameters."""
     try:
         # Normalize file path separators to forward slashes for consistency
         file_path = input_data["file_path"].replace("\\", "/")
 
-        # Generate timestamp for unique file naming
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Use the caller's timestamp if given, otherwise generate one for naming
+        timestamp = input_data.get("timestamp") or datetime.now().strftime(
+            "%Y%m%d_%H%M%S"
+        )
 
         # Construct the user prompt for the LLM with all required parameters
         user_prompt = (
@@ -0,0 +1,297 @@
+"""Relational datasets: several tables whose foreign keys always match.
+
+A spec with "entities" describes the tables instead of leaving them to the
+model, e.g.:
+
+    "entities": [
+        {"name": "customers"},
+        {"name": "orders", "parent": "customers", "per_parent": 5,
+         "fanout": "zipf"},
+        {"name": "products", "rows": 200},
+        {"name": "order_items", "parent": "orders", "per_parent": 3,
+         "references": ["products"]}
+    ]
+
+The first entity is the main table and has num_samples rows. A child has
+"rows" or "per_parent" rows per parent row on average (default 1), spread
+over its parent "uniform"ly or following a "zipf" law, with at least
+"min_children" each. "references" are extra foreign keys to other tables.
+
+The model only writes one vectorized function per table for its other
+columns. The script around it creates every primary key as a sequence,
+draws foreign keys from the parent's keys with NumPy, and writes each
+table, so no child row can point at a missing parent.
+"""
+
+import re
+import pyarrow as pa
+import pyarrow.compute as pc
+from .constants import (
+    PARQUET_COMPRESSION,
+    PARQUET_ROW_GROUP_SIZE,
+    RELATIONAL_SEED,
+    RELATIONAL_ZIPF_EXPONENT,
+)
+from .validation import FORMAT_EXTENSIONS, TABULAR_FORMATS, iter_batches
+
+FANOUTS = ("uniform", "zipf")
+
+NAME = re.compile(r"[a-z_][a-z0-9_]*")
+
+# Defined in every relational script, before the model's column functions
+RUNTIME = """
+import os
+import numpy as np
+import pandas as pd
+
+
+def sample_keys(parent_keys, rows, fanout, skew, min_children, rng):
+    # Every parent first gets min_children rows, the rest are drawn at random
+    n = len(parent_keys)
+    base = np.repeat(np.arange(n), min(min_children, rows // n))
+    extra = rows - len(base)
+    if fanout == "zipf":
+        weights = 1.0 / np.arange(1, n + 1) ** skew
+        # Popular parents anywhere in the key range, not just the first ones
+        weights = weights[rng.permutation(n)]
+        picks = rng.choice(n, size=extra, p=weights / weights.sum())
+    else:
+        picks = rng.integers(0, n, size=extra)
+    index = np.concatenate([base, picks])
+    rng.shuffle(index)
+    return parent_keys[index]
+
+
+def make_table(name, key, rows, columns, foreign_keys, rng):
+    data = {key: np.arange(1, rows + 1, dtype=np.int64)}
+    for column, parent_keys, fanout, skew, min_children in foreign_keys:
+        data[column] = sample_keys(parent_keys, rows, fanout, skew, min_children, rng)
+    attributes = pd.DataFrame(columns(rows, rng))
+    if len(attributes) != rows:
+        raise ValueError(
+            name + "_columns returned " + str(len(attributes)) + " rows, expected "
+            + str(rows)
+        )
+    # Keys come from the engine only
+    attributes = attributes.drop(columns=[c for c in data if c in attributes])
+    return pd.concat([pd.DataFrame(data), attributes.reset_index(drop=True)], axis=1)
+
+
+def write_table(df, file_path, output_format):
+    if output_format == "csv":
+        df.to_csv(file_path, index=False, encoding="utf-8")
+    elif output_format == "csv.gz":
+        df.to_csv(file_path, index=False, encoding="utf-8", compression="gzip")
+    elif output_format == "csv.zst":
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.CompressedOutputStream(file_path, "zstd") as out:
+            pacsv.write_csv(table, out)
+    elif output_format == "json":
+        with open(file_path, "w", encoding="utf-8") as f:
+            df.to_json(f, orient="records", lines=False, force_ascii=False)
+    elif output_format == "ndjson":
+        df.to_json(file_path, orient="records", lines=True, force_ascii=False)
+    elif output_format == "parquet":
+        df.to_parquet(
+            file_path,
+            engine="pyarrow",
+            index=False,
+            compression=PARQUET_COMPRESSION,
+            row_group_size=PARQUET_ROW_GROUP_SIZE,
+        )
+    elif output_format == "feather":
+        df.reset_index(drop=True).to_feather(file_path, compression="zstd")
+    else:
+        df.reset_index(drop=True).to_orc(file_path)
+"""
+
+
+def singular(name):
+    """Return a rough singular of a table name, for its key column."""
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    if name.endswith("s") and not name.endswith("ss"):
+        return name[:-1]
+    return name
+
+
+def foreign_key_list(entity):
+    """Return (table, fanout) for the parent and every reference of an entity."""
+    links = [(entity["parent"], entity.get("fanout", "uniform"))]
+    references = entity.get("references") or {}
+    if isinstance(references, list):
+        references = dict.fromkeys(references, "uniform")
+    links += list(references.items())
+    return [(table, fanout) for table, fanout in links if table]
+
+
+def parse_entities(entities, num_samples, output_format="csv"):
+    """Check entity specs and return them complete, parents before children.
+
+    Each returned entity has its "name", "key" column, "rows", "parent",
+    "foreign_keys" ([{"column", "table", "fanout"}]), "skew" and
+    "min_children". Raises ValueError for an invalid spec, or a format
+    that isn't tabular.
+    """
+    if output_format.lower() not in TABULAR_FORMATS:
+        raise ValueError(f"Relational datasets can't be saved as {output_format}")
+    if not isinstance(entities, list) or not entities:
+        raise ValueError("entities must be a non-empty list")
+    specs = {}
+    for entity in entities:
+        name = entity.get("name") if isinstance(entity, dict) else None
+        if not isinstance(name, str) or not NAME.fullmatch(name):
+            raise ValueError(f"Invalid entity name: {name!r}")
+        key = entity.get("key")
+        if key is not None and (not isinstance(key, str) or not NAME.fullmatch(key)):
+            raise ValueError(f"Invalid key column of {name}: {key!r}")
+        if name in specs:
+            raise ValueError(f"Entity {name} is defined twice")
+        specs[name] = {"parent": None, **entity}
+
+    first = entities[0]["name"]
+    if specs[first]["parent"]:
+        raise ValueError(f"The first entity, {first}, can't have a parent")
+    if int(specs[first].get("rows", num_samples)) != int(num_samples):
+        raise ValueError(f"The first entity, {first}, has num_samples rows")
+
+    for spec in specs.values():
+        for table, fanout in foreign_key_list(spec):
+            if table not in specs:
+                raise ValueError(f"{spec['name']} refers to unknown entity {table}")
+            if fanout not in FANOUTS:
+                raise ValueError(f"Unknown fanout {fanout!r} in {spec['name']}")
+
+    # Depth-first, keeping the given order among independent tables
+    ordered, visiting = [], set()
+
+    def visit(name):
+        if any(e["name"] == name for e in ordered):
+            return
+        if name in visiting:
+            raise ValueError(f"Entity {name} depends on itself")
+        visiting.add(name)
+        for table, _ in foreign_key_list(specs[name]):
+            visit(table)
+        visiting.discard(name)
+        ordered.append(complete_entity(specs[name], ordered, num_samples))
+
+    for name in specs:
+        visit(name)
+    return ordered
+
+
+def complete_entity(spec, done, num_samples):
+    """Fill in an entity's key, row count and foreign keys."""
+    tables = {e["name"]: e for e in done}
+    parent = spec["parent"]
+    if "rows" in spec:
+        rows = int(spec["rows"])
+    elif parent:
+        rows = round(tables[parent]["rows"] * float(spec.get("per_parent", 1)))
+    else:
+        rows = int(num_samples)
+    if rows < 1:
+        raise ValueError(f"Entity {spec['name']} must have at least one row")
+
+    min_children = int(spec.get("min_children", 0))
+    if parent and min_children * tables[parent]["rows"] > rows:
+        raise ValueError(
+            f"{spec['name']} has too few rows for {min_children} per {parent} row"
+        )
+    key = spec.get("key") or f"{singular(spec['name'])}_id"
+    return {
+        "name": spec["name"],
+        "key": key,
+        "rows": rows,
+        "parent": parent,
+        "foreign_keys": [
+            {"column": tables[table]["key"], "table": table, "fanout": fanout}
+            for table, fanout in foreign_key_list(spec)
+        ],
+        "skew": float(spec.get("skew", RELATIONAL_ZIPF_EXPONENT)),
+        "min_children": min_children,
+    }
+
+
+def file_names(entities, output_format, timestamp):
+    """Return the file name of each table, in generation order."""
+    extension = FORMAT_EXTENSIONS[output_format.lower()]
+    return [f"{e['name']}_{timestamp}{extension}" for e in entities]
+
+
+def build_script(entities, columns_code, directory, timestamp, output_format):
+    """Wrap the model's column functions in a script that writes every table.
+
+    entities come from parse_entities. Row counts are written as ratios of
+    the main table's, so a dry run that changes that one literal shrinks
+    every table. Returns the script as a python code block.
+    """
+    output_format = output_format.lower()
+    root_rows = entities[0]["rows"]
+    lines = [
+        RUNTIME.strip(),
+        "",
+        f"PARQUET_COMPRESSION = {PARQUET_COMPRESSION!r}",
+        f"PARQUET_ROW_GROUP_SIZE = {PARQUET_ROW_GROUP_SIZE}",
+        "",
+        columns_code.strip(),
+        "",
+        f"ROOT_ROWS = {root_rows}",
+        f"rng = np.random.default_rng({RELATIONAL_SEED})",
+        "keys = {}",
+    ]
+    names = file_names(entities, output_format, timestamp)
+    for entity, name in zip(entities, names, strict=True):
+        ratio = entity["rows"] / root_rows
+        foreign_keys = ", ".join(
+            f"({fk['column']!r}, keys[{fk['table']!r}], {fk['fanout']!r}, "
+            f"{entity['skew']!r}, "
+            f"{entity['min_children'] if fk['table'] == entity['parent'] else 0})"
+            for fk in entity["foreign_keys"]
+        )
+        # Strings go in as repr literals: a path may hold quotes or backslashes
+        lines += [
+            "",
+            f"# {entity['name']}",
+            f"rows = max(1, round(ROOT_ROWS * {ratio!r}))",
+            f"table = make_table({entity['name']!r}, {entity['key']!r}, rows, "
+            f"{entity['name']}_columns, [{foreign_keys}], rng)",
+            f"keys[{entity['name']!r}] = table[{entity['key']!r}].to_numpy()",
+            f"write_table(table, os.path.join({directory!r}, {name!r}), "
+            f"{output_format!r})",
+            "del table",
+        ]
+    return "```python\n" + "\n".join(lines) + "\n```"
+
+
+def check_integrity(paths, entities, output_format):
+    """Count child rows whose foreign keys match no parent key.
+
+    paths are the tables' files in the order of entities. Returns one
+    {"table", "column", "references", "orphans"} entry per foreign key.
+    """
+    output_format = output_format.lower()
+    files = dict(zip((e["name"] for e in entities), paths, strict=True))
+
+    def column(table, name):
+        batches = iter_batches(files[table], output_format)
+        return pc.drop_null(pa.chunked_array([b.column(name) for b in batches]))
+
+    results = []
+    for entity in entities:
+        for fk in entity["foreign_keys"]:
+            values = column(entity["name"], fk["column"])
+            parent_keys = column(fk["table"], fk["column"])
+            matched = pc.sum(pc.is_in(values, value_set=parent_keys)).as_py() or 0
+            results.append(
+                {
+                    "table": entity["name"],
+                    "column": fk["column"],
+                    "references": fk["table"],
+                    "orphans": len(values) - matched,
+                }
+            )
+    return results
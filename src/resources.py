@@ -0,0 +1,197 @@
+"""Resource limits, usage accounting and admission control for script runs."""
+
+import json
+import os
+import select
+import signal
+import subprocess
+import threading
+from .cancellation import raise_if_cancelled
+from .constants import (
+    EXECUTION_CPU_SECONDS,
+    EXECUTION_MEMORY_ESTIMATE_MB,
+    EXECUTION_MEMORY_MB,
+    HOST_MEMORY_BUDGET_MB,
+)
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits or rusage
+    resource = None
+
+# Environment variable passing a child the rlimits it must set on itself
+LIMITS_ENV = "DATAGEN_LIMITS"
+
+# Runs first in a child, before its own bootstrap and the script. Limits are
+# set here rather than in a preexec_fn, which can deadlock when forking a
+# process that has other threads.
+LIMITS_BOOTSTRAP = """
+def _apply_limits():
+    import json, os
+    try:
+        import resource
+    except ImportError:
+        return
+    limits = json.loads(os.environ.pop("DATAGEN_LIMITS", "{}"))
+    for name, limit in limits.items():
+        try:
+            resource.setrlimit(getattr(resource, name), tuple(limit))
+        except (OSError, ValueError):
+            # Above the hard limit we inherited: keep that one
+            pass
+
+_apply_limits()
+del _apply_limits
+"""
+
+
+class AccountedPopen(subprocess.Popen):
+    """Popen that keeps the child's resource usage when it is reaped.
+
+    wait() (which communicate() also uses) blocks until the child exits,
+    then reaps it with os.wait4. Where pidfds or wait4 are missing it waits
+    as Popen does, and rusage stays None.
+    """
+
+    rusage = None
+
+    def wait(self, timeout=None):
+        """Wait for the child to exit and reap it, keeping its rusage."""
+        if self.returncode is None and hasattr(os, "pidfd_open"):
+            try:
+                exited = wait_for_exit(self.pid, timeout)
+            except OSError:  # pidfds unsupported by the kernel
+                exited = None
+            if exited is False:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            if exited:
+                try:
+                    _, status, self.rusage = os.wait4(self.pid, 0)
+                    self.returncode = os.waitstatus_to_exitcode(status)
+                except ChildProcessError:  # already reaped elsewhere
+                    pass
+        return super().wait(timeout)
+
+
+def wait_for_exit(pid, timeout=None):
+    """Block until a child exits, without reaping it.
+
+    Returns False if it is still running after timeout seconds.
+    """
+    fd = os.pidfd_open(pid)
+    try:
+        return bool(select.select([fd], [], [], timeout)[0])
+    finally:
+        os.close(fd)
+
+
+def limits_env(cpu=True):
+    """Return the environment asking a child to set its CPU and memory limits.
+
+    The child applies them itself through LIMITS_BOOTSTRAP. With cpu False
+    only the address space is limited.
+    """
+    memory = EXECUTION_MEMORY_MB << 20
+    limits = {"RLIMIT_AS": [memory, memory]}
+    if cpu:
+        limits["RLIMIT_CPU"] = [EXECUTION_CPU_SECONDS, EXECUTION_CPU_SECONDS + 5]
+    return {LIMITS_ENV: json.dumps(limits)}
+
+
+def kill_process_group(process):
+    """Kill a child started in its own session, along with its children."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        process.kill()
+
+
+def usage_from_rusage(rusage, wall_seconds):
+    """Convert a struct_rusage into a usage record."""
+    record = {"wall_seconds": round(wall_seconds, 3)}
+    if rusage is not None:
+        record.update(
+            # ru_maxrss is in kilobytes on Linux
+            peak_rss_mb=round(rusage.ru_maxrss / 1024, 1),
+            cpu_seconds=round(rusage.ru_utime + rusage.ru_stime, 3),
+            # Block counts are in 512-byte units
+            read_bytes=rusage.ru_inblock * 512,
+            write_bytes=rusage.ru_oublock * 512,
+        )
+    return record
+
+
+class AdmissionController:
+    """Hold back new runs while projected memory would exceed the host budget.
+
+    Each run reserves the current estimate of a script's peak memory, an
+    exponential moving average of observed peak RSS. A run is always admitted
+    when nothing else is running, so a single large job can't wait forever.
+    """
+
+    def __init__(self, budget_mb, estimate_mb, smoothing=0.3):
+        """Initialize with a memory budget and an initial per-run estimate."""
+        self.budget_mb = budget_mb
+        self.estimate_mb = estimate_mb
+        self.smoothing = smoothing
+        self.reserved_mb = 0.0
+        self.running = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, need_mb):
+        """Check whether a reservation fits in the remaining budget."""
+        return self.running == 0 or self.reserved_mb + need_mb <= self.budget_mb
+
+    def would_wait(self):
+        """Check whether a new run would have to wait for memory budget."""
+        with self._condition:
+            return self.waiting > 0 or not self._fits(self.estimate_mb)
+
+    def _wake(self):
+        """Wake waiting runs so they re-check their cancellation tokens."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def acquire(self, timeout=None, cancel_token=None):
+        """Block until a run is admitted and return its memory reservation.
+
+        Raises TimeoutError if the run isn't admitted within timeout seconds,
+        and JobCancelled if cancel_token is cancelled while waiting.
+        """
+        unregister = cancel_token.register(self._wake) if cancel_token else None
+        with self._condition:
+            need_mb = self.estimate_mb
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(
+                    lambda: (
+                        self._fits(need_mb)
+                        or bool(cancel_token and cancel_token.cancelled)
+                    ),
+                    timeout,
+                )
+            finally:
+                self.waiting -= 1
+                if unregister:
+                    unregister()
+            raise_if_cancelled(cancel_token)
+            if not admitted:
+                raise TimeoutError("Not enough memory budget to start a new run.")
+            self.reserved_mb += need_mb
+            self.running += 1
+            return need_mb
+
+    def release(self, reservation_mb, usage=None):
+        """Return a reservation and learn from the run's observed peak memory."""
+        with self._condition:
+            self.reserved_mb = max(self.reserved_mb - reservation_mb, 0.0)
+            self.running -= 1
+            peak = (usage or {}).get("peak_rss_mb")
+            if peak:
+                self.estimate_mb += self.smoothing * (peak - self.estimate_mb)
+            self._condition.notify_all()
+
+
+# Shared by every script run in this process
+admission = AdmissionController(HOST_MEMORY_BUDGET_MB, EXECUTION_MEMORY_ESTIMATE_MB)
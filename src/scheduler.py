@@ -0,0 +1,305 @@
+"""Weighted fair queuing of generation jobs across web clients."""
+
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from .cancellation import raise_if_cancelled
+from .progress import report
+from .constants import (
+    CLIENT_API_KEYS,
+    CLIENT_CPU_QUOTA_SECONDS,
+    CLIENT_MAX_JOBS,
+    CLIENT_QUOTA_WINDOW_SECONDS,
+    CLIENT_TOKEN_QUOTA,
+    CLIENT_WEIGHTS,
+    GENERATION_SLOTS,
+    TRUSTED_PROXIES,
+    logger,
+)
+
+# Relative cost of writing one row in each format, CSV being 1
+FORMAT_COSTS = {
+    "csv.gz": 1.2,
+    "csv.zst": 1.2,
+    "json": 1.3,
+    "ndjson": 1.1,
+    "parquet": 1.5,
+    "feather": 1.2,
+    "orc": 1.5,
+    "markdown": 1.5,
+}
+
+# Cost of the model call every job makes, in CSV rows
+JOB_BASE_COST = 200
+
+
+class QuotaExceeded(Exception):
+    """Raised when a client has used up its token or CPU quota."""
+
+
+def predict_cost(num_samples, output_format):
+    """Predict a job's cost from its size and output format."""
+    factor = FORMAT_COSTS.get(str(output_format).lower(), 1.0)
+    return JOB_BASE_COST + int(num_samples) * factor
+
+
+def parse_list(spec):
+    """Split a comma-separated setting into its non-empty items."""
+    return [item.strip() for item in spec.split(",") if item.strip()]
+
+
+def parse_networks(spec):
+    """Parse comma-separated addresses and CIDRs into IP networks."""
+    networks = []
+    for item in parse_list(spec):
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning("Ignoring invalid trusted proxy: %s", item)
+    return networks
+
+
+API_KEYS = parse_list(CLIENT_API_KEYS)
+PROXY_NETWORKS = parse_networks(TRUSTED_PROXIES)
+
+
+def is_trusted(address, networks):
+    """Check whether an IP address belongs to one of the networks."""
+    try:
+        ip = ipaddress.ip_address(address.strip())
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def forwarded_client(peer, forwarded_for, networks):
+    """Return the client address a chain of trusted proxies reports, or None.
+
+    X-Forwarded-For is only believed when the peer is a trusted proxy. Each
+    trusted proxy appends the address it saw, so the client is the
+    rightmost entry that isn't itself a trusted proxy.
+    """
+    if not peer or not forwarded_for or not is_trusted(peer, networks):
+        return None
+    for address in reversed(forwarded_for.split(",")):
+        address = address.strip()
+        if not is_trusted(address, networks):
+            try:
+                return str(ipaddress.ip_address(address))
+            except ValueError:
+                return None
+    return None
+
+
+def client_id(request, api_keys=None, trusted_proxies=None):
+    """Identify the client behind a Gradio request.
+
+    An x-api-key header counts only if it is one of api_keys (default
+    CLIENT_API_KEYS). Next comes the address X-Forwarded-For gives when the
+    request came through one of trusted_proxies (default TRUSTED_PROXIES),
+    then the browser session.
+    """
+    if request is None:
+        return "anonymous"
+    api_keys = API_KEYS if api_keys is None else api_keys
+    networks = PROXY_NETWORKS if trusted_proxies is None else trusted_proxies
+    headers = getattr(request, "headers", None) or {}
+
+    api_key = headers.get("x-api-key")
+    if isinstance(api_key, str) and api_key:
+        if any(hmac.compare_digest(api_key, key) for key in api_keys):
+            return "key:" + hashlib.sha1(api_key.encode()).hexdigest()[:12]
+        logger.warning("Ignoring an unknown API key")
+
+    peer = getattr(getattr(request, "client", None), "host", None)
+    address = forwarded_client(peer, headers.get("x-forwarded-for"), networks)
+    if address:
+        return f"ip:{address}"
+    return f"session:{getattr(request, 'session_hash', None)}"
+
+
+def parse_weights(spec):
+    """Parse "client=weight,..." into a dict of share weights."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        client, _, weight = item.rpartition("=")
+        try:
+            weights[client] = float(weight)
+        except ValueError:
+            logger.warning("Ignoring invalid client weight: %s", item)
+    return weights
+
+
+@dataclass
+class Ticket:
+    """A job waiting for, or holding, a generation slot."""
+
+    client: str
+    cost: float
+    start: float  # Virtual time the job's service starts at
+    finish: float  # Virtual time it ends at; the smallest is served first
+    seq: int
+
+
+class FairScheduler:
+    """Weighted fair queuing of jobs, with per-client limits and quotas.
+
+    Each job gets a virtual finish time: the later of the scheduler's
+    virtual time and its client's previous finish, plus its predicted cost
+    divided by the client's weight. Free slots go to the waiting job with
+    the smallest finish time whose client is under its concurrency limit,
+    so a client submitting many large jobs can't starve the others, and
+    short jobs go ahead of long ones.
+    """
+
+    def __init__(
+        self,
+        slots=GENERATION_SLOTS,
+        max_jobs_per_client=CLIENT_MAX_JOBS,
+        token_quota=CLIENT_TOKEN_QUOTA,
+        cpu_quota_seconds=CLIENT_CPU_QUOTA_SECONDS,
+        window_seconds=CLIENT_QUOTA_WINDOW_SECONDS,
+        weights=None,
+    ):
+        """Initialize with no jobs; quotas of 0 are unlimited."""
+        self.slots = slots
+        self.max_jobs_per_client = max_jobs_per_client
+        self.token_quota = token_quota
+        self.cpu_quota_seconds = cpu_quota_seconds
+        self.window_seconds = window_seconds
+        self.weights = parse_weights(CLIENT_WEIGHTS) if weights is None else weights
+        self.virtual_time = 0.0
+        self.waiting = []
+        self.running = defaultdict(int)
+        self._last_finish = {}
+        self._usage = defaultdict(deque)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+
+    def usage(self, client):
+        """Return the tokens and CPU seconds a client used in the window."""
+        with self._condition:
+            entries = self._usage[client]
+            cutoff = time.monotonic() - self.window_seconds
+            while entries and entries[0][0] < cutoff:
+                entries.popleft()
+            tokens = sum(entry[1] for entry in entries)
+            cpu_seconds = sum(entry[2] for entry in entries)
+        return tokens, cpu_seconds
+
+    def charge(self, client, tokens=0, cpu_seconds=0.0):
+        """Count a finished job's tokens and CPU seconds against its client."""
+        with self._condition:
+            self._usage[client].append((time.monotonic(), tokens, cpu_seconds))
+
+    def check_quota(self, client):
+        """Raise QuotaExceeded if the client has no token or CPU quota left."""
+        tokens, cpu_seconds = self.usage(client)
+        if self.token_quota and tokens >= self.token_quota:
+            raise QuotaExceeded(
+                f"Token quota reached ({tokens:,} of {self.token_quota:,} "
+                f"in {self.window_seconds // 60} min). Try again later."
+            )
+        if self.cpu_quota_seconds and cpu_seconds >= self.cpu_quota_seconds:
+            raise QuotaExceeded(
+                f"CPU quota reached ({cpu_seconds:.0f}s of "
+                f"{self.cpu_quota_seconds:.0f}s in {self.window_seconds // 60} "
+                "min). Try again later."
+            )
+
+    def busy(self):
+        """Return the number of jobs running or waiting for a slot."""
+        with self._condition:
+            return sum(self.running.values()) + len(self.waiting)
+
+    def _next(self):
+        """Return the waiting ticket to run next, or None if none can run."""
+        if sum(self.running.values()) >= self.slots:
+            return None
+        eligible = [
+            ticket
+            for ticket in self.waiting
+            if self.running[ticket.client] < self.max_jobs_per_client
+        ]
+        return min(eligible, key=lambda t: (t.finish, t.seq), default=None)
+
+    def _ahead(self, ticket):
+        """Count the waiting tickets that will be served before this one."""
+        return sum(
+            (t.finish, t.seq) < (ticket.finish, ticket.seq) for t in self.waiting
+        )
+
+    def _wake(self):
+        """Wake waiting jobs so they re-check their cancellation tokens."""
+        with self._condition:
+            self._condition.notify_all()
+
+    def acquire(self, client, cost, cancel_token=None, on_progress=None, timeout=None):
+        """Wait for a slot in fair-share order and return the job's ticket.
+
+        Raises QuotaExceeded if the client is over quota, JobCancelled if
+        cancel_token is cancelled while waiting and TimeoutError after
+        timeout seconds. Jobs still waiting are reported as "queued".
+        """
+        self.check_quota(client)
+        weight = self.weights.get(client, 1.0)
+        unregister = cancel_token.register(self._wake) if cancel_token else None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            start = max(self.virtual_time, self._last_finish.get(client, 0.0))
+            ticket = Ticket(client, cost, start, start + cost / weight, next(self._seq))
+            self._last_finish[client] = ticket.finish
+            self.waiting.append(ticket)
+            ahead = None
+            try:
+                while self._next() is not ticket:
+                    raise_if_cancelled(cancel_token)
+                    if ahead != self._ahead(ticket):
+                        ahead = self._ahead(ticket)
+                        report(on_progress, "queued", ahead=ahead)
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No generation slot became free in time.")
+                    self._condition.wait(remaining)
+            except BaseException:
+                self.waiting.remove(ticket)
+                # Give this job's share back to the client's later jobs
+                if self._last_finish.get(client) == ticket.finish:
+                    self._last_finish[client] = ticket.start
+                self._condition.notify_all()
+                raise
+            finally:
+                if unregister:
+                    unregister()
+
+            self.waiting.remove(ticket)
+            self.running[client] += 1
+            self.virtual_time = max(self.virtual_time, ticket.start)
+            # Another slot may still be free for the next ticket in line
+            self._condition.notify_all()
+        return ticket
+
+    def release(self, ticket):
+        """Free a finished job's slot for the next waiting job."""
+        with self._condition:
+            self.running[ticket.client] -= 1
+            if not self.running[ticket.client]:
+                del self.running[ticket.client]
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, client, cost, cancel_token=None, on_progress=None):
+        """Hold a generation slot for the duration of the block."""
+        ticket = self.acquire(client, cost, cancel_token, on_progress)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
@@ -0,0 +1,212 @@
+"""Static files served precompressed, with strong ETags and long caching.
+
+When mounted, every file under the directory is hashed, and text files get
+gzip and, if the brotli package is installed, brotli variants kept in
+memory. Each request gets the variant its Accept-Encoding prefers, an
+ETag made from the content hash, and a 304 when If-None-Match already
+names the content. URLs from versioned_url() carry the hash as ?v= (as do
+file names with a hash in them), so browsers cache them as immutable; any
+other URL is revalidated on use, which costs a 304 when nothing changed.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+from urllib.parse import parse_qs
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from .blobs import file_digest
+from .constants import (
+    STATIC_BROTLI_QUALITY,
+    STATIC_CACHE_CONTROL,
+    STATIC_COMPRESS_MAX_BYTES,
+    STATIC_COMPRESS_MIN_BYTES,
+    STATIC_GZIP_LEVEL,
+    STATIC_IMMUTABLE_CACHE_CONTROL,
+    logger,
+)
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Content codings we precompress, preferred first when accepted equally
+ENCODINGS = ("br", "gzip")
+
+# Non-text types that still compress well
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+}
+
+# Names carrying a content hash, e.g. app.3f2a9c1b.js, never change
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.\w+$")
+
+# Hex digits of the content hash put in ?v= by versioned_url
+VERSION_LENGTH = 16
+
+
+def is_compressible(path):
+    """Check whether a file's type is worth compressing."""
+    media_type = mimetypes.guess_type(path)[0] or ""
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def compress(data, encoding):
+    """Compress data with a content coding from ENCODINGS, at the best level."""
+    if encoding == "br":
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY)
+    # mtime=0 keeps the output, and so its ETag, stable across restarts
+    return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL, mtime=0)
+
+
+def load_asset(path):
+    """Hash a file and build its compressed variants.
+
+    Returns {"stat", "hash", "variants"}, variants mapping each coding to
+    the compressed bytes when they are smaller than the file.
+    """
+    stat_result = os.stat(path)
+    asset = {
+        "stat": (stat_result.st_mtime_ns, stat_result.st_size),
+        "hash": file_digest(path),
+        "variants": {},
+    }
+    size = stat_result.st_size
+    if not is_compressible(path) or not (
+        STATIC_COMPRESS_MIN_BYTES <= size <= STATIC_COMPRESS_MAX_BYTES
+    ):
+        return asset
+
+    with open(path, "rb") as f:
+        data = f.read()
+    for encoding in ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        body = compress(data, encoding)
+        if len(body) < len(data):
+            asset["variants"][encoding] = body
+    return asset
+
+
+def accepted_encodings(header):
+    """Return the q-value of each content coding in an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        try:
+            accepted[coding] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            accepted[coding] = 0.0
+    return accepted
+
+
+def choose_encoding(header, available):
+    """Return the best coding in available the client accepts, or None."""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding in available:
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+    return best
+
+
+def etag(asset, encoding=None):
+    """Return the strong ETag of a file's variant."""
+    suffix = f"-{encoding}" if encoding else ""
+    return f'"{asset["hash"]}{suffix}"'
+
+
+def is_not_modified(header, asset):
+    """Check whether If-None-Match names any variant of the file's content."""
+    for tag in (header or "").split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == "*" or tag.split("-")[0] == asset["hash"]:
+            return True
+    return False
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving precompressed variants with strong validators."""
+
+    def __init__(self, *args, **kwargs):
+        """Mount a directory as StaticFiles does, and index its files."""
+        super().__init__(*args, **kwargs)
+        self.assets = {}
+        for directory in self.all_directories:
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    path = os.path.realpath(os.path.join(root, name))
+                    self.assets[path] = load_asset(path)
+        compressed = sum(bool(a["variants"]) for a in self.assets.values())
+        logger.info(
+            "🗜️ Indexed %d static file(s), %d precompressed (brotli %s)",
+            len(self.assets),
+            compressed,
+            "on" if brotli else "off",
+        )
+
+    def asset(self, full_path, stat_result):
+        """Return a file's index entry, rebuilt if the file changed."""
+        path = os.path.realpath(full_path)
+        asset = self.assets.get(path)
+        if asset is None or asset["stat"] != (
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+        ):
+            asset = self.assets[path] = load_asset(path)
+        return asset
+
+    def versioned_url(self, name, prefix):
+        """Return prefix/name with the file's content version, to cache forever."""
+        path = os.path.join(self.directory, name)
+        asset = self.asset(path, os.stat(path))
+        return f"{prefix}/{name}?v={asset['hash'][:VERSION_LENGTH]}"
+
+    def cache_control(self, full_path, scope, asset):
+        """Return the Cache-Control of a response: immutable if versioned."""
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        version = query.get("v", [""])[0]
+        versioned = len(version) >= 8 and asset["hash"].startswith(version)
+        if versioned or HASHED_NAME.search(os.path.basename(full_path)):
+            return STATIC_IMMUTABLE_CACHE_CONTROL
+        return STATIC_CACHE_CONTROL
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        """Serve a file's best variant, or 304 if the client already has it."""
+        if status_code != 200:
+            # 404.html and the like: plain, uncached
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        asset = self.asset(full_path, stat_result)
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(
+            request_headers.get("accept-encoding"), asset["variants"]
+        )
+        headers = {
+            "ETag": etag(asset, encoding),
+            "Cache-Control": self.cache_control(full_path, scope, asset),
+        }
+        if asset["variants"]:
+            headers["Vary"] = "Accept-Encoding"
+
+        if is_not_modified(request_headers.get("if-none-match"), asset):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return FileResponse(full_path, stat_result=stat_result, headers=headers)
+        return Response(
+            asset["variants"][encoding],
+            media_type=mimetypes.guess_type(full_path)[0],
+            headers={**headers, "Content-Encoding": encoding},
+        )
@@ -0,0 +1,307 @@
+"""Shared job state and artifact storage so several workers can serve the app."""
+
+import json
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import time
+from contextlib import closing
+from functools import lru_cache
+from .blobs import BlobStore
+from .workspace import (
+    artifact_paths,
+    read_manifest,
+    remove_workspace,
+    save_manifest,
+    workspace_path,
+)
+from .constants import (
+    ARTIFACT_STORE,
+    BLOB_STORE_MAX_BYTES,
+    BLOB_STORE_PATH,
+    JOB_MAX_ATTEMPTS,
+    JOB_STORE_PATH,
+    OUTPUT_DIR,
+    logger,
+)
+
+# Job lifecycle: queued -> running -> done | failed
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Identifies this process among the workers sharing a store
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobStore(ABC):
+    """Interface for job state shared by every worker.
+
+    Backends store one record per job with its status, spec, progress stage,
+    result and error. Records are returned as plain dicts.
+    """
+
+    @abstractmethod
+    def create_job(self, job_id, spec, status=QUEUED, worker_id=None):
+        """Record a new job."""
+
+    @abstractmethod
+    def claim_job(self, worker_id):
+        """Atomically take the oldest queued job, or return None."""
+
+    @abstractmethod
+    def update_progress(self, job_id, stage, message=""):
+        """Record the stage a running job has reached."""
+
+    @abstractmethod
+    def complete_job(self, job_id, result):
+        """Mark a job as done with its result."""
+
+    @abstractmethod
+    def fail_job(self, job_id, error):
+        """Mark a job as failed with an error message."""
+
+    @abstractmethod
+    def heartbeat(self, job_id, worker_id):
+        """Renew a running job's lease; return False if the worker lost it."""
+
+    @abstractmethod
+    def reap_stale_jobs(self, lease_seconds, max_attempts=JOB_MAX_ATTEMPTS):
+        """Requeue or fail running jobs whose worker stopped heartbeating.
+
+        Claimed jobs go back to the queue until they have been tried
+        max_attempts times; jobs a web worker started directly are failed,
+        as nobody is waiting for them any more. Returns the ids reaped.
+        """
+
+    @abstractmethod
+    def get_job(self, job_id):
+        """Return a job record, or None if it doesn't exist."""
+
+
+class ArtifactStore(ABC):
+    """Interface for the files a job produces."""
+
+    @abstractmethod
+    def workspace(self, job_id):
+        """Return a local directory the job can write its files into."""
+
+    @abstractmethod
+    def paths(self, job_id):
+        """Return local paths of every file the job produced."""
+
+    @abstractmethod
+    def manifest(self, job_id):
+        """Return the job's manifest, or None if it never finished."""
+
+    @abstractmethod
+    def commit(self, job_id):
+        """Store a finished job's files; return its (updated) manifest."""
+
+    @abstractmethod
+    def release(self, job_id):
+        """Let go of a job's stored files before its workspace is removed."""
+
+    @abstractmethod
+    def delete(self, job_id):
+        """Remove every file of a job."""
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in a SQLite database, shared by processes on one host or volume."""
+
+    def __init__(self, path):
+        """Open (and create if needed) the database at path."""
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as db, db:
+            # WAL lets readers see progress while a worker is writing
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    spec TEXT NOT NULL,
+                    stage TEXT,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    worker_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _connect(self):
+        """Open a connection; one per call keeps threads and processes apart."""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _update(self, job_id, **fields):
+        """Update columns of one job and bump its timestamp."""
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as db:
+            db.execute(
+                f"UPDATE jobs SET {columns} WHERE job_id = ?",
+                [*fields.values(), job_id],
+            )
+
+    @staticmethod
+    def _to_dict(row):
+        """Convert a row into a job record with decoded JSON fields."""
+        if row is None:
+            return None
+        job = dict(row)
+        job["spec"] = json.loads(job["spec"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create_job(self, job_id, spec, status=QUEUED, worker_id=None):
+        """Record a new job."""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT INTO jobs (job_id, status, spec, worker_id, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, status, json.dumps(spec, default=str), worker_id, now, now),
+            )
+
+    def claim_job(self, worker_id):
+        """Atomically take the oldest queued job, or return None."""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, updated_at = ?, "
+                "attempts = attempts + 1 WHERE job_id = (SELECT job_id FROM jobs "
+                "WHERE status = ? ORDER BY created_at LIMIT 1) RETURNING *",
+                (RUNNING, worker_id, time.time(), QUEUED),
+            ).fetchone()
+        return self._to_dict(row)
+
+    def update_progress(self, job_id, stage, message=""):
+        """Record the stage a running job has reached."""
+        self._update(job_id, stage=stage, message=message)
+
+    def complete_job(self, job_id, result):
+        """Mark a job as done with its result."""
+        self._update(job_id, status=DONE, result=json.dumps(result, default=str))
+
+    def fail_job(self, job_id, error):
+        """Mark a job as failed with an error message."""
+        self._update(job_id, status=FAILED, error=str(error))
+
+    def heartbeat(self, job_id, worker_id):
+        """Renew a running job's lease; return False if the worker lost it."""
+        with closing(self._connect()) as db:
+            cursor = db.execute(
+                "UPDATE jobs SET updated_at = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (time.time(), job_id, worker_id, RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def reap_stale_jobs(self, lease_seconds, max_attempts=JOB_MAX_ATTEMPTS):
+        """Requeue or fail running jobs whose worker stopped heartbeating."""
+        now = time.time()
+        stale = (RUNNING, now - lease_seconds)
+        with closing(self._connect()) as db:
+            requeued = db.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, stage = NULL, "
+                "updated_at = ? WHERE status = ? AND updated_at < ? "
+                "AND attempts BETWEEN 1 AND ? RETURNING job_id",
+                (QUEUED, now, *stale, max_attempts - 1),
+            ).fetchall()
+            failed = db.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND updated_at < ? RETURNING job_id",
+                (FAILED, "Worker stopped responding.", now, *stale),
+            ).fetchall()
+        reaped = [row["job_id"] for row in requeued + failed]
+        if reaped:
+            logger.warning(
+                "💀 Requeued %d and failed %d stale job(s)", len(requeued), len(failed)
+            )
+        return reaped
+
+    def get_job(self, job_id):
+        """Return a job record, or None if it doesn't exist."""
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+            return self._to_dict(row.fetchone())
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Artifacts kept in per-job workspaces on a local or shared filesystem."""
+
+    def __init__(self, root):
+        """Use root as the parent directory of job workspaces."""
+        self.root = root
+
+    def workspace(self, job_id):
+        """Return the job's workspace directory."""
+        return workspace_path(self.root, job_id)
+
+    def paths(self, job_id):
+        """Return paths of every file listed in the job's manifest."""
+        return artifact_paths(self.workspace(job_id))
+
+    def manifest(self, job_id):
+        """Return the job's manifest, or None if it never finished."""
+        return read_manifest(self.workspace(job_id))
+
+    def commit(self, job_id):
+        """Leave the files in place; return the job's manifest."""
+        return self.manifest(job_id)
+
+    def release(self, job_id):
+        """Nothing is stored outside the workspace."""
+
+    def delete(self, job_id):
+        """Remove the job's workspace."""
+        self.release(job_id)
+        remove_workspace(self.workspace(job_id))
+
+
+class ContentAddressedArtifactStore(LocalArtifactStore):
+    """Workspaces whose dataset files are links to shared content-addressed blobs.
+
+    Identical outputs take disk space once, however many jobs produced
+    them. A job's files stay readable from its workspace until it is
+    deleted; blobs no job references are evicted past max_bytes.
+    """
+
+    def __init__(self, root, blob_root, max_bytes=BLOB_STORE_MAX_BYTES):
+        """Keep workspaces under root and blobs under blob_root."""
+        super().__init__(root)
+        self.blobs = BlobStore(blob_root, max_bytes)
+
+    def commit(self, job_id):
+        """Move the job's files into the blob store and record their digests."""
+        workspace = self.workspace(job_id)
+        manifest = read_manifest(workspace)
+        if manifest is None:
+            return None
+        for entry in manifest["files"]:
+            path = os.path.join(workspace, entry["name"])
+            entry["sha256"] = self.blobs.add(job_id, path)
+        save_manifest(workspace, manifest)
+        return manifest
+
+    def release(self, job_id):
+        """Drop the job's references so its blobs can be evicted."""
+        self.blobs.release(job_id)
+
+
+@lru_cache(maxsize=1)
+def get_stores():
+    """Return the process-wide (job store, artifact store) pair."""
+    logger.info("🗄️ Job store: %s, artifacts: %s", JOB_STORE_PATH, ARTIFACT_STORE)
+    if ARTIFACT_STORE == "local":
+        artifacts = LocalArtifactStore(OUTPUT_DIR)
+    else:
+        artifacts = ContentAddressedArtifactStore(OUTPUT_DIR, BLOB_STORE_PATH)
+    return SQLiteJobStore(JOB_STORE_PATH), artifacts
@@ -1,5 +1,6 @@
 """Gradio web interface for synthetic data generation."""
 
+import inspect
 import logging
 import gradio as gr
 from src.pipeline import DatasetPipeline
@@ -7,37 +8,47 @@ from src.constants import PROJECT_NAME, VERSION
 
 # Set up logger
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 
 pipeline = DatasetPipeline()
 
 PROJECT_NAME_CAP = PROJECT_NAME.capitalize()
 REPO_URL = f"https://github.com/lisekarimi/{PROJECT_NAME}"
 
+# Gradio 6 takes the page's extra <head> when mounting, Gradio 5 on Blocks
+MOUNT_TAKES_HEAD = "head" in inspect.signature(gr.mount_gradio_app).parameters
+
+
+TABULAR_FORMATS = [
+    "JSON",
+    "NDJSON",
+    "csv",
+    "csv.gz",
+    "csv.zst",
+    "Parquet",
+    "Feather",
+    "ORC",
+]
+TEXT_FORMATS = ["JSON", "NDJSON", "Markdown"]
+
 
 def update_output_format(dataset_type):
     """Update output format choices based on selected dataset type."""
     if dataset_type in ["Tabular", "Time-series"]:
-        return gr.update(choices=["JSON", "csv", "Parquet"], value="JSON")
+        return gr.update(choices=TABULAR_FORMATS, value="JSON")
     elif dataset_type == "Text":
-        return gr.update(choices=["JSON", "Markdown"], value="JSON")
+        return gr.update(choices=TEXT_FORMATS, value="JSON")
 
 
-def build_ui(css_path="assets/styles.css"):
-    """Build and return the complete Gradio user interface with error handling."""
-    # Try to load CSS file with error handling
-    try:
-        with open(css_path, encoding="utf-8") as f:
-            css = f.read()
-    except Exception as e:
-        css = ""
-        logger.warning("⚠️ Failed to load CSS: %s", e)
+def build_ui(head=""):
+    """Build and return the complete Gradio user interface with error handling.
 
+    The stylesheet, assets/styles.css, is linked by main.py as a cached file
+    through head, given here on Gradio 5 and to mount_gradio_app on Gradio 6.
+    """
+    options = {} if MOUNT_TAKES_HEAD else {"head": head}
     # Building the UI with error handling
     try:
-        with gr.Blocks(css=css, title=f"{PROJECT_NAME_CAP}") as ui:
+        with gr.Blocks(title=f"{PROJECT_NAME_CAP}", **options) as ui:
             with gr.Column(elem_id="app-container"):
                 gr.Markdown(f"<h1 id='app-title'>🏷️ {PROJECT_NAME_CAP} </h1>")
                 gr.Markdown(
@@ -103,7 +114,7 @@ def build_ui(css_path="assets/styles.css"):
 
                         with gr.Column(scale=1):
                             output_format = gr.Dropdown(
-                                choices=["JSON", "csv", "Parquet"],
+                                choices=TABULAR_FORMATS,
                                 value="JSON",
                                 label="📁 Output Format",
                                 elem_classes=["label-box"],
@@ -137,9 +148,17 @@ def build_ui(css_path="assets/styles.css"):
                 # Component to display status messages
                 status_message = gr.Markdown("", label="Status")
 
+                # First rows of the dataset, filled from the dry run
+                preview_table = gr.Dataframe(
+                    visible=False,
+                    interactive=False,
+                    label="👀 Preview",
+                    elem_id="preview-box",
+                )
+
                 # Button to trigger dataset generation
                 run_btn = gr.Button("Create a dataset", elem_id="run-btn")
-                run_btn.click(
+                run_event = run_btn.click(
                     pipeline.generate,
                     inputs=[
                         business_problem,
@@ -147,7 +166,15 @@ def build_ui(css_path="assets/styles.css"):
                         output_format,
                         num_samples,
                     ],
-                    outputs=[file_download, run_btn, status_message],
+                    outputs=[file_download, run_btn, status_message, preview_table],
+                )
+
+                # Stops the model call and the running script, not just the UI
+                cancel_btn = gr.Button("Cancel", elem_id="cancel-btn")
+                cancel_btn.click(
+                    pipeline.cancel,
+                    outputs=[status_message, run_btn],
+                    cancels=[run_event],
                 )
 
             # Explore More Projects section
@@ -1,16 +1,45 @@
 """Utility functions for extracting and executing Python code from LLM responses."""
 
+import ast
 import re
 import os
 import subprocess
 import sys
+import time
 import logging
+import warnings
+from .cancellation import raise_if_cancelled
+from .validation import (
+    count_rows,
+    read_schema,
+    schema_differences,
+    split_extension,
+)
+from .constants import EXECUTION_ENGINE, EXECUTION_TIMEOUT_SECONDS
+from .engines import (
+    SubinterpreterUnsupported,
+    can_run_in_subinterpreter,
+    run_in_subinterpreter,
+)
+from .profiling import (
+    PROFILE_BOOTSTRAP,
+    RUN_BOOTSTRAP,
+    format_report,
+    read_profile,
+    start_profile,
+)
+from .progress import PROGRESS_BOOTSTRAP, PROGRESS_FD_ENV, report, start_row_reader
+from .resources import (
+    LIMITS_BOOTSTRAP,
+    AccountedPopen,
+    admission,
+    kill_process_group,
+    limits_env,
+    usage_from_rusage,
+)
 
 # Set up logger
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 
 
 def extract_code(text):
@@ -31,15 +60,38 @@ def extract_code(text):
         raise
 
 
+# os.path.join() of two string literals, each closed by the quote it opened with
+JOIN_PATTERN = r'os\.path\.join\(\s*((["\']).*?\2)\s*,\s*((["\']).*?\4)\s*\)'
+
+
+def string_value(literal):
+    """Return the value of a quoted string literal, unescaping it if it parses."""
+    try:
+        with warnings.catch_warnings():
+            # Windows paths in scripts often hold invalid escapes like \d
+            warnings.simplefilter("ignore")
+            return ast.literal_eval(literal)
+    except (ValueError, SyntaxError):
+        return literal[1:-1]
+
+
+def extract_file_paths(code_str):
+    """Extract every distinct file path built with os.path.join() in a script."""
+    paths = [
+        os.path.join(string_value(folder), string_value(name))
+        for folder, _, name, _ in re.findall(JOIN_PATTERN, code_str)
+    ]
+    return list(dict.fromkeys(paths))
+
+
 def extract_file_path(code_str):
     """Extract file path from code string containing os.path.join() calls."""
     try:
         # Look for os.path.join() pattern with two string arguments
-        pattern = r'os\.path\.join\(\s*["\'](.+?)["\']\s*,\s*["\'](.+?)["\']\s*\)'
-        match = re.search(pattern, code_str)
+        match = re.search(JOIN_PATTERN, code_str)
         if match:
-            folder = match.group(1)
-            filename = match.group(2)
+            folder = string_value(match.group(1))
+            filename = string_value(match.group(3))
             return os.path.join(folder, filename)
 
         logger.error("No file path found.")
@@ -49,30 +101,446 @@ def extract_file_path(code_str):
         raise
 
 
-def execute_code_in_virtualenv(text, python_interpreter=sys.executable):
-    """Execute extracted Python code in a subprocess and return the file path."""
+def trim_traceback(error, max_lines):
+    """Keep only the last lines of an error message, where the cause is."""
+    lines = error.strip().splitlines()
+    return "\n".join(lines[-max_lines:])
+
+
+def apply_patch(code_str, patch_text):
+    """Apply SEARCH/REPLACE edit blocks from a model reply to a script.
+
+    A reply with no edit blocks but a full ```python block replaces the
+    script entirely. Raises ValueError if a block doesn't match the script.
+    """
+    pattern = r"<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE"
+    blocks = re.findall(pattern, patch_text, re.DOTALL)
+
+    if not blocks:
+        # Some replies send the whole corrected script instead of a diff
+        replacement = extract_code(patch_text).strip()
+        if replacement:
+            return replacement
+        raise ValueError("No edit blocks found in repair reply.")
+
+    for search, replace in blocks:
+        if search not in code_str:
+            raise ValueError(f"Edit block does not match script:\n{search}")
+        code_str = code_str.replace(search, replace, 1)
+
+    return code_str
+
+
+# Name parts of variables holding a row count, e.g. num_samples, N_ROWS
+COUNT_NAME_PARTS = {"n", "num", "samples", "sample", "rows", "records", "count"}
+COUNT_NAME_PARTS |= {"entries", "size", "length", "nrows"}
+
+# Keyword arguments that set how many values a call makes
+SIZE_KEYWORDS = {"size", "n", "k", "periods", "nrows", "num", "length"}
+SIZE_KEYWORDS |= {"num_samples", "n_samples", "num_rows", "n_rows", "count"}
+
+# Position of the size argument of random and array functions (-1: last)
+SIZE_POSITIONS = {
+    "choice": 1,
+    "sample": -1,
+    "randint": 2,
+    "integers": 2,
+    "normal": 2,
+    "uniform": 2,
+    "lognormal": 2,
+    "binomial": 2,
+    "gamma": 2,
+    "beta": 2,
+    "logistic": 2,
+    "laplace": 2,
+    "triangular": 3,
+    "poisson": 1,
+    "exponential": 1,
+    "geometric": 1,
+    "zipf": 1,
+    "pareto": 1,
+    "weibull": 1,
+    "standard_normal": 0,
+    "random": 0,
+    "rand": 0,
+    "randn": 0,
+    "zeros": 0,
+    "ones": 0,
+    "empty": 0,
+    "full": 0,
+    "linspace": 2,
+}
+
+
+def is_count_name(name):
+    """Check whether a variable name looks like it holds a row count."""
+    parts = name.lower().split("_")
+    return bool(COUNT_NAME_PARTS.intersection(parts)) or parts[0].startswith("num")
+
+
+def sample_count_literals(code_str, num_samples):
+    """Find the integer literals a script uses as its sample count.
+
+    Only literals in a count position are returned: the value of a
+    count-named variable, a size argument, the stop of range()/arange()
+    (also as N + 1), a list repetition or a len(...) < N loop condition.
+    Returns their ast.Constant nodes; none if the script doesn't parse.
+    """
+    try:
+        tree = ast.parse(code_str)
+    except SyntaxError:
+        return []
+
+    def count(node):
+        """Return node if it is the sample count literal, else None."""
+        if (
+            isinstance(node, ast.Constant)
+            and type(node.value) is int
+            and node.value == int(num_samples)
+        ):
+            return node
+        # range(1, N + 1) and the like
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add | ast.Sub):
+            return count(node.left)
+        return None
+
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign | ast.AnnAssign):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if all(isinstance(t, ast.Name) and is_count_name(t.id) for t in targets):
+                found.append(count(node.value))
+        elif isinstance(node, ast.Call):
+            func = node.func
+            name = getattr(func, "attr", None) or getattr(func, "id", "")
+            found += [count(k.value) for k in node.keywords if k.arg in SIZE_KEYWORDS]
+            args = node.args
+            if name in ("range", "arange") and args:
+                found.append(count(args[1] if len(args) > 1 else args[0]))
+            elif name in SIZE_POSITIONS and -len(args) <= SIZE_POSITIONS[name] < len(
+                args
+            ):
+                found.append(count(args[SIZE_POSITIONS[name]]))
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+            # [value] * N
+            for side, other in ((node.left, node.right), (node.right, node.left)):
+                if isinstance(other, ast.List | ast.Tuple):
+                    found.append(count(side))
+        elif isinstance(node, ast.Compare) and isinstance(node.left, ast.Call):
+            # while len(rows) < N
+            if getattr(node.left.func, "id", None) == "len":
+                found += [count(c) for c in node.comparators]
+    return [node for node in found if node is not None]
+
+
+def replace_sample_count(code_str, num_samples, new_count):
+    """Replace the literals a script uses as its sample count with another count.
+
+    Other integers that happen to equal the sample count, such as value
+    ranges or percentages, are kept (see sample_count_literals).
+    """
+    nodes = sample_count_literals(code_str, num_samples)
+    # AST offsets are in UTF-8 bytes
+    source = code_str.encode("utf-8")
+    starts = [0]
+    for line in source.splitlines(keepends=True):
+        starts.append(starts[-1] + len(line))
+    spans = {
+        (
+            starts[n.lineno - 1] + n.col_offset,
+            starts[n.end_lineno - 1] + n.end_col_offset,
+        )
+        for n in nodes
+    }
+    for start, end in sorted(spans, reverse=True):
+        source = source[:start] + str(new_count).encode() + source[end:]
+    return source.decode("utf-8")
+
+
+def add_filename_suffix(code_str, suffix):
+    """Add a suffix before the extension of every os.path.join filename."""
+
+    def add_suffix(match):
+        stem, extension = split_extension(match.group(3))
+        return f"{match.group(1)}{stem}{suffix}{extension}{match.group(4)}"
+
+    pattern = r'(os\.path\.join\(\s*(["\']).+?\2\s*,\s*["\'])(.+?)(["\']\s*\))'
+    return re.sub(pattern, add_suffix, code_str)
+
+
+def shift_seeds(code_str, offset):
+    """Add an offset to literal random seeds so a re-run draws new values.
+
+    Covers random.seed, np.random.seed, Faker.seed, seed_instance,
+    default_rng and RandomState, with the seed passed positionally or as seed=.
+    """
+    pattern = (
+        r"((?:seed|seed_instance|default_rng|RandomState)\(\s*(?:seed\s*=\s*)?)"
+        r"(\d+)(?=\s*\))"
+    )
+    return re.sub(
+        pattern, lambda m: f"{m.group(1)}{int(m.group(2)) + offset}", code_str
+    )
+
+
+def make_dry_run_code(code_str, num_samples, dry_run_samples):
+    """Rewrite a script to write a few rows to preview files.
+
+    The sample count (see replace_sample_count) becomes the dry-run count, and
+    every os.path.join filename gets a "_preview" suffix before its extension.
+    """
+    code_str = replace_sample_count(code_str, num_samples, dry_run_samples)
+    return add_filename_suffix(code_str, "_preview")
+
+
+def make_shard_code(code_str, num_samples, extra_samples, part, seed_offset):
+    """Rewrite a job's script to write extra_samples new rows to part files.
+
+    Outputs get a "_part<part>" suffix and literal seeds are shifted by
+    seed_offset, so the shard doesn't repeat the rows already generated.
+    """
+    code_str = replace_sample_count(code_str, num_samples, extra_samples)
+    code_str = shift_seeds(code_str, seed_offset)
+    return add_filename_suffix(code_str, f"_part{part}")
+
+
+def run_script(
+    code_str,
+    python_interpreter,
+    on_usage=None,
+    cancel_token=None,
+    on_progress=None,
+    on_profile=None,
+):
+    """Run a script in a subprocess, returning None or an error tuple.
+
+    The child runs in its own process group under CPU and memory rlimits and
+    is killed with its children after EXECUTION_TIMEOUT_SECONDS, or as soon as
+    cancel_token is cancelled (raising JobCancelled). Its resource usage is
+    logged, fed to the admission controller and passed to on_usage. With
+    on_progress, a wait for memory budget is reported as "queued" and the
+    rows the script writes are reported over a pipe as "rows" events.
+
+    With on_profile, the script runs under the sampling profiler and
+    tracemalloc, and the hot-spot report (see src.profiling) is passed to
+    on_profile.
+
+    With EXECUTION_ENGINE=subinterpreter, scripts that can are run in a
+    sub-interpreter instead (see src.engines), unless they are profiled.
+    """
+    if (
+        EXECUTION_ENGINE == "subinterpreter"
+        and not on_profile
+        and can_run_in_subinterpreter(code_str, python_interpreter)
+    ):
+        try:
+            return run_in_subinterpreter(
+                code_str, python_interpreter, on_usage, cancel_token
+            )
+        except SubinterpreterUnsupported as e:
+            logger.info("Script can't run in a sub-interpreter (%s)", e)
+
+    if admission.would_wait():
+        report(on_progress, "queued", ahead=admission.waiting)
+    reservation = admission.acquire(cancel_token=cancel_token)
+    usage = None
+    start = time.monotonic()
+    unregister = None
+    write_fd = reader = profile_path = None
+    popen_options = {}
+    try:
+        bootstrap, env = None, limits_env()
+        if on_progress and os.name == "posix":
+            # The bootstrap hooks dataframe writers, then runs the script
+            write_fd, reader = start_row_reader(on_progress)
+            bootstrap = PROGRESS_BOOTSTRAP
+            env[PROGRESS_FD_ENV] = str(write_fd)
+            popen_options["pass_fds"] = (write_fd,)
+        if on_profile:
+            profile_path, profile_env = start_profile()
+            bootstrap = PROFILE_BOOTSTRAP + (bootstrap or RUN_BOOTSTRAP)
+            env.update(profile_env)
+        # The child sets its own limits, then hooks and runs the script
+        bootstrap = LIMITS_BOOTSTRAP + (bootstrap or RUN_BOOTSTRAP)
+        command = [python_interpreter, "-c", bootstrap, code_str]
+
+        try:
+            process = AccountedPopen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                start_new_session=True,
+                env={**os.environ, **env},
+                **popen_options,
+            )
+        finally:
+            # Only the child writes; the reader stops when the child exits
+            if write_fd is not None:
+                os.close(write_fd)
+        if cancel_token is not None:
+            unregister = cancel_token.register(lambda: kill_process_group(process))
+
+        try:
+            _, stderr = process.communicate(timeout=EXECUTION_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process)
+            process.communicate()
+            stderr = (
+                f"TimeoutError: script ran longer than {EXECUTION_TIMEOUT_SECONDS}s"
+            )
+
+        if reader is not None:
+            reader.join(timeout=1)
+
+        usage = usage_from_rusage(process.rusage, time.monotonic() - start)
+        usage["returncode"] = process.returncode
+        logger.info("📊 Script usage: %s", usage)
+        if on_usage:
+            on_usage(usage)
+        if profile_path is not None:
+            profile = read_profile(profile_path, code_str)
+            profile_path = None
+            if profile is not None:
+                logger.info("🔥 Script profile:\n%s", format_report(profile))
+                on_profile(profile)
+
+        raise_if_cancelled(cancel_token)
+        if process.returncode != 0:
+            # Return error information if subprocess execution fails
+            return (f"Execution error:\n{stderr.strip()}", None)
+        return None
+    finally:
+        if unregister:
+            unregister()
+        if profile_path is not None and os.path.exists(profile_path):
+            os.remove(profile_path)
+        admission.release(reservation, usage)
+
+
+def discard_files(paths):
+    """Delete files that may or may not exist."""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def dry_run(
+    code_str,
+    python_interpreter,
+    num_samples,
+    output_format,
+    samples,
+    on_usage=None,
+    cancel_token=None,
+):
+    """Run a small-scale copy of the script and check its output parses.
+
+    Returns (preview_path, None) on success, or (None, error_tuple).
+    """
+    preview_code = make_dry_run_code(code_str, num_samples, samples)
+    error = run_script(preview_code, python_interpreter, on_usage, cancel_token)
+    if error:
+        return None, error
+
+    # Multi-entity scripts write several files; every one must parse
+    preview_paths = extract_file_paths(preview_code)
+    if not preview_paths or not all(os.path.exists(p) for p in preview_paths):
+        discard_files(preview_paths)
+        return None, ("Execution error:\nDry run did not create a file.", None)
+
+    for preview_path in preview_paths:
+        try:
+            rows = count_rows(preview_path, output_format) if output_format else None
+        except Exception as e:
+            discard_files(preview_paths)
+            error = f"Unreadable {output_format} output {preview_path}: {e}"
+            return None, (f"Execution error:\n{error}", None)
+
+        if rows is not None and rows != samples:
+            # The sample count may be computed rather than a literal; not fatal
+            logger.warning("Dry run wrote %d rows instead of %d", rows, samples)
+
+    # Only the first file is used for the preview
+    discard_files(preview_paths[1:])
+    logger.info("✅ Dry run passed: %s", preview_paths[0])
+    return preview_paths[0], None
+
+
+def safe_read_schema(file_path, output_format):
+    """Return read_schema() of a file, or None if it can't be read."""
+    try:
+        return read_schema(file_path, output_format) if output_format else None
+    except Exception as e:
+        logger.warning("Could not read the schema of %s: %s", file_path, e)
+        return None
+
+
+def execute_code_in_virtualenv(
+    text,
+    python_interpreter=sys.executable,
+    num_samples=None,
+    output_format=None,
+    dry_run_samples=None,
+    on_preview=None,
+    on_usage=None,
+    cancel_token=None,
+    on_progress=None,
+    on_profile=None,
+):
+    """Execute extracted Python code in a subprocess and return the file path.
+
+    With dry_run_samples set, the script first runs at that small size and its
+    output is checked to parse before the full-size run, whose columns and
+    types are then compared with the preview's. The preview file path is
+    passed to on_preview (or deleted if no callback is given). Resource usage
+    of every run is passed to on_usage. Cancelling cancel_token kills the
+    running script and raises JobCancelled. Progress of the full-size run
+    is passed to on_progress, and its profile report to on_profile (which
+    turns profiling on).
+    """
     if not python_interpreter:
         raise OSError("Python interpreter not found.")
 
     # Extract the Python code from the input text
     code_str = extract_code(text)
+    preview_schema = None
 
-    # Prepare subprocess command
-    command = [python_interpreter, "-c", code_str]
+    if dry_run_samples and num_samples and int(num_samples) > dry_run_samples:
+        preview_path, error = dry_run(
+            code_str,
+            python_interpreter,
+            num_samples,
+            output_format,
+            dry_run_samples,
+            on_usage,
+            cancel_token,
+        )
+        if error:
+            return error
+        preview_schema = safe_read_schema(preview_path, output_format)
+        if on_preview:
+            on_preview(preview_path)
+        else:
+            os.remove(preview_path)
+        report(on_progress, "validated")
 
-    try:
-        # logger.info("✅ Running script: %s", command)
+    error = run_script(
+        code_str, python_interpreter, on_usage, cancel_token, on_progress, on_profile
+    )
+    if error:
+        return error
 
-        # Execute the code in subprocess
-        # Note: We capture the result but don't need to use it directly
-        # The subprocess.run() with check=True will raise an exception if it fails
-        subprocess.run(command, check=True, capture_output=True, text=True)
+    # Extract file path from the executed code
+    file_path = extract_file_path(code_str)
+    logger.info("✅ Extracted file path: %s", file_path)
 
-        # Extract file path from the executed code
-        file_path = extract_file_path(code_str)
-        logger.info("✅ Extracted file path: %s", file_path)
+    if preview_schema:
+        # The preview shown to the user should look like the real dataset
+        differences = schema_differences(
+            preview_schema, safe_read_schema(file_path, output_format)
+        )
+        if differences:
+            logger.warning("Preview doesn't match the full run: %s", differences)
 
-        return file_path
-    except subprocess.CalledProcessError as e:
-        # Return error information if subprocess execution fails
-        return (f"Execution error:\n{e.stderr.strip()}", None)
+    return file_path
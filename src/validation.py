@@ -0,0 +1,346 @@
+"""Checks that a generated dataset file matches the requested output."""
+
+import json
+import os
+import re
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.json as pajson
+import pyarrow.orc as orc
+import pyarrow.parquet as pq
+from .constants import (
+    VALIDATION_BATCH_ROWS,
+    VALIDATION_BLOCK_BYTES,
+    VALIDATION_MAX_NULL_RATIO,
+    logger,
+)
+
+# Expected file extension for each output format
+FORMAT_EXTENSIONS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "csv.zst": ".csv.zst",
+    "json": ".json",
+    "ndjson": ".ndjson",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "orc": ".orc",
+    "markdown": ".md",
+}
+
+# Formats whose rows are tabular records the report can inspect
+TABULAR_FORMATS = {
+    "csv",
+    "csv.gz",
+    "csv.zst",
+    "json",
+    "ndjson",
+    "parquet",
+    "feather",
+    "orc",
+}
+
+# Column names taken as a record key when no key column is given
+KEY_COLUMN = re.compile(r"(?i)^(?:id|\w+_id)$")
+
+# Between two objects of a JSON array
+RECORD_BOUNDARY = re.compile(r"\s*,\s*(?=\{)")
+
+# Extensions made of two parts, which os.path.splitext would cut in half
+COMPOUND_EXTENSIONS = (".csv.gz", ".csv.zst")
+
+
+def split_extension(name):
+    """Split a filename into stem and extension, keeping .csv.gz together."""
+    for extension in COMPOUND_EXTENSIONS:
+        if name.lower().endswith(extension):
+            return name[: -len(extension)], name[-len(extension) :]
+    return os.path.splitext(name)
+
+
+def count_lines_in_stream(stream, chunk_size=1 << 20):
+    """Count newline-terminated lines in a binary stream."""
+    lines, last = 0, b"\n"
+    while chunk := stream.read(chunk_size):
+        lines += chunk.count(b"\n")
+        last = chunk[-1:]
+    return lines + (last != b"\n")
+
+
+def count_rows(file_path, output_format):
+    """Count the records in a dataset file, or return None for free text."""
+    output_format = output_format.lower()
+    if output_format == "parquet":
+        # Row count is stored in the footer, no need to read the data
+        return pq.ParquetFile(file_path).metadata.num_rows
+    if output_format == "orc":
+        return orc.ORCFile(file_path).nrows
+    if output_format == "feather":
+        return pa.ipc.open_file(pa.memory_map(file_path)).count_rows()
+    if output_format in ("csv", "csv.gz", "csv.zst"):
+        # Compression is detected from the file extension
+        options = pacsv.ParseOptions(newlines_in_values=True)
+        return pacsv.read_csv(file_path, parse_options=options).num_rows
+    if output_format == "ndjson":
+        with open(file_path, "rb") as f:
+            return count_lines_in_stream(f)
+    if output_format == "json":
+        with open(file_path, encoding="utf-8") as f:
+            return len(json.load(f))
+    return None
+
+
+def split_json_records(text, decoder):
+    """Parse the complete objects at the start of a JSON array's contents.
+
+    text starts at an object; returns the objects followed by a comma and
+    the text from the first one that isn't. Fast path: cut the text after
+    its last "}," and parse the lot at once; if that cut falls inside an
+    object, decode object by object instead.
+    """
+    end = len(text)
+    while (end := text.rfind("}", 0, end)) >= 0:
+        boundary = RECORD_BOUNDARY.match(text, end + 1)
+        if boundary:
+            try:
+                records = json.loads("[" + text[: end + 1] + "]")
+            except json.JSONDecodeError:
+                break
+            return records, text[boundary.end() :]
+
+    records, position = [], 0
+    while True:
+        try:
+            record, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return records, text[position:]
+        boundary = RECORD_BOUNDARY.match(text, end)
+        if not boundary:
+            return records, text[position:]
+        records.append(record)
+        position = boundary.end()
+
+
+def iter_json_array(file_path, block_size=VALIDATION_BLOCK_BYTES):
+    """Yield the objects of a JSON array, parsing the file block by block.
+
+    Raises ValueError if the file isn't an array of objects.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, encoding="utf-8") as f:
+        pending = ""
+        while not pending and (chunk := f.read(block_size)):
+            pending = chunk.lstrip()
+        if not pending.startswith("["):
+            raise ValueError("JSON output must be an array of objects")
+        pending = pending[1:].lstrip()
+
+        parsed = 0
+        while chunk := f.read(block_size):
+            records, pending = split_json_records(pending + chunk, decoder)
+            if not all(isinstance(record, dict) for record in records):
+                raise ValueError("JSON output must be an array of objects")
+            parsed += len(records)
+            yield from records
+
+        # The rest closes the array
+        records = json.loads("[" + pending)
+        if not all(isinstance(record, dict) for record in records):
+            raise ValueError("JSON output must be an array of objects")
+        if parsed and not records:
+            raise ValueError("Trailing comma in the JSON array")
+        yield from records
+
+
+def iter_batches(file_path, output_format, batch_rows=VALIDATION_BATCH_ROWS):
+    """Yield a dataset file's rows as Arrow record batches, reading it once.
+
+    Text formats are parsed VALIDATION_BLOCK_BYTES at a time. Raises if the
+    file doesn't parse as the format, including when a column's type
+    changes partway through a CSV, NDJSON or JSON file.
+    """
+    if output_format == "parquet":
+        yield from pq.ParquetFile(file_path).iter_batches(batch_size=batch_rows)
+    elif output_format == "orc":
+        reader = orc.ORCFile(file_path)
+        for stripe in range(reader.nstripes):
+            yield reader.read_stripe(stripe)
+    elif output_format == "feather":
+        reader = pa.ipc.open_file(pa.memory_map(file_path))
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+    elif output_format in ("csv", "csv.gz", "csv.zst"):
+        yield from pacsv.open_csv(
+            file_path,
+            read_options=pacsv.ReadOptions(block_size=VALIDATION_BLOCK_BYTES),
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        )
+    elif output_format == "ndjson":
+        yield from pajson.open_json(
+            file_path,
+            read_options=pajson.ReadOptions(block_size=VALIDATION_BLOCK_BYTES),
+        )
+    else:
+        # Later batches must convert to the types of the first
+        schema, records = None, []
+        for record in iter_json_array(file_path):
+            records.append(record)
+            if len(records) == batch_rows:
+                batch = pa.RecordBatch.from_pylist(records, schema=schema)
+                schema, records = batch.schema, []
+                yield batch
+        if records or schema is None:
+            yield pa.RecordBatch.from_pylist(records, schema=schema)
+
+
+def read_schema(file_path, output_format):
+    """Return the (name, type) of each column of a tabular file.
+
+    Types are taken from the first batch. Returns None for text formats.
+    """
+    if output_format.lower() not in TABULAR_FORMATS:
+        return None
+    for batch in iter_batches(file_path, output_format.lower()):
+        return [(field.name, str(field.type)) for field in batch.schema]
+    return []
+
+
+def schema_differences(preview, full):
+    """List how a dry run's columns differ from the full run's.
+
+    Columns that were all null in the preview have no type to compare.
+    """
+    if preview is None or full is None:
+        return []
+    names = [name for name, _ in preview]
+    if names != [name for name, _ in full]:
+        return [f"columns {names} instead of {[name for name, _ in full]}"]
+    return [
+        f"{name!r} is {small} instead of {large}"
+        for (name, small), (_, large) in zip(preview, full, strict=True)
+        if small != large and small != "null"
+    ]
+
+
+def find_key_column(names):
+    """Return the column that should hold unique record keys, or None."""
+    return names[0] if names and KEY_COLUMN.match(names[0]) else None
+
+
+def count_duplicates(values):
+    """Count the repeated non-null values of a (chunked) array."""
+    values = values.drop_null()
+    if len(values) < 2:
+        return 0
+    values = values.combine_chunks()
+    # Generated keys are usually sequential, which rules out repeats cheaply
+    if pc.all(pc.less(values[:-1], values[1:])).as_py():
+        return 0
+    return len(values) - pc.count_distinct(values).as_py()
+
+
+def validate_dataset(
+    file_path,
+    output_format,
+    num_samples,
+    key_column=None,
+    max_null_ratio=VALIDATION_MAX_NULL_RATIO,
+):
+    """Check a dataset file in one streaming pass and return a report.
+
+    The report is a JSON-serializable dict: "valid", the "issues" found,
+    "rows" and "expected_rows", per-column "columns" (name, type, null
+    count and ratio), the "key" column checked for "duplicate_keys" with
+    its [min, max] "key_range" if it holds integers, and the "seconds" the
+    check took. Issues are a wrong extension, a file that
+    doesn't parse (or changes a column's type), a wrong row count, columns
+    with a null ratio of at least max_null_ratio, and duplicate keys. The
+    key column is the first column if it is named id or <name>_id.
+    """
+    start = time.perf_counter()
+    output_format = output_format.lower()
+    report = {
+        "valid": False,
+        "format": output_format,
+        "rows": None,
+        "expected_rows": int(num_samples),
+        "columns": [],
+        "key": None,
+        "duplicate_keys": 0,
+        "key_range": None,
+        "issues": [],
+    }
+    issues = report["issues"]
+
+    extension = FORMAT_EXTENSIONS.get(output_format)
+    if extension and not file_path.lower().endswith(extension):
+        issues.append(f"File extension doesn't match {output_format}")
+    if output_format not in TABULAR_FORMATS:
+        # Free text: nothing to count or type
+        report["valid"] = not issues
+        report["seconds"] = round(time.perf_counter() - start, 4)
+        return report
+
+    schema, rows, nulls, keys = None, 0, None, []
+    try:
+        for batch in iter_batches(file_path, output_format):
+            if schema is None:
+                schema = batch.schema
+                nulls = [0] * batch.num_columns
+                key_column = key_column or find_key_column(schema.names)
+            elif not batch.schema.equals(schema):
+                raise ValueError(f"Column types changed at row {rows}")
+            rows += batch.num_rows
+            for i, column in enumerate(batch.columns):
+                nulls[i] += column.null_count
+            if key_column in schema.names:
+                keys.append(batch.column(key_column))
+    except Exception as e:
+        issues.append(f"Not valid {output_format}: {e}")
+        report["seconds"] = round(time.perf_counter() - start, 4)
+        return report
+
+    report["rows"] = rows
+    if rows != int(num_samples):
+        issues.append(f"{rows} rows instead of {num_samples}")
+
+    for i, field in enumerate(schema or []):
+        ratio = nulls[i] / rows if rows else 0.0
+        report["columns"].append(
+            {
+                "name": field.name,
+                "type": str(field.type),
+                "nulls": nulls[i],
+                "null_ratio": round(ratio, 4),
+            }
+        )
+        if rows and ratio >= max_null_ratio:
+            issues.append(f"Column {field.name!r} is {ratio:.0%} null")
+
+    if keys:
+        keys = pa.chunked_array(keys)
+        duplicates = count_duplicates(keys)
+        report["key"] = key_column
+        report["duplicate_keys"] = duplicates
+        if pa.types.is_integer(keys.type) and len(keys) > keys.null_count:
+            bounds = pc.min_max(keys).as_py()
+            report["key_range"] = [bounds["min"], bounds["max"]]
+        if duplicates:
+            issues.append(f"{duplicates} duplicate value(s) in key {key_column!r}")
+
+    report["valid"] = not issues
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    return report
+
+
+def check_output(file_path, output_format, num_samples):
+    """Return True if the file exists and passes validate_dataset."""
+    if not isinstance(file_path, str) or not os.path.exists(file_path):
+        return False
+
+    report = validate_dataset(file_path, output_format, num_samples)
+    if not report["valid"]:
+        logger.warning("%s failed validation: %s", file_path, report["issues"])
+    return report["valid"]
@@ -0,0 +1,179 @@
+"""Background generation of popular catalog specs, served instantly on request."""
+
+import os
+import shutil
+import threading
+import time
+from .cache import SimilarityCache
+from .cli import job_key, load_manifest
+from .scheduler import predict_cost
+from .workspace import (
+    create_workspace,
+    new_job_id,
+    read_manifest,
+    remove_workspace,
+    write_manifest,
+)
+from .constants import (
+    CATALOG_IDLE_POLL_SECONDS,
+    CATALOG_PATH,
+    CATALOG_REFRESH_SECONDS,
+    logger,
+)
+
+# Scheduler client that warming jobs run as
+CATALOG_CLIENT = "catalog"
+
+
+def link_or_copy(source, destination):
+    """Hard-link a file, or copy it where links aren't possible."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+class CatalogWarmer:
+    """Generate catalog specs while the server is idle and serve their files.
+
+    Each spec is generated like a normal job; its validated script also
+    lands in the generator's similarity cache. A request matching a warmed
+    spec (similar business problem, same type, format and sample count)
+    gets a copy of the warmed files instead of a new model call and run.
+    Warming only starts a job when no live job is running or waiting, and
+    runs one at a time.
+    """
+
+    def __init__(
+        self,
+        generator,
+        scheduler,
+        catalog_path=CATALOG_PATH,
+        refresh_seconds=CATALOG_REFRESH_SECONDS,
+    ):
+        """Initialize with nothing warmed; call start() to begin warming."""
+        self.generator = generator
+        self.scheduler = scheduler
+        self.catalog_path = catalog_path
+        self.refresh_seconds = refresh_seconds
+        # Latest warmed output of each spec, and an index of their problems
+        self.entries = {}
+        self.index = SimilarityCache()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_specs(self):
+        """Read the catalog, or return no specs if it can't be read."""
+        try:
+            return load_manifest(self.catalog_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Catalog %s not loaded: %s", self.catalog_path, e)
+            return []
+
+    def wait_until_idle(self):
+        """Block until no live job is running or queued; False if stopped."""
+        while self.scheduler.busy():
+            if self._stop.wait(CATALOG_IDLE_POLL_SECONDS):
+                return False
+        return not self._stop.is_set()
+
+    def warm(self, spec):
+        """Generate one spec in its own workspace and remember its files."""
+        key = job_key(spec)
+        spec = {k: v for k, v in spec.items() if k != "id"}
+        cost = predict_cost(spec["num_samples"], spec["output_format"])
+        job_id = new_job_id()
+        try:
+            with self.scheduler.slot(CATALOG_CLIENT, cost):
+                file_path = self.generator.generate_dataset(job_id=job_id, **spec)
+        except Exception as e:
+            logger.warning("Could not warm catalog spec %s: %s", key, e)
+            file_path = None
+
+        workspace = self.generator.workspace_for(job_id)
+        manifest = read_manifest(workspace)
+        if not isinstance(file_path, str) or manifest is None:
+            remove_workspace(workspace)
+            return False
+
+        entry = {
+            "workspace": workspace,
+            "file_name": os.path.basename(file_path),
+            "files": [f["name"] for f in manifest["files"]],
+            "spec": spec,
+            "warmed_at": time.time(),
+        }
+        with self._lock:
+            previous = self.entries.get(key)
+            self.entries[key] = entry
+            if previous is None:
+                self.index.add(
+                    spec["business_problem"],
+                    spec["dataset_type"],
+                    spec["output_format"],
+                    spec["num_samples"],
+                    key=key,
+                )
+        if previous is not None:
+            remove_workspace(previous["workspace"])
+        logger.info("🔥 Warmed catalog spec %s", key)
+        return True
+
+    def warm_catalog(self):
+        """Warm every catalog spec not refreshed recently; return how many."""
+        warmed = 0
+        for spec in self.load_specs():
+            with self._lock:
+                entry = self.entries.get(job_key(spec))
+            if entry and time.time() - entry["warmed_at"] < self.refresh_seconds:
+                continue
+            if not self.wait_until_idle():
+                break
+            warmed += self.warm(spec)
+        return warmed
+
+    def lookup(self, business_problem, dataset_type, output_format, num_samples):
+        """Return the warmed entry matching a request, or None."""
+        _, match = self.index.lookup(
+            business_problem, dataset_type, output_format, num_samples
+        )
+        if match is None:
+            return None
+        with self._lock:
+            return self.entries.get(match["key"])
+
+    def serve(self, entry, job_id):
+        """Copy a warmed entry's files into a new job's workspace.
+
+        Returns the path of the main dataset file and the job's manifest.
+        """
+        workspace = create_workspace(self.generator.output_dir, job_id)
+        for name in entry["files"]:
+            link_or_copy(
+                os.path.join(entry["workspace"], name), os.path.join(workspace, name)
+            )
+        manifest = write_manifest(workspace, job_id, spec=entry["spec"])
+        return os.path.join(workspace, entry["file_name"]), manifest
+
+    def run(self):
+        """Warm the catalog now and again every refresh_seconds until stopped."""
+        while not self._stop.is_set():
+            warmed = self.warm_catalog()
+            logger.info("🔥 Catalog warming pass done: %d spec(s) warmed", warmed)
+            self._stop.wait(self.refresh_seconds)
+
+    def start(self):
+        """Start warming in a background thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop warming after the current job and drop every warmed file."""
+        self._stop.set()
+        with self._lock:
+            entries, self.entries = list(self.entries.values()), {}
+            self.index = SimilarityCache()
+        for entry in entries:
+            remove_workspace(entry["workspace"])
@@ -0,0 +1,176 @@
+"""Background worker running the jobs queued in the shared job store.
+
+Usage: python -m src.worker [--once]
+
+Each worker claims the oldest queued job, renews its lease with heartbeats
+while it runs, and records the result. Before claiming, it reaps running
+jobs whose lease ran out: their worker died, so they are queued again, or
+failed once they used up their attempts. Only the generator is imported,
+not the web UI.
+"""
+
+import argparse
+import os
+import sys
+import threading
+from .cancellation import CancellationToken
+from .datagen import DataGen
+from .logs import log_context
+from .store import FAILED, WORKER_ID, get_stores
+from .constants import (
+    JOB_HEARTBEAT_SECONDS,
+    JOB_LEASE_SECONDS,
+    WORKER_POLL_SECONDS,
+    logger,
+)
+
+
+class Heartbeat:
+    """Renew a running job's lease in the background until stopped.
+
+    If another worker took the job over, on_lost is called once.
+    """
+
+    def __init__(self, job_store, job_id, worker_id, on_lost=None):
+        """Start renewing the lease of job_id held by worker_id."""
+        self.job_store = job_store
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.on_lost = on_lost
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Renew the lease every JOB_HEARTBEAT_SECONDS."""
+        while not self._stopped.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                owned = self.job_store.heartbeat(self.job_id, self.worker_id)
+            except Exception as e:
+                logger.warning("Heartbeat of job %s failed: %s", self.job_id, e)
+                continue
+            if not owned:
+                logger.warning("Lost the lease of job %s", self.job_id)
+                if self.on_lost:
+                    self.on_lost()
+                return
+
+    def stop(self):
+        """Stop renewing the lease."""
+        self._stopped.set()
+        self._thread.join()
+
+    def __enter__(self):
+        """Return the running heartbeat."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop renewing the lease."""
+        self.stop()
+
+
+def commit_artifacts(artifact_store, job_id, stats):
+    """Hand a finished job's files to the artifact store.
+
+    Storing is an optimization: if it fails the files stay as written.
+    """
+    try:
+        manifest = artifact_store.commit(job_id)
+    except Exception as e:
+        logger.warning("Could not store files of job %s: %s", job_id, e)
+        return
+    if manifest is not None:
+        stats["manifest"] = manifest
+
+
+class QueueWorker:
+    """Claims queued jobs from the shared store and runs them here."""
+
+    def __init__(
+        self, generator=None, job_store=None, artifact_store=None, worker_id=None
+    ):
+        """Initialize with a generator and the stores shared with the app."""
+        self.generator = generator or DataGen()
+        if job_store is None or artifact_store is None:
+            default_jobs, default_artifacts = get_stores()
+            job_store = job_store or default_jobs
+            artifact_store = artifact_store or default_artifacts
+        self.job_store = job_store
+        self.artifact_store = artifact_store
+        self.worker_id = worker_id or WORKER_ID
+
+    def run_once(self):
+        """Reap stale jobs, then run the oldest queued job; return it, or None."""
+        self.job_store.reap_stale_jobs(JOB_LEASE_SECONDS)
+        job = self.job_store.claim_job(self.worker_id)
+        if job is None:
+            return None
+
+        job_id = job["job_id"]
+        stats = {}
+        token = CancellationToken()
+        try:
+            with (
+                log_context(job_id=job_id, worker=self.worker_id),
+                Heartbeat(self.job_store, job_id, self.worker_id, token.cancel),
+            ):
+                file_path = self.generator.generate_dataset(
+                    on_preview=lambda path: self.job_store.update_progress(
+                        job_id, "preview"
+                    ),
+                    stats=stats,
+                    cancel_token=token,
+                    job_id=job_id,
+                    **job["spec"],
+                )
+            if not isinstance(file_path, str) or not os.path.exists(file_path):
+                raise RuntimeError("File not created or path invalid.")
+            commit_artifacts(self.artifact_store, job_id, stats)
+            self.job_store.complete_job(
+                job_id, {"file_path": file_path, "manifest": stats.get("manifest")}
+            )
+        except Exception as e:
+            logger.error("Queued job %s failed: %s", job_id, e)
+            # A cancelled job was taken over: its files and record are the
+            # new worker's
+            if not token.cancelled:
+                self.artifact_store.delete(job_id)
+                self.job_store.fail_job(job_id, e)
+        return self.job_store.get_job(job_id)
+
+    def run_forever(self, stop=None):
+        """Run queued jobs until stop is set, polling while the queue is empty."""
+        stop = stop or threading.Event()
+        logger.info("👷 Worker %s waiting for queued jobs", self.worker_id)
+        while not stop.is_set():
+            try:
+                job = self.run_once()
+            except Exception as e:
+                # A store outage shouldn't end the worker
+                logger.error("Worker error: %s", e)
+                job = None
+            if job is None:
+                stop.wait(WORKER_POLL_SECONDS)
+
+
+def main(argv=None):
+    """Run queued jobs from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--once", action="store_true", help="run at most one job, then exit"
+    )
+    args = parser.parse_args(argv)
+
+    worker = QueueWorker()
+    if args.once:
+        job = worker.run_once()
+        return 1 if job is not None and job["status"] == FAILED else 0
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
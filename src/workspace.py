@@ -0,0 +1,92 @@
+"""Per-job workspace directories and their artifact manifests."""
+
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime
+from .validation import split_extension
+from .constants import logger
+
+MANIFEST_NAME = "manifest.json"
+SCRIPT_NAME = "script.py"
+
+
+def new_job_id():
+    """Return a short, collision-free identifier for a generation job."""
+    return uuid.uuid4().hex[:16]
+
+
+def is_valid_job_id(job_id):
+    """Check a job identifier from a request before using it in a path."""
+    return bool(re.fullmatch(r"[0-9a-f]{16}", job_id))
+
+
+def workspace_path(root, job_id):
+    """Return the workspace directory of a job."""
+    return os.path.join(root, job_id)
+
+
+def create_workspace(root, job_id):
+    """Create an empty workspace directory for a job and return its path."""
+    path = workspace_path(root, job_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def is_artifact(name):
+    """Check whether a workspace file is a dataset output."""
+    stem = split_extension(name)[0]
+    return name not in (MANIFEST_NAME, SCRIPT_NAME) and not stem.endswith("_preview")
+
+
+def write_manifest(workspace, job_id, **extra):
+    """Record every file the job's script created, and return the manifest."""
+    files = []
+    for name in sorted(os.listdir(workspace)):
+        path = os.path.join(workspace, name)
+        if os.path.isfile(path) and is_artifact(name):
+            files.append({"name": name, "size": os.path.getsize(path)})
+
+    manifest = {
+        "job_id": job_id,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+        **extra,
+    }
+    save_manifest(workspace, manifest)
+    return manifest
+
+
+def save_manifest(workspace, manifest):
+    """Write a job's manifest as it is."""
+    with open(os.path.join(workspace, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(workspace):
+    """Load a job's manifest, or None if the job never finished."""
+    try:
+        with open(os.path.join(workspace, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def artifact_paths(workspace):
+    """Return the full paths of every dataset file listed in the manifest."""
+    manifest = read_manifest(workspace) or {"files": []}
+    return [os.path.join(workspace, f["name"]) for f in manifest["files"]]
+
+
+def save_script(workspace, code_str):
+    """Keep the script that produced a job's artifacts next to them."""
+    with open(os.path.join(workspace, SCRIPT_NAME), "w", encoding="utf-8") as f:
+        f.write(code_str)
+
+
+def remove_workspace(workspace):
+    """Delete a job's workspace and everything in it."""
+    shutil.rmtree(workspace, ignore_errors=True)
+    logger.info("🧹 Removed workspace %s", workspace)
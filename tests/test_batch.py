@@ -0,0 +1,96 @@
+"""Tests for offline batch completions."""
+
+import pytest  # type: ignore
+from src.batch import LocalBatchServer, batch_request, parse_results, run_batches
+from src.cancellation import CancellationToken, JobCancelled
+
+
+def requests_for(*ids):
+    """Build one batch request per custom id."""
+    return [batch_request(i, "system", f"prompt {i}", max_tokens=100) for i in ids]
+
+
+def reply(body):
+    """Answer a request with its own prompt, failing on "bad"."""
+    prompt = body["messages"][1]["content"]
+    if prompt.endswith("bad"):
+        raise ValueError("model refused")
+    return f"reply to {prompt}"
+
+
+class TestBatch:
+    """Test cases for batch submission, polling and result parsing."""
+
+    def test_batch_request_carries_the_completion_cap(self):
+        """Test a request line targets chat completions with max_tokens."""
+        request = batch_request("job-1", "system", "prompt", max_tokens=123)
+
+        assert request["url"] == "/v1/chat/completions"
+        assert request["body"]["max_tokens"] == 123
+        assert request["body"]["messages"][1] == {"role": "user", "content": "prompt"}
+
+    def test_results_arrive_batch_by_batch(self):
+        """Test requests are split into batches and every result delivered."""
+        server = LocalBatchServer(reply, polls_until_done=2)
+        results = {}
+
+        run_batches(
+            server,
+            requests_for("a", "b", "c"),
+            results.__setitem__,
+            batch_size=2,
+            poll_seconds=0,
+        )
+
+        assert len(server.jobs) == 2
+        assert results["c"]["content"] == "reply to prompt c"
+        assert results["a"]["usage"]["batch"] is True
+        assert results["a"]["usage"]["completion_tokens"] > 0
+
+    def test_failed_requests_report_their_error(self):
+        """Test a request the model failed on comes back with its error."""
+        results = {}
+
+        run_batches(
+            LocalBatchServer(reply), requests_for("ok", "bad"), results.__setitem__
+        )
+
+        assert results["ok"]["error"] is None
+        assert results["bad"]["content"] is None
+        assert results["bad"]["error"] == "model refused"
+
+    def test_cancel_cancels_unfinished_batches(self):
+        """Test cancelling stops polling and cancels the batches."""
+        server = LocalBatchServer(reply, polls_until_done=100)
+        token = CancellationToken()
+        token.cancel()
+
+        with pytest.raises(JobCancelled):
+            run_batches(server, requests_for("a"), print, cancel_token=token)
+
+        assert [batch.status for batch in server.jobs.values()] == ["cancelled"]
+
+    def test_failed_submission_cancels_submitted_batches(self):
+        """Test batches submitted before a rejected one are cancelled."""
+        server = LocalBatchServer(reply, polls_until_done=100)
+        create = server.batches.create
+
+        def create_once(**kwargs):
+            if server.jobs:
+                raise RuntimeError("rate limited")
+            return create(**kwargs)
+
+        server.batches.create = create_once
+
+        with pytest.raises(RuntimeError, match="rate limited"):
+            run_batches(server, requests_for("a", "b"), print, batch_size=1)
+
+        assert [batch.status for batch in server.jobs.values()] == ["cancelled"]
+
+    def test_parse_results_skips_blank_lines(self):
+        """Test output files are parsed line by line."""
+        text = (
+            '{"custom_id": "x", "response": {"status_code": 500, "body": '
+            '{"error": {"message": "server error"}}}, "error": null}\n\n'
+        )
+        assert parse_results(text)["x"]["error"] == "server error"
@@ -0,0 +1,152 @@
+"""Tests for the content-addressed blob store."""
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from src.blobs import BlobStore, deliver, file_digest, unshare
+
+
+class TestBlobStore:
+    """Test cases for storing, sharing and evicting blobs."""
+
+    def setup_method(self):
+        """Create a store and a job directory in a temporary directory."""
+        self.root = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.root, "blobs"), max_bytes=1000)
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, job_id, content, name="data.csv"):
+        """Write a job file and return its path."""
+        os.makedirs(os.path.join(self.root, job_id), exist_ok=True)
+        path = os.path.join(self.root, job_id, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def refcount(self, digest):
+        """Return how many job files reference a blob."""
+        with self.store._connect() as db:
+            row = db.execute(
+                "SELECT refcount FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def test_identical_files_share_one_blob(self):
+        """Test the same content from two jobs is stored once."""
+        first = self.write("job1", "a\n1\n")
+        second = self.write("job2", "a\n1\n")
+
+        digest = self.store.add("job1", first)
+        assert self.store.add("job2", second) == digest
+
+        blob = self.store.blob_path(digest)
+        assert os.path.samefile(first, blob)
+        assert os.path.samefile(second, blob)
+        assert self.refcount(digest) == 2
+        assert self.store.total_bytes() == 4
+
+    def test_adding_twice_counts_one_reference(self):
+        """Test committing a job again doesn't inflate its references."""
+        path = self.write("job1", "a\n1\n")
+
+        digest = self.store.add("job1", path)
+        self.store.add("job1", path)
+
+        assert self.refcount(digest) == 1
+
+    def test_rewritten_file_moves_its_reference(self):
+        """Test a job file stored again after changing points at the new blob."""
+        path = self.write("job1", "a\n1\n")
+        old = self.store.add("job1", path)
+
+        unshare(path)
+        with open(path, "a") as f:
+            f.write("2\n")
+        new = self.store.add("job1", path)
+
+        assert new != old
+        assert self.refcount(old) == 0
+        assert self.refcount(new) == 1
+        with open(self.store.blob_path(old)) as f:
+            assert f.read() == "a\n1\n"
+
+    def test_release_drops_references(self):
+        """Test releasing a job makes its blobs unreferenced."""
+        digest = self.store.add("job1", self.write("job1", "a\n1\n"))
+
+        assert self.store.release("job1") == 1
+        assert self.refcount(digest) == 0
+        assert self.store.release("job1") == 0
+
+    def test_eviction_keeps_referenced_blobs(self):
+        """Test only unreferenced blobs are evicted, oldest first."""
+        self.store.max_bytes = 10**6
+        old = self.store.add("job1", self.write("job1", "x" * 400))
+        kept = self.store.add("job2", self.write("job2", "y" * 400))
+        self.store.release("job1")
+        self.store.release("job2")
+        self.store.add("job3", self.write("job3", "y" * 400))
+        live = self.store.add("job4", self.write("job4", "z" * 400))
+
+        self.store.max_bytes = 1000
+        assert self.store.evict() == 400
+
+        assert not os.path.exists(self.store.blob_path(old))
+        assert os.path.exists(self.store.blob_path(kept))
+        assert os.path.exists(self.store.blob_path(live))
+        # A job's own file survives its blob being evicted
+        assert os.path.exists(os.path.join(self.root, "job1", "data.csv"))
+
+    def test_blobs_are_read_only(self):
+        """Test stored blobs can't be modified through their permissions."""
+        digest = self.store.add("job1", self.write("job1", "a\n1\n"))
+
+        assert os.stat(self.store.blob_path(digest)).st_mode & 0o222 == 0
+
+
+class TestDeliver:
+    """Test cases for placing copies of stored files."""
+
+    def setup_method(self):
+        """Create a source file in a temporary directory."""
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "source.csv")
+        with open(self.source, "w") as f:
+            f.write("a\n1\n")
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_hard_link_first(self):
+        """Test a hard link is used where possible."""
+        destination = os.path.join(self.root, "copy.csv")
+
+        assert deliver(self.source, destination) == "link"
+        assert os.path.samefile(self.source, destination)
+
+    def test_falls_back_to_a_copy(self):
+        """Test files are copied when neither links nor reflinks work."""
+        destination = os.path.join(self.root, "copy.csv")
+        with (
+            patch("src.blobs.os.link", side_effect=OSError("cross-device")),
+            patch("src.blobs.reflink", side_effect=OSError("unsupported")),
+        ):
+            assert deliver(self.source, destination) == "copy"
+
+        assert not os.path.samefile(self.source, destination)
+        assert file_digest(destination) == file_digest(self.source)
+
+    def test_unshare_breaks_the_link(self):
+        """Test a shared file gets its own copy before being modified."""
+        destination = os.path.join(self.root, "copy.csv")
+        deliver(self.source, destination)
+
+        unshare(destination)
+
+        assert not os.path.samefile(self.source, destination)
+        assert file_digest(destination) == file_digest(self.source)
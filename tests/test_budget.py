@@ -0,0 +1,88 @@
+"""Tests for token counting and completion budgets."""
+
+from unittest.mock import patch
+from src.budget import (
+    TokenBudget,
+    count_prompt_tokens,
+    count_tokens,
+    get_encoding,
+)
+from src.constants import (
+    MAX_COMPLETION_TOKENS,
+    MAX_TOKENS,
+    MIN_COMPLETION_TOKENS,
+    TOKEN_HISTORY_MIN,
+)
+
+
+class TestCountTokens:
+    """Test cases for local token counting."""
+
+    @patch("src.budget.get_encoding", return_value=None)
+    def test_estimate_without_tokenizer(self, mock_encoding):
+        """Test the character estimate used without a tokenizer."""
+        assert count_tokens("") == 0
+        assert count_tokens("abcd") == 1
+        assert count_tokens("abcde") == 2
+
+    @patch("src.budget.OPENAI_MODEL", "not-a-model")
+    def test_unknown_model_has_no_tokenizer(self):
+        """Test only models tiktoken doesn't know fall back to the estimate."""
+        get_encoding.cache_clear()
+        try:
+            assert get_encoding() is None
+        finally:
+            get_encoding.cache_clear()
+
+    def test_prompt_tokens_add_both_messages(self):
+        """Test a request counts its system and user messages."""
+        system, prompt = "You write code. " * 20, "Make a dataset."
+        assert count_prompt_tokens(system, prompt) == (
+            count_tokens(system) + count_tokens(prompt)
+        )
+
+
+class TestTokenBudget:
+    """Test cases for per-kind completion caps."""
+
+    def setup_method(self):
+        """Set up a fresh budget."""
+        self.budget = TokenBudget()
+
+    def record_many(self, kind, size, count=TOKEN_HISTORY_MIN):
+        """Record the same completion size several times."""
+        for _ in range(count):
+            self.budget.record(kind, size)
+
+    def test_default_cap_until_enough_history(self):
+        """Test MAX_TOKENS applies before a kind has enough samples."""
+        self.record_many("Tabular", 100, TOKEN_HISTORY_MIN - 1)
+        assert self.budget.max_tokens("Tabular") == MAX_TOKENS
+
+    def test_cap_follows_largest_recent_completion(self):
+        """Test the cap is the largest recent completion plus headroom."""
+        self.record_many("Tabular", 1000)
+        self.budget.record("Tabular", 2000)
+        assert self.budget.max_tokens("Tabular") == 2600
+
+    def test_cap_is_clamped(self):
+        """Test tiny and huge histories stay within the configured bounds."""
+        self.record_many("Text", 10)
+        self.record_many("Logs", 100000)
+        assert self.budget.max_tokens("Text") == MIN_COMPLETION_TOKENS
+        assert self.budget.max_tokens("Logs") == MAX_COMPLETION_TOKENS
+
+    def test_truncated_completion_raises_the_cap(self):
+        """Test a cut-off completion counts as twice its cap."""
+        self.record_many("Tabular", 1000)
+        self.budget.record("Tabular", 1300, max_tokens=1300, truncated=True)
+        assert self.budget.max_tokens("Tabular") == 3380
+
+    def test_history_is_bounded(self):
+        """Test old completion sizes fall out of the history."""
+        budget = TokenBudget(history_size=TOKEN_HISTORY_MIN)
+        for _ in range(TOKEN_HISTORY_MIN):
+            budget.record("Tabular", 4000)
+        for _ in range(TOKEN_HISTORY_MIN):
+            budget.record("Tabular", 1000)
+        assert budget.max_tokens("Tabular") == 1300
@@ -0,0 +1,93 @@
+"""Tests for the similarity cache."""
+
+import time
+import numpy as np
+from src.cache import SimilarityCache, normalize_problem, vectorize
+
+
+def test_normalize_problem_drops_stop_words_and_plurals():
+    """Test normalization removes filler words and plural endings."""
+    assert normalize_problem("Customer Reviews for Sneakers") == [
+        "customer",
+        "review",
+        "sneaker",
+    ]
+
+
+def test_vectorize_is_unit_length():
+    """Test vectors are L2-normalized."""
+    vector = vectorize("stock prices with ticker")
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+
+
+def test_vectorize_empty_text():
+    """Test empty text yields a zero vector instead of NaNs."""
+    vector = vectorize("")
+    assert not vector.any()
+
+
+class TestSimilarityCache:
+    """Test cases for SimilarityCache class."""
+
+    def setup_method(self):
+        """Set up a cache with one entry."""
+        self.cache = SimilarityCache(threshold=0.85)
+        self.cache.add(
+            "customer reviews for sneakers",
+            "Tabular",
+            "csv",
+            100,
+            code="print('reviews')",
+        )
+
+    def test_reordered_problem_hits(self):
+        """Test a reworded business problem reuses the cached entry."""
+        score, entry = self.cache.lookup(
+            "sneaker customer reviews", "Tabular", "CSV", 100
+        )
+        assert entry is not None
+        assert entry["code"] == "print('reviews')"
+        assert score >= 0.85
+
+    def test_different_problem_misses(self):
+        """Test an unrelated business problem is not reused."""
+        _, entry = self.cache.lookup("job postings", "Tabular", "csv", 100)
+        assert entry is None
+
+    def test_mismatched_format_misses(self):
+        """Test entries are only reused for the same output format."""
+        _, entry = self.cache.lookup(
+            "customer reviews for sneakers", "Tabular", "Parquet", 100
+        )
+        assert entry is None
+
+    def test_mismatched_sample_count_misses(self):
+        """Test entries are only reused for the same number of samples."""
+        _, entry = self.cache.lookup(
+            "customer reviews for sneakers", "Tabular", "csv", 500
+        )
+        assert entry is None
+
+    def test_partition_grows_past_initial_capacity(self):
+        """Test the cache keeps all entries when the matrix grows."""
+        for i in range(40):
+            self.cache.add(f"problem number {i}", "Tabular", "csv", 100, code=str(i))
+
+        assert len(self.cache) == 41
+        _, entry = self.cache.lookup("problem number 39", "Tabular", "csv", 100)
+        assert entry["code"] == "39"
+
+    def test_lookup_is_fast_with_many_entries(self):
+        """Test lookups take under a millisecond with thirty thousand entries."""
+        for i in range(30_000):
+            self.cache.add(f"dataset {i} of items", "Tabular", "csv", 100, code="")
+
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(50):
+                self.cache.lookup("sneaker customer reviews", "Tabular", "csv", 100)
+            timings.append((time.perf_counter() - start) / 50)
+
+        # Best of five rounds, to ignore pauses from other processes
+        assert min(timings) < 0.001
@@ -0,0 +1,64 @@
+"""Tests for cooperative cancellation."""
+
+import pytest  # type: ignore
+from src.cancellation import CancellationToken, JobCancelled, raise_if_cancelled
+
+
+def test_cancel_runs_callbacks_once():
+    """Test registered callbacks run on the first cancel only."""
+    token = CancellationToken()
+    calls = []
+    token.register(lambda: calls.append(1))
+
+    token.cancel()
+    token.cancel()
+
+    assert token.cancelled
+    assert calls == [1]
+
+
+def test_register_after_cancel_runs_immediately():
+    """Test work started after cancellation is aborted right away."""
+    token = CancellationToken()
+    token.cancel()
+    calls = []
+
+    token.register(lambda: calls.append(1))
+
+    assert calls == [1]
+
+
+def test_unregistered_callback_is_not_run():
+    """Test finished work is not aborted by a later cancel."""
+    token = CancellationToken()
+    calls = []
+    unregister = token.register(lambda: calls.append(1))
+
+    unregister()
+    token.cancel()
+
+    assert calls == []
+
+
+def test_raise_if_cancelled():
+    """Test cancellation surfaces as JobCancelled, and no token never cancels."""
+    token = CancellationToken()
+    token.raise_if_cancelled()
+    raise_if_cancelled(None)
+
+    token.cancel()
+    with pytest.raises(JobCancelled):
+        raise_if_cancelled(token)
+
+
+def test_child_tokens():
+    """Test a child is cancelled with its parent but not the other way round."""
+    parent = CancellationToken()
+    first, second = parent.child(), parent.child()
+
+    first.cancel()
+    assert first.cancelled
+    assert not parent.cancelled
+
+    parent.cancel()
+    assert second.cancelled
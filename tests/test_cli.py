@@ -0,0 +1,196 @@
+"""Tests for the headless bulk generation CLI."""
+
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+import pytest  # type: ignore
+from src.cli import (
+    job_key,
+    llm_cost,
+    load_checkpoint,
+    load_manifest,
+    main,
+    run_manifest,
+    run_manifest_batch,
+)
+from src.batch import LocalBatchServer
+
+SPEC = {
+    "business_problem": "Customer reviews",
+    "dataset_type": "Tabular",
+    "output_format": "csv",
+    "num_samples": 10,
+}
+
+
+class TestCli:
+    """Test cases for manifest loading, checkpoints and runs."""
+
+    def setup_method(self):
+        """Create a temporary directory."""
+        self.root = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, name, text):
+        """Write a file in the temporary directory and return its path."""
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def fake_generator(self):
+        """Return a generator mock that writes one file per job."""
+
+        def generate_dataset(stats, cancel_token, **input_data):
+            path = os.path.join(self.root, f"{input_data['business_problem']}.csv")
+            with open(path, "w") as f:
+                f.write("a\n1\n")
+            stats["llm"] = [{"prompt_tokens": 1000, "completion_tokens": 500}]
+            stats["executions"] = [{"cpu_seconds": 0.5, "peak_rss_mb": 80}]
+            return path
+
+        generator = MagicMock()
+        generator.generate_dataset.side_effect = generate_dataset
+        return generator
+
+    def test_load_json_list(self):
+        """Test a JSON list of specs is loaded as is."""
+        path = self.write("jobs.json", json.dumps([SPEC]))
+        assert load_manifest(path) == [SPEC]
+
+    def test_load_yaml_with_defaults(self):
+        """Test YAML jobs inherit the manifest defaults."""
+        path = self.write(
+            "jobs.yaml",
+            "defaults:\n  dataset_type: Tabular\n  output_format: csv\n"
+            "jobs:\n  - business_problem: Reviews\n    num_samples: 10\n"
+            "  - business_problem: Orders\n    num_samples: 20\n"
+            "    output_format: parquet\n",
+        )
+
+        specs = load_manifest(path)
+
+        assert specs[0]["output_format"] == "csv"
+        assert specs[1]["output_format"] == "parquet"
+        assert specs[1]["dataset_type"] == "Tabular"
+
+    def test_missing_field_is_rejected(self):
+        """Test a spec without a required field fails before any job runs."""
+        path = self.write("jobs.json", json.dumps([{"business_problem": "x"}]))
+        with pytest.raises(ValueError, match="num_samples"):
+            load_manifest(path)
+
+    def test_job_key(self):
+        """Test keys are stable, and explicit ids win."""
+        assert job_key(SPEC) == job_key(dict(reversed(list(SPEC.items()))))
+        assert job_key({**SPEC, "id": "reviews"}) == "reviews"
+
+    def test_load_checkpoint_keeps_successes_only(self):
+        """Test failed and truncated records are retried."""
+        path = self.write(
+            "done.jsonl",
+            '{"key": "a", "status": "done"}\n{"key": "b", "status": "failed"}\n{"ke',
+        )
+        assert list(load_checkpoint(path)) == ["a"]
+
+    def test_llm_cost(self):
+        """Test token counts are summed and priced."""
+        prompt, completion, cost = llm_cost(
+            [{"prompt_tokens": 1_000_000, "completion_tokens": 0}] * 2
+        )
+        assert (prompt, completion) == (2_000_000, 0)
+        assert cost > 0
+
+    def test_run_resumes_from_checkpoint(self):
+        """Test a second run skips jobs that already succeeded."""
+        specs = [SPEC, {**SPEC, "business_problem": "Orders"}]
+        checkpoint = os.path.join(self.root, "done.jsonl")
+        generator = self.fake_generator()
+
+        report = run_manifest(specs, checkpoint, generator=generator)
+        assert report["done"] == 2
+        assert report["records"][0]["prompt_tokens"] == 1000
+        assert report["cost_usd"] > 0
+
+        report = run_manifest(specs, checkpoint, generator=generator)
+        assert report["done"] == 2
+        assert generator.generate_dataset.call_count == 2
+
+    def test_failed_job_is_reported(self):
+        """Test a failing job is recorded and retried on the next run."""
+        generator = MagicMock()
+        generator.generate_dataset.side_effect = Exception("boom")
+        checkpoint = os.path.join(self.root, "done.jsonl")
+
+        report = run_manifest([SPEC], checkpoint, generator=generator)
+
+        assert report["failed"] == 1
+        assert report["records"][0]["error"] == "boom"
+        assert load_checkpoint(checkpoint) == {}
+
+    def test_main_writes_report(self, monkeypatch):
+        """Test the CLI writes a report and exits non-zero on failures."""
+        manifest = self.write("jobs.json", json.dumps([SPEC]))
+        report_path = os.path.join(self.root, "report.json")
+        generator = MagicMock()
+        generator.generate_dataset.return_value = None
+        monkeypatch.setattr("src.cli.DataGen", lambda **kwargs: generator)
+
+        status = main([manifest, "--report", report_path, "--llm-concurrency", "1"])
+
+        assert status == 1
+        with open(report_path) as f:
+            assert json.load(f)["failed"] == 1
+        assert os.path.exists(os.path.join(self.root, "jobs.done.jsonl"))
+
+    def test_main_extends_a_job(self, monkeypatch):
+        """Test --extend grows an existing job instead of running a manifest."""
+        generator = MagicMock()
+        generator.extend_dataset.return_value = "out/job/data.csv"
+        monkeypatch.setattr("src.cli.DataGen", lambda **kwargs: generator)
+
+        status = main(["--extend", "0123456789abcdef", "--rows", "500"])
+
+        assert status == 0
+        generator.extend_dataset.assert_called_once_with("0123456789abcdef", 500)
+
+    def test_batch_costs_less(self):
+        """Test batch calls are priced at the batch discount."""
+        usage = {"prompt_tokens": 1_000_000, "completion_tokens": 0}
+        assert llm_cost([{**usage, "batch": True}])[2] == llm_cost([usage])[2] / 2
+
+    def test_run_manifest_batch(self):
+        """Test batched replies are run as each job's code."""
+        specs = [dict(SPEC, id="one"), dict(SPEC, id="two", business_problem="bad")]
+        generator = self.fake_generator()
+        generator.get_timestamp.return_value = "20250101_000000"
+        generator.job_prompt.side_effect = lambda job_id, **data: (
+            f"{data['business_problem']}",
+            "system",
+        )
+        generator.budget.max_tokens.return_value = 100
+
+        def respond(body):
+            prompt = body["messages"][1]["content"]
+            if prompt == "bad":
+                raise ValueError("refused")
+            return f"code for {prompt}"
+
+        checkpoint = os.path.join(self.root, "done.jsonl")
+        report = run_manifest_batch(
+            specs,
+            checkpoint,
+            client=LocalBatchServer(respond),
+            generator=generator,
+        )
+
+        assert (report["done"], report["failed"]) == (1, 1)
+        kwargs = generator.generate_dataset.call_args[1]
+        assert kwargs["code"] == "code for Customer reviews"
+        assert kwargs["timestamp"] == "20250101_000000"
+        assert list(load_checkpoint(checkpoint)) == ["one"]
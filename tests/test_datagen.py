@@ -4,8 +4,21 @@ import pytest  # type: ignore
 import os
 import tempfile
 import shutil
+import time
 from unittest.mock import patch
+import pandas as pd
+from src.constants import MAX_TOKENS, TOKEN_HISTORY_MIN
 from src.datagen import DataGen
+from src.workspace import read_manifest
+
+
+def is_running(pid):
+    """Check whether a process exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
 
 
 class TestDataGen:
@@ -69,12 +82,15 @@ class TestDataGen:
         mock_prompt.assert_called_once()
         assert mock_gpt.call_args[0][0] == "test prompt"
         assert "synthetic datasets" in mock_gpt.call_args[0][1]
-        mock_execute.assert_called_once_with("test code")
+        mock_execute.assert_called_once()
+        assert mock_execute.call_args[0][0] == "test code"
+        assert mock_execute.call_args[1]["num_samples"] == 10
+        assert mock_execute.call_args[1]["dry_run_samples"] == 20
         assert result == "test_file.csv"
 
-        # Check that file_path was added to input_data
+        # Check that the job's workspace was added to input_data
         called_args = mock_prompt.call_args[1]
-        assert called_args["file_path"] == self.temp_dir
+        assert os.path.dirname(called_args["file_path"]) == self.temp_dir
 
     @patch("src.datagen.logger")
     @patch("src.datagen.build_user_prompt")
@@ -122,7 +138,7 @@ class TestDataGen:
         # Verify that file_path was added
         called_with = mock_prompt.call_args[1]
         assert "file_path" in called_with
-        assert called_with["file_path"] == self.temp_dir
+        assert os.path.dirname(called_with["file_path"]) == self.temp_dir
 
         # Verify all original keys are still present
         for key in original_keys:
@@ -139,3 +155,560 @@ class TestDataGen:
             assert datagen2.output_dir != self.datagen.output_dir
         finally:
             shutil.rmtree(temp_dir2)
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    def test_similar_problem_reuses_cached_code(self, mock_gpt, mock_execute):
+        """Test a near-duplicate request skips the model and reuses code."""
+        output_file = os.path.join(self.temp_dir, "reviews_20250101_000000.csv")
+        open(output_file, "w").close()
+        mock_gpt.return_value = (
+            'os.path.join("' + self.temp_dir + '", "reviews_20250101_000000.csv")'
+        )
+        mock_execute.return_value = output_file
+
+        self.datagen.generate_dataset(
+            business_problem="customer reviews for sneakers",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            timestamp="20250101_000000",
+        )
+        self.datagen.generate_dataset(
+            business_problem="sneaker customer reviews",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            timestamp="20250202_000000",
+        )
+
+        # Model was only called once; cached code got the new timestamp
+        mock_gpt.assert_called_once()
+        assert "20250202_000000" in mock_execute.call_args[0][0]
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    def test_failed_code_is_not_cached(self, mock_gpt, mock_execute):
+        """Test code that didn't produce a file is never reused."""
+        mock_gpt.return_value = "test code"
+        mock_execute.return_value = ("Execution error:\nboom", None)
+
+        self.datagen.generate_dataset(
+            business_problem="customer reviews",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+        )
+
+        assert len(self.datagen.cache) == 0
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    def test_failed_script_is_repaired(self, mock_gpt, mock_execute):
+        """Test a failing script is patched and re-run instead of regenerated."""
+        mock_gpt.side_effect = [
+            "```python\nprint(undefined)\n```",
+            "<<<<<<< SEARCH\nprint(undefined)\n=======\nprint(1)\n>>>>>>> REPLACE",
+        ]
+        mock_execute.side_effect = [
+            ("Execution error:\nNameError: name 'undefined' is not defined", None),
+            "fixed.csv",
+        ]
+
+        result = self.datagen.generate_dataset(
+            business_problem="Test problem",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+        )
+
+        assert result == "fixed.csv"
+        assert mock_execute.call_args[0][0] == "```python\nprint(1)\n```"
+        # Follow-up carries the error and uses the repair system message
+        repair_prompt, repair_system = mock_gpt.call_args[0][:2]
+        assert "NameError" in repair_prompt
+        assert "SEARCH" in repair_system
+        assert self.datagen.repair_stats == {
+            "failures": 1,
+            "attempts": 1,
+            "repaired": 1,
+        }
+        assert self.datagen.repair_success_rate() == 1.0
+
+    @patch("src.datagen.MAX_REPAIR_ATTEMPTS", 2)
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    def test_repair_attempts_are_bounded(self, mock_gpt, mock_execute):
+        """Test the repair loop stops after the configured number of attempts."""
+        mock_gpt.return_value = "```python\nraise ValueError()\n```"
+        mock_execute.return_value = ("Execution error:\nValueError", None)
+
+        result = self.datagen.generate_dataset(
+            business_problem="Test problem",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+        )
+
+        assert result[1] is None
+        assert mock_gpt.call_count == 3  # initial generation + 2 repairs
+        assert mock_execute.call_count == 3
+        assert self.datagen.repair_success_rate() == 0.0
+
+    @patch("src.datagen.check_output")
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completions")
+    def test_candidates_first_valid_wins(self, mock_gpts, mock_execute, mock_check):
+        """Test several candidates run and the valid one is returned."""
+        datagen = DataGen(output_dir=self.temp_dir, num_candidates=3)
+        mock_gpts.return_value = ["a TS", "b TS", "c TS"]
+        # Each candidate was renamed with its own timestamp suffix
+        previews = []
+
+        def execute(code, on_preview=None, **kw):
+            on_preview(code.split()[-1] + "_preview.csv")
+            return code.split()[-1] + ".csv"
+
+        mock_execute.side_effect = execute
+        mock_check.side_effect = lambda path, fmt, n: path == "TS_c1.csv"
+
+        result = datagen.generate_dataset(
+            business_problem="Test problem",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            timestamp="TS",
+            on_preview=previews.append,
+        )
+
+        assert result == "TS_c1.csv"
+        # Only the winner's preview reaches the UI
+        assert previews == ["TS_c1_preview.csv"]
+        mock_gpts.assert_called_once()
+        assert mock_gpts.call_args[0][2] == 3
+
+    @patch("src.datagen.get_gpt_completions")
+    def test_losing_candidates_are_killed(self, mock_gpts):
+        """Test candidates still running when one wins are stopped at once."""
+        job_id = "0123456789abcdef"
+        workspace = os.path.join(self.temp_dir, job_id)
+        pid_dir = tempfile.mkdtemp(dir=self.temp_dir)
+        loser = (
+            "```python\nimport os, time\n"
+            f"open(os.path.join('{workspace}', 'data_TS.csv'), 'w').close()\n"
+            f"open(os.path.join({pid_dir!r}, str(os.getpid())), 'w').close()\n"
+            "time.sleep(60)\n```"
+        )
+        winner = (
+            "```python\nimport os, time\nimport pandas as pd\n"
+            f"while len(os.listdir({pid_dir!r})) < 2: time.sleep(0.01)\n"
+            "pd.DataFrame({'a': range(10)}).to_csv("
+            f"os.path.join('{workspace}', 'data_TS.csv'), index=False)\n```"
+        )
+        mock_gpts.return_value = [loser, winner, loser]
+        datagen = DataGen(
+            output_dir=self.temp_dir,
+            use_cache=False,
+            num_candidates=3,
+            dry_run_samples=0,
+        )
+
+        start = time.monotonic()
+        result = datagen.generate_dataset(
+            job_id=job_id,
+            business_problem="Test problem",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            timestamp="TS",
+        )
+
+        assert result.endswith("data_TS_c1.csv")
+        assert time.monotonic() - start < 30
+        # The losers' partial files are gone before the job is finalized
+        assert "data_TS_c0.csv" not in os.listdir(workspace)
+        assert "data_TS_c2.csv" not in os.listdir(workspace)
+        with open(os.path.join(workspace, "manifest.json")) as f:
+            assert "_c0" not in f.read()
+        pids = [int(name) for name in os.listdir(pid_dir)]
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(map(is_running, pids)):
+            time.sleep(0.05)
+        assert not any(map(is_running, pids))
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completions")
+    @patch("src.datagen.get_gpt_completion")
+    def test_candidates_all_failing_are_repaired(
+        self, mock_gpt, mock_gpts, mock_execute
+    ):
+        """Test that a failed race falls back to the repair loop."""
+        datagen = DataGen(output_dir=self.temp_dir, num_candidates=2)
+        mock_gpts.return_value = ["```python\nx TS\n```", "```python\ny TS\n```"]
+        mock_gpt.return_value = "```python\nprint(1)\n```"
+        mock_execute.side_effect = [
+            ("Execution error:\nboom", None),
+            ("Execution error:\nboom", None),
+            "fixed.csv",
+        ]
+
+        result = datagen.generate_dataset(
+            business_problem="Test problem",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            timestamp="TS",
+        )
+
+        assert result == "fixed.csv"
+        assert datagen.repair_stats["repaired"] == 1
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    def test_job_workspace_and_manifest(self, mock_gpt, mock_execute):
+        """Test a job writes into its own workspace with a manifest."""
+        workspace = os.path.join(self.temp_dir, "job123")
+
+        def run(code, **options):
+            # The script saves two entities into the workspace
+            for name in ("users.csv", "orders.csv"):
+                open(os.path.join(workspace, name), "w").close()
+            return os.path.join(workspace, "users.csv")
+
+        mock_gpt.return_value = "```python\nprint('two tables')\n```"
+        mock_execute.side_effect = run
+        stats = {}
+
+        result = self.datagen.generate_dataset(
+            business_problem="Users and orders",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            job_id="job123",
+            stats=stats,
+        )
+
+        assert result == os.path.join(workspace, "users.csv")
+        names = [f["name"] for f in stats["manifest"]["files"]]
+        assert names == ["orders.csv", "users.csv"]
+        # The main file is empty, which the validation report records
+        assert stats["validation"]["file"] == "users.csv"
+        assert not stats["validation"]["valid"]
+        assert stats["manifest"]["validation"] == stats["validation"]
+        with open(os.path.join(workspace, "script.py")) as f:
+            assert f.read() == "print('two tables')"
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    def test_profile_is_kept_in_manifest(self, mock_gpt, mock_execute):
+        """Test a profiled job keeps its script's report in the manifest."""
+        workspace = os.path.join(self.temp_dir, "job123")
+        profile = {"samples": 10, "hot_lines": [{"line": 3, "share": 0.9}]}
+
+        def run(code, on_profile, **options):
+            open(os.path.join(workspace, "data.csv"), "w").close()
+            on_profile(profile)
+            return os.path.join(workspace, "data.csv")
+
+        mock_gpt.return_value = "```python\nprint('profiled')\n```"
+        mock_execute.side_effect = run
+        stats = {}
+        datagen = DataGen(output_dir=self.temp_dir, use_cache=False, profile=True)
+
+        datagen.generate_dataset(
+            business_problem="Profiled",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+            job_id="job123",
+            stats=stats,
+        )
+
+        assert stats["profiles"] == [profile]
+        assert read_manifest(workspace)["profile"] == profile
+
+    @patch("src.datagen.get_gpt_completion")
+    @patch("src.datagen.build_user_prompt")
+    def test_concurrent_jobs_get_separate_workspaces(self, mock_prompt, mock_gpt):
+        """Test two jobs never share an output directory."""
+        mock_gpt.return_value = ""
+        input_data = {
+            "business_problem": "Test problem",
+            "dataset_type": "Tabular",
+            "output_format": "csv",
+            "num_samples": 10,
+            "timestamp": "20250101_000000",
+        }
+
+        self.datagen.generate_dataset(**input_data)
+        self.datagen.generate_dataset(**input_data)
+
+        first, second = (c[1]["file_path"] for c in mock_prompt.call_args_list)
+        assert first != second
+
+    def test_concurrency_limits_are_shared(self):
+        """Test model and script slots are capped across jobs."""
+        datagen = DataGen(
+            output_dir=self.temp_dir, llm_concurrency=1, exec_concurrency=2
+        )
+        assert datagen.llm_slots.acquire(blocking=False)
+        assert not datagen.llm_slots.acquire(blocking=False)
+        assert datagen.exec_slots.acquire(blocking=False)
+        assert datagen.exec_slots.acquire(blocking=False)
+        assert not datagen.exec_slots.acquire(blocking=False)
+
+    @patch("src.datagen.execute_code_in_virtualenv")
+    @patch("src.datagen.get_gpt_completion")
+    @patch("src.datagen.build_user_prompt")
+    def test_token_usage_is_recorded(self, mock_prompt, mock_gpt, mock_execute):
+        """Test the model's token usage lands in the job's stats."""
+
+        def complete(prompt, system, on_usage, **callbacks):
+            on_usage({"prompt_tokens": 900, "completion_tokens": 300})
+            return "code"
+
+        mock_prompt.return_value = "prompt"
+        mock_gpt.side_effect = complete
+        mock_execute.return_value = None
+        stats = {}
+
+        self.datagen.generate_dataset(
+            stats=stats,
+            business_problem="Test",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+        )
+
+        assert stats["llm"] == [{"prompt_tokens": 900, "completion_tokens": 300}]
+        # Model-only callbacks are not passed on to script runs
+        assert "on_llm_usage" not in mock_execute.call_args[1]
+
+    @patch("src.datagen.get_gpt_completion")
+    def test_completion_cap_learns_from_usage(self, mock_gpt):
+        """Test a kind's completion cap follows its past completion sizes."""
+
+        def complete(prompt, system, on_usage, **callbacks):
+            on_usage({"prompt_tokens": 900, "completion_tokens": 1000})
+            return "code"
+
+        mock_gpt.side_effect = complete
+        for _ in range(TOKEN_HISTORY_MIN):
+            self.datagen.complete("prompt", "system", {}, "Tabular")
+
+        caps = [c[1]["max_tokens"] for c in mock_gpt.call_args_list]
+        assert caps == [MAX_TOKENS] * TOKEN_HISTORY_MIN
+        assert self.datagen.budget.max_tokens("Tabular") == 1300
+        assert self.datagen.budget.max_tokens("Text") == MAX_TOKENS
+
+    @pytest.mark.parametrize("output_format", ["csv", "json", "parquet"])
+    @patch("src.datagen.get_gpt_completion")
+    @patch("src.datagen.build_user_prompt")
+    def test_extend_dataset(self, mock_prompt, mock_gpt, output_format):
+        """Test a finished job grows by the extra rows only."""
+        job_id = "0123456789abcdef"
+        workspace = os.path.join(self.temp_dir, job_id)
+        extension = {"csv": "csv", "json": "json", "parquet": "parquet"}
+        writer = {
+            "csv": "df.to_csv(path, index=False)",
+            "json": "df.to_json(path, orient='records', indent=2)",
+            "parquet": "df.to_parquet(path, index=False)",
+        }[output_format]
+        mock_prompt.return_value = "prompt"
+        mock_gpt.return_value = (
+            "```python\nimport os\nimport random\nimport pandas as pd\n"
+            "random.seed(42)\n"
+            "df = pd.DataFrame({'x': [random.random() for _ in range(30)]})\n"
+            f"path = os.path.join('{workspace}', "
+            f"'data.{extension[output_format]}')\n{writer}\n```"
+        )
+        datagen = DataGen(output_dir=self.temp_dir, use_cache=False, dry_run_samples=0)
+        file_path = datagen.generate_dataset(
+            job_id=job_id,
+            business_problem="Test",
+            dataset_type="Tabular",
+            output_format=output_format,
+            num_samples=30,
+        )
+
+        result = datagen.extend_dataset(job_id, 12)
+
+        assert result == file_path
+        read = {"csv": pd.read_csv, "json": pd.read_json}
+        if output_format == "parquet":
+            parts = sorted(os.path.join(workspace, f) for f in os.listdir(workspace))
+            parts = [p for p in parts if p.endswith(".parquet")]
+            df = pd.concat(pd.read_parquet(p) for p in parts)
+        else:
+            df = read[output_format](file_path)
+        assert len(df) == 42
+        # Shifted seeds draw new values instead of repeating the first rows
+        assert df["x"].nunique() == 42
+
+        manifest = read_manifest(workspace)
+        extension = manifest["extensions"][0]
+        assert (extension["rows"], extension["seed_offset"]) == (12, 1)
+        assert manifest["spec"]["num_samples"] == 30
+        # Only the new rows are validated; the totals are kept for next time
+        assert extension["validation"]["rows"] == 12
+        assert extension["validation"]["valid"]
+        assert manifest["validation"]["rows"] == 30
+        assert manifest["datasets"] == {
+            os.path.basename(file_path): {"rows": 42, "last_key": None}
+        }
+
+    def make_keyed_job(self, output_format, ids="range(1, n + 1)"):
+        """Generate a 100-row job with an id column and a 0-100 value."""
+        job_id = "0123456789abcdef"
+        workspace = os.path.join(self.temp_dir, job_id)
+        writer = {
+            "csv": "df.to_csv(path, index=False)",
+            "ndjson": "df.to_json(path, orient='records', lines=True)",
+            "json": "df.to_json(path, orient='records')",
+            "parquet": "df.to_parquet(path, index=False)",
+        }[output_format]
+        code = (
+            "```python\nimport os\nimport numpy as np\nimport pandas as pd\n"
+            "rng = np.random.default_rng(42)\nn = 100\n"
+            f"df = pd.DataFrame({{'id': {ids}, "
+            "'age': rng.integers(0, 100, n)})\n"
+            "df['pct'] = df['age'] / 100\n"
+            f"path = os.path.join('{workspace}', 'data.{output_format}')\n"
+            f"{writer}\n```"
+        )
+        datagen = DataGen(output_dir=self.temp_dir, use_cache=False, dry_run_samples=0)
+        with (
+            patch("src.datagen.get_gpt_completion", return_value=code),
+            patch("src.datagen.build_user_prompt", return_value="prompt"),
+        ):
+            file_path = datagen.generate_dataset(
+                job_id=job_id,
+                business_problem="Test",
+                dataset_type="Tabular",
+                output_format=output_format,
+                num_samples=100,
+            )
+        return datagen, job_id, file_path
+
+    @pytest.mark.parametrize("output_format", ["csv", "ndjson", "json", "parquet"])
+    def test_extend_dataset_continues_keys(self, output_format):
+        """Test extended rows keep value ranges and get new, unique keys."""
+        datagen, job_id, file_path = self.make_keyed_job(output_format)
+
+        datagen.extend_dataset(job_id, 40)
+        datagen.extend_dataset(job_id, 10)
+
+        if output_format == "parquet":
+            workspace = os.path.dirname(file_path)
+            parts = sorted(f for f in os.listdir(workspace) if "_part" in f)
+            df = pd.concat(
+                pd.read_parquet(p)
+                for p in [file_path] + [os.path.join(workspace, f) for f in parts]
+            )
+        elif output_format == "csv":
+            df = pd.read_csv(file_path)
+        else:
+            df = pd.read_json(file_path, lines=output_format == "ndjson")
+        assert sorted(df["id"]) == list(range(1, 151))
+        # Literals equal to the sample count are not rewritten
+        assert df["age"].between(0, 99).all()
+        assert df["age"].max() > 50
+        assert df["pct"].max() < 1
+
+    @pytest.mark.parametrize("output_format", ["csv", "parquet"])
+    def test_extend_dataset_rolls_back_duplicate_keys(self, output_format):
+        """Test an extension repeating existing keys leaves the files unchanged."""
+        datagen, job_id, file_path = self.make_keyed_job(
+            output_format, ids="range(500, 500 + n)"
+        )
+        workspace = os.path.dirname(file_path)
+        before = sorted(os.listdir(workspace))
+        with open(file_path, "rb") as f:
+            original = f.read()
+
+        with pytest.raises(ValueError, match="repeat 40 key"):
+            datagen.extend_dataset(job_id, 40)
+
+        with open(file_path, "rb") as f:
+            assert f.read() == original
+        assert sorted(os.listdir(workspace)) == before
+        assert "extensions" not in read_manifest(workspace)
+
+    def test_extend_dataset_reads_only_new_rows(self):
+        """Test extensions take the existing rows and keys from the manifest."""
+        datagen, job_id, file_path = self.make_keyed_job("csv")
+
+        with patch("src.datagen.scan_dataset") as mock_scan:
+            datagen.extend_dataset(job_id, 40)
+            datagen.extend_dataset(job_id, 10)
+
+        mock_scan.assert_not_called()
+        manifest = read_manifest(os.path.dirname(file_path))
+        assert manifest["datasets"]["data.csv"] == {"rows": 150, "last_key": 150}
+        assert sorted(pd.read_csv(file_path)["id"]) == list(range(1, 151))
+
+    @pytest.mark.parametrize("error", [OSError("disk full"), KeyboardInterrupt()])
+    def test_extend_dataset_rolls_back_interrupted_append(self, error):
+        """Test an append cut off halfway is undone, whatever stopped it."""
+        datagen, job_id, file_path = self.make_keyed_job("csv")
+        workspace = os.path.dirname(file_path)
+        before = sorted(os.listdir(workspace))
+        with open(file_path, "rb") as f:
+            original = f.read()
+
+        def append_half(target, shard, output_format):
+            with open(target, "a") as f:
+                f.write("101,5")
+            raise error
+
+        with (
+            patch("src.datagen.append_shard", side_effect=append_half),
+            pytest.raises(type(error)),
+        ):
+            datagen.extend_dataset(job_id, 40)
+
+        with open(file_path, "rb") as f:
+            assert f.read() == original
+        assert sorted(os.listdir(workspace)) == before
+        assert "extensions" not in read_manifest(workspace)
+
+    def test_extend_unknown_job(self):
+        """Test a job without a saved spec can't be extended."""
+        with pytest.raises(ValueError, match="no saved spec"):
+            self.datagen.extend_dataset("0123456789abcdef", 10)
+
+    @patch("src.datagen.get_gpt_completion")
+    def test_relational_dataset(self, mock_gpt):
+        """Test a relational job writes every table with matching keys."""
+        job_id = "0123456789abcdef"
+        mock_gpt.return_value = (
+            "```python\n"
+            "def customers_columns(n, rng):\n"
+            "    return {'age': rng.integers(18, 90, size=n)}\n\n"
+            "def orders_columns(n, rng):\n"
+            "    return {'amount': rng.uniform(5, 500, size=n)}\n```"
+        )
+        datagen = DataGen(output_dir=self.temp_dir, use_cache=False)
+        file_path = datagen.generate_dataset(
+            job_id=job_id,
+            business_problem="Shop customers and their orders",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=100,
+            entities=[
+                {"name": "customers"},
+                {"name": "orders", "parent": "customers", "per_parent": 3},
+            ],
+        )
+
+        assert os.path.basename(file_path).startswith("customers_")
+        prompt, system = mock_gpt.call_args[0][:2]
+        assert "orders: 300 rows, keys order_id, customer_id" in prompt
+        assert "<table>_columns(n, rng)" in system
+        manifest = read_manifest(os.path.join(self.temp_dir, job_id))
+        assert len(manifest["files"]) == 2
+        assert manifest["spec"]["entities"][1]["parent"] == "customers"
+        assert manifest["validation"]["valid"]
+        assert manifest["validation"]["foreign_keys"][0]["orphans"] == 0
+        with pytest.raises(ValueError, match="relational"):
+            datagen.extend_dataset(job_id, 10)
@@ -0,0 +1,130 @@
+"""Tests for the sub-interpreter execution engine."""
+
+import os
+import shutil
+import sys
+import tempfile
+import pytest  # type: ignore
+from unittest.mock import patch
+from src.engines import (
+    InterpreterHost,
+    SubinterpreterUnsupported,
+    benchmark,
+    can_run_in_subinterpreter,
+    interpreters,
+    needs_subprocess,
+    run_in_subinterpreter,
+)
+from src.resources import admission
+from src.utils import run_script
+
+needs_interpreters = pytest.mark.skipif(
+    interpreters is None or os.name != "posix", reason="no sub-interpreters"
+)
+
+
+class TestEngineSelection:
+    """Test cases for choosing between engines."""
+
+    def test_extension_imports_go_to_subprocesses(self):
+        """Test scripts importing numpy or pandas skip sub-interpreters."""
+        with patch("src.engines.subinterpreters_available", return_value=True):
+            assert not can_run_in_subinterpreter("import pandas as pd\n", "python")
+            assert not can_run_in_subinterpreter("from numpy import arange\n", "py")
+            assert can_run_in_subinterpreter("import csv, json\n", "python")
+
+    def test_needs_subprocess(self):
+        """Test which sub-interpreter failures call for a subprocess."""
+        assert needs_subprocess(
+            "ImportError: module _foo does not support loading in subinterpreters"
+        )
+        assert not needs_subprocess("NameError: name 'x' is not defined")
+
+    @patch("src.utils.EXECUTION_ENGINE", "subinterpreter")
+    @patch("src.utils.can_run_in_subinterpreter", return_value=True)
+    @patch("src.utils.run_in_subinterpreter")
+    def test_unsupported_script_falls_back(self, mock_run, mock_can_run):
+        """Test a script sub-interpreters can't run goes to a subprocess."""
+        mock_run.side_effect = SubinterpreterUnsupported("ImportError")
+        usages = []
+
+        assert run_script("print('ok')", sys.executable, usages.append) is None
+        assert "returncode" in usages[0]
+
+    @patch("src.engines.hosts.checkout", side_effect=OSError("no host"))
+    def test_failed_checkout_releases_admission(self, mock_checkout):
+        """Test a host that can't start doesn't keep its memory reservation."""
+        running = admission.running
+
+        with pytest.raises(OSError):
+            run_in_subinterpreter("pass", sys.executable)
+
+        assert admission.running == running
+
+    def test_benchmark_reports_both_engines(self):
+        """Test the benchmark measures the subprocess engine at least."""
+        results = benchmark(runs=1)
+
+        assert results["subprocess"]["runs"] == 1
+        assert results["subprocess"]["mean_ms"] > 0
+        assert "subinterpreter" in results
+
+
+@needs_interpreters
+class TestInterpreterHost:
+    """Test cases for scripts run in a host's sub-interpreters."""
+
+    def setup_method(self):
+        """Start a host and a scratch directory."""
+        self.host = InterpreterHost()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Stop the host and remove the scratch directory."""
+        self.host.kill()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_scripts_run_in_fresh_interpreters(self):
+        """Test each script runs isolated and can write files."""
+        path = os.path.join(self.temp_dir, "out.csv")
+        code = f"x = 1\nprint('noise')\nopen({path!r}, 'w').write('a\\n1\\n')\n"
+
+        assert self.host.run(code, 10)["error"] is None
+        assert self.host.run("x", 10)["error"] is not None  # x is gone
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "a\n1\n"
+
+    def test_errors_are_reported(self):
+        """Test a failing script's exception comes back as its error."""
+        reply = self.host.run("raise ValueError('bad value')", 10)
+        assert "bad value" in reply["error"]
+        assert self.host.alive
+
+    def test_timeout(self):
+        """Test a script that never ends times out."""
+        with pytest.raises(TimeoutError):
+            self.host.run("while True: pass", 0.2)
+
+    def test_runs_start_from_a_clean_process_state(self):
+        """Test a script's cwd, environment and open files don't leak."""
+        leak = (
+            "import os\n"
+            f"os.chdir({self.temp_dir!r})\n"
+            "os.environ['LEAKED'] = '1'\n"
+            f"fd = os.open({__file__!r}, os.O_RDONLY)\n"
+            f"open({os.path.join(self.temp_dir, 'fd')!r}, 'w').write(str(fd))\n"
+        )
+        check = (
+            "import os\n"
+            f"assert os.getcwd() != {self.temp_dir!r}\n"
+            "assert 'LEAKED' not in os.environ\n"
+            f"fd = int(open({os.path.join(self.temp_dir, 'fd')!r}).read())\n"
+            "try:\n"
+            "    path = os.readlink(f'/proc/self/fd/{fd}')\n"
+            "except OSError:\n"
+            "    path = None\n"
+            f"assert path != {__file__!r}\n"
+        )
+
+        assert self.host.run(leak, 10)["error"] is None
+        assert self.host.run(check, 10)["error"] is None
@@ -0,0 +1,136 @@
+"""Tests for appending shards to existing datasets."""
+
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pytest  # type: ignore
+from src.extend import append_shard, count_keys_up_to, scan_dataset
+from src.validation import count_rows
+
+
+class TestAppendShard:
+    """Test cases for each appendable format."""
+
+    def setup_method(self):
+        """Create a temporary directory with two small dataframes."""
+        self.root = tempfile.mkdtemp()
+        self.first = pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+        self.second = pd.DataFrame({"id": [3, 4, 5], "name": ["c", "d", "e"]})
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def path(self, name):
+        """Return a path in the temporary directory."""
+        return os.path.join(self.root, name)
+
+    def test_csv_append_skips_header(self):
+        """Test CSV rows are appended once, without a second header."""
+        target, shard = self.path("d.csv"), self.path("d_part1.csv")
+        self.first.to_csv(target, index=False)
+        self.second.to_csv(shard, index=False)
+        size = os.path.getsize(target)
+
+        assert append_shard(target, shard, "csv") is True
+
+        assert pd.read_csv(target)["id"].tolist() == [1, 2, 3, 4, 5]
+        # The original bytes are untouched
+        with open(target, "rb") as f:
+            assert f.read(size) == self.first.to_csv(index=False).encode()
+
+    def test_csv_column_mismatch(self):
+        """Test a shard with different columns is refused."""
+        target, shard = self.path("d.csv"), self.path("d_part1.csv")
+        self.first.to_csv(target, index=False)
+        self.second.rename(columns={"name": "label"}).to_csv(shard, index=False)
+
+        with pytest.raises(ValueError, match="Columns"):
+            append_shard(target, shard, "csv")
+
+    @pytest.mark.parametrize(
+        ("output_format", "codec"), [("csv.gz", "gzip"), ("csv.zst", "zstd")]
+    )
+    def test_compressed_csv_append(self, output_format, codec):
+        """Test compressed CSV shards are appended as a new stream."""
+        target = self.path(f"d.{output_format}")
+        shard = self.path(f"d_part1.{output_format}")
+        for df, path in ((self.first, target), (self.second, shard)):
+            with pa.CompressedOutputStream(path, codec) as out:
+                pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), out)
+
+        append_shard(target, shard, output_format)
+
+        assert pacsv.read_csv(target).column("id").to_pylist() == [1, 2, 3, 4, 5]
+
+    def test_ndjson_append(self):
+        """Test NDJSON records are appended line by line."""
+        target, shard = self.path("d.ndjson"), self.path("d_part1.ndjson")
+        self.first.to_json(target, orient="records", lines=True)
+        self.second.to_json(shard, orient="records", lines=True)
+
+        append_shard(target, shard, "ndjson")
+
+        assert count_rows(target, "ndjson") == 5
+
+    @pytest.mark.parametrize("first_rows", [2, 0])
+    def test_json_array_append(self, first_rows):
+        """Test records are spliced into the array, even an empty one."""
+        target, shard = self.path("d.json"), self.path("d_part1.json")
+        self.first.head(first_rows).to_json(target, orient="records", indent=2)
+        self.second.to_json(shard, orient="records")
+
+        append_shard(target, shard, "json")
+
+        with open(target) as f:
+            records = json.load(f)
+        assert [r["id"] for r in records] == [1, 2, 3, 4, 5][2 - first_rows :]
+
+    def test_parquet_shard_is_kept_as_part_file(self):
+        """Test Parquet shards stay as part files readable with the original."""
+        target, shard = self.path("d.parquet"), self.path("d_part1.parquet")
+        self.first.to_parquet(target, index=False)
+        self.second.to_parquet(shard, index=False)
+
+        assert append_shard(target, shard, "parquet") is False
+
+        table = pq.ParquetDataset([target, shard]).read()
+        assert table.num_rows == 5
+
+    def test_parquet_schema_mismatch(self):
+        """Test a part file with another schema is refused."""
+        target, shard = self.path("d.parquet"), self.path("d_part1.parquet")
+        self.first.to_parquet(target, index=False)
+        self.second.astype({"id": "float64"}).to_parquet(shard, index=False)
+
+        with pytest.raises(ValueError, match="Schema"):
+            append_shard(target, shard, "parquet")
+
+    def test_markdown_cannot_be_extended(self):
+        """Test free text formats are refused."""
+        with pytest.raises(ValueError, match="can't be extended"):
+            append_shard(self.path("d.md"), self.path("d_part1.md"), "Markdown")
+
+    def test_scan_dataset_counts_rows_and_last_key(self):
+        """Test files read in full give their total rows and largest key."""
+        self.first.to_parquet(self.path("d.parquet"), index=False)
+        self.second.to_parquet(self.path("d_part1.parquet"), index=False)
+        paths = [self.path("d.parquet"), self.path("d_part1.parquet")]
+
+        assert scan_dataset(paths, "parquet") == {"rows": 5, "last_key": 5}
+        assert count_keys_up_to(paths[1], "parquet", 3) == 1
+
+    def test_scan_dataset_without_integer_keys(self):
+        """Test text keys give no last key and are never counted as repeats."""
+        self.first.assign(id=["x", "y"]).to_csv(self.path("d.csv"), index=False)
+
+        assert scan_dataset([self.path("d.csv")], "csv") == {
+            "rows": 2,
+            "last_key": None,
+        }
+        assert count_keys_up_to(self.path("d.csv"), "csv", 10) == 0
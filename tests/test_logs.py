@@ -0,0 +1,105 @@
+"""Tests for the queued, structured logging setup."""
+
+import json
+import logging
+import logging.handlers
+from concurrent.futures import ThreadPoolExecutor
+from src.logs import (
+    ContextFilter,
+    DebugSampler,
+    JsonFormatter,
+    TextFormatter,
+    log_context,
+    run_in_context,
+    setup_logging,
+    update_log_context,
+)
+
+
+class ListHandler(logging.Handler):
+    """Collect records in a list."""
+
+    def __init__(self):
+        """Initialize with no records."""
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        """Keep the record."""
+        self.records.append(record)
+
+
+class TestLogs:
+    """Test cases for log context, sampling and formatting."""
+
+    def setup_method(self):
+        """Set up an isolated logger that records what it handles."""
+        self.handler = ListHandler()
+        self.handler.addFilter(ContextFilter())
+        self.logger = logging.getLogger("tests.logs")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+
+    def teardown_method(self):
+        """Detach the recording handler."""
+        self.logger.removeHandler(self.handler)
+
+    def test_context_fields_are_attached_and_reset(self):
+        """Test records inside a log_context carry its fields."""
+        with log_context(job_id="abc"):
+            update_log_context(stage="llm")
+            self.logger.info("inside")
+        self.logger.info("outside")
+
+        inside, outside = self.handler.records
+        assert (inside.job_id, inside.stage) == ("abc", "llm")
+        assert not hasattr(outside, "job_id")
+        assert not hasattr(outside, "stage")
+
+    def test_run_in_context_carries_fields_to_threads(self):
+        """Test a worker thread logs with the submitting job's fields."""
+        with log_context(job_id="abc"):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(run_in_context(self.logger.info), "worker").result()
+
+        assert self.handler.records[0].job_id == "abc"
+
+    def test_debug_records_are_sampled(self):
+        """Test only every nth DEBUG record of a message gets through."""
+        self.handler.addFilter(DebugSampler(10))
+        for _ in range(25):
+            self.logger.debug("tick %d", 1)
+        self.logger.info("kept")
+
+        assert len(self.handler.records) == 4
+
+    def test_json_formatter_emits_structured_lines(self):
+        """Test a record becomes one JSON object with its job fields."""
+        with log_context(job_id="abc", stage="rows"):
+            self.logger.warning("wrote %d rows", 5)
+
+        entry = json.loads(JsonFormatter().format(self.handler.records[0]))
+        assert entry["message"] == "wrote 5 rows"
+        assert entry["level"] == "WARNING"
+        assert (entry["job_id"], entry["stage"]) == ("abc", "rows")
+
+    def test_text_formatter_prefixes_job_fields(self):
+        """Test plain lines start with the job ID and stage."""
+        with log_context(job_id="abc", stage="llm"):
+            self.logger.info("hello")
+
+        line = TextFormatter("%(message)s").format(self.handler.records[0])
+        assert line == "[abc/llm] hello"
+
+    def test_setup_logging_installs_one_queue_handler(self):
+        """Test the root logger writes through a single queue handler."""
+        setup_logging()
+        setup_logging()
+
+        queued = [
+            h
+            for h in logging.getLogger().handlers
+            if isinstance(h, logging.handlers.QueueHandler)
+        ]
+        assert len(queued) == 1
@@ -2,7 +2,16 @@
 
 import pytest  # type: ignore
 from unittest.mock import patch, MagicMock
-from src.models import get_gpt_completion
+from src.cancellation import CancellationToken, JobCancelled
+from src.models import get_gpt_completion, get_gpt_completions
+
+
+def make_chunk(content, index=0):
+    """Build a streamed chunk carrying one content delta."""
+    chunk = MagicMock()
+    chunk.choices = [MagicMock(index=index)]
+    chunk.choices[0].delta.content = content
+    return chunk
 
 
 class TestModels:
@@ -102,3 +111,106 @@ class TestModels:
         assert messages[0]["content"] == system_msg
         assert messages[1]["role"] == "user"
         assert messages[1]["content"] == prompt
+
+    @patch("src.models.openai")
+    def test_get_gpt_completions_returns_all_choices(self, mock_openai):
+        """Test multiple candidates are requested with n and all returned."""
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock(), MagicMock(), MagicMock()]
+        for i, choice in enumerate(mock_response.choices):
+            choice.message.content = f"candidate {i}"
+        mock_openai.chat.completions.create.return_value = mock_response
+
+        result = get_gpt_completions("prompt", "system", 3)
+
+        assert result == ["candidate 0", "candidate 1", "candidate 2"]
+        called_args = mock_openai.chat.completions.create.call_args[1]
+        assert called_args["n"] == 3
+
+    @patch("src.models.openai")
+    def test_get_gpt_completion_streams_with_token(self, mock_openai):
+        """Test a cancellable call streams the reply and joins the deltas."""
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([make_chunk("Hello"), make_chunk(" you")])
+        mock_openai.chat.completions.create.return_value = stream
+
+        result = get_gpt_completion("prompt", "system", CancellationToken())
+
+        assert result == "Hello you"
+        assert mock_openai.chat.completions.create.call_args[1]["stream"] is True
+        stream.close.assert_called()
+
+    @patch("src.models.openai")
+    def test_get_gpt_completion_cancel_closes_stream(self, mock_openai):
+        """Test cancelling mid-stream closes the HTTP stream and raises."""
+        token = CancellationToken()
+
+        def chunks():
+            yield make_chunk("Hello")
+            token.cancel()
+            yield make_chunk(" you")
+
+        stream = MagicMock()
+        stream.__iter__.return_value = chunks()
+        mock_openai.chat.completions.create.return_value = stream
+
+        with pytest.raises(JobCancelled):
+            get_gpt_completion("prompt", "system", token)
+        stream.close.assert_called()
+
+    @patch("src.models.openai")
+    def test_get_gpt_completions_streams_every_choice(self, mock_openai):
+        """Test streamed candidates are reassembled by choice index."""
+        stream = MagicMock()
+        stream.__iter__.return_value = iter(
+            [make_chunk("a", 0), make_chunk("b", 1), make_chunk("c", 0)]
+        )
+        mock_openai.chat.completions.create.return_value = stream
+
+        result = get_gpt_completions("prompt", "system", 2, CancellationToken())
+
+        assert result == ["ac", "b"]
+
+    @patch("src.models.openai")
+    def test_cancelled_token_skips_the_call(self, mock_openai):
+        """Test no request is sent for a job that is already cancelled."""
+        token = CancellationToken()
+        token.cancel()
+
+        with pytest.raises(JobCancelled):
+            get_gpt_completion("prompt", "system", token)
+        mock_openai.chat.completions.create.assert_not_called()
+
+    @patch("src.models.openai")
+    def test_get_gpt_completion_reports_tokens(self, mock_openai):
+        """Test tokens received are reported while the reply streams."""
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([make_chunk("a"), make_chunk("b")])
+        mock_openai.chat.completions.create.return_value = stream
+        events = []
+
+        result = get_gpt_completion(
+            "prompt",
+            "system",
+            on_progress=lambda stage, **details: events.append((stage, details)),
+        )
+
+        assert result == "ab"
+        assert events == [("llm", {"tokens": 1}), ("llm", {"tokens": 2})]
+
+    @patch("src.models.openai")
+    def test_max_tokens_and_truncation_are_reported(self, mock_openai):
+        """Test the completion cap is sent and a cut-off reply is flagged."""
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock(finish_reason="length")]
+        mock_response.usage.prompt_tokens = 10
+        mock_response.usage.completion_tokens = 5
+        mock_openai.chat.completions.create.return_value = mock_response
+        usages = []
+
+        get_gpt_completion("prompt", "system", on_usage=usages.append, max_tokens=5)
+
+        assert mock_openai.chat.completions.create.call_args[1]["max_tokens"] == 5
+        assert usages == [
+            {"prompt_tokens": 10, "completion_tokens": 5, "truncated": True}
+        ]
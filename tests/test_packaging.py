@@ -0,0 +1,64 @@
+"""Tests for streaming ZIP packaging."""
+
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from src.packaging import StreamSink, compression_for, stream_zip
+
+
+def test_compression_for_formats():
+    """Test compressed formats are stored and text formats deflated."""
+    assert compression_for("data.parquet") == zipfile.ZIP_STORED
+    assert compression_for("data.CSV.GZ") == zipfile.ZIP_STORED
+    assert compression_for("data.csv") == zipfile.ZIP_DEFLATED
+    assert compression_for("data.json") == zipfile.ZIP_DEFLATED
+
+
+def test_stream_sink_is_not_seekable():
+    """Test the sink hands out buffered bytes and refuses to seek."""
+    sink = StreamSink()
+    sink.write(b"abc")
+
+    assert not sink.seekable()
+    assert sink.tell() == 3
+    assert sink.drain() == b"abc"
+    assert sink.drain() == b""
+
+
+class TestStreamZip:
+    """Test cases for stream_zip function."""
+
+    def setup_method(self):
+        """Create sample dataset files."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.csv = os.path.join(self.temp_dir, "users.csv")
+        self.parquet = os.path.join(self.temp_dir, "orders.parquet")
+        with open(self.csv, "w") as f:
+            f.write("id,name\n" * 5000)
+        with open(self.parquet, "wb") as f:
+            f.write(os.urandom(300_000))
+
+    def teardown_method(self):
+        """Remove sample files."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_archive_round_trip(self):
+        """Test the streamed archive contains every file intact."""
+        data = b"".join(stream_zip([self.csv, self.parquet]))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.testzip() is None
+            infos = {i.filename: i for i in archive.infolist()}
+            assert infos["users.csv"].compress_type == zipfile.ZIP_DEFLATED
+            assert infos["orders.parquet"].compress_type == zipfile.ZIP_STORED
+            with open(self.parquet, "rb") as f:
+                assert archive.read("orders.parquet") == f.read()
+
+    def test_archive_is_streamed_in_chunks(self):
+        """Test bytes are produced while files are still being written."""
+        chunks = [c for c in stream_zip([self.parquet], chunk_size=64 * 1024) if c]
+
+        assert len(chunks) > 3
+        assert max(len(c) for c in chunks) < 100_000
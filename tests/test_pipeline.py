@@ -1,7 +1,20 @@
 """Tests for pipeline functionality."""
 
-from unittest.mock import patch, MagicMock
-from src.pipeline import DatasetPipeline, safe_delete
+import os
+import shutil
+import tempfile
+import threading
+import pandas as pd
+from unittest.mock import ANY, patch, MagicMock
+from src.pipeline import (
+    DatasetPipeline,
+    archive_link,
+    load_preview,
+    preview_table,
+    safe_delete,
+)
+from src.scheduler import FairScheduler
+from src.store import DONE, FAILED, LocalArtifactStore, SQLiteJobStore
 
 
 class TestSafeDelete:
@@ -43,12 +56,64 @@ class TestSafeDelete:
         mock_remove.assert_called_once_with("protected_file.txt")
 
 
+def test_archive_link_only_for_multiple_files():
+    """Test the ZIP link is offered only when a job made several files."""
+    one = {"files": [{"name": "a.csv"}]}
+    two = {"files": [{"name": "a.csv"}, {"name": "b.csv"}]}
+
+    assert archive_link("abc", one) == ""
+    assert archive_link("abc", None) == ""
+    assert "(/download/abc.zip)" in archive_link("abc", two)
+    assert "all 2 files" in archive_link("abc", two)
+
+
+class TestLoadPreview:
+    """Test cases for load_preview and preview_table functions."""
+
+    def test_load_dry_run_preview_and_delete(self):
+        """Test a dry-run CSV is previewed and then removed."""
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        pd.DataFrame({"id": range(30)}).to_csv(path, index=False)
+
+        preview = load_preview(path, "csv", delete=True)
+
+        assert len(preview["rows"]) == 10
+        assert preview["num_rows"] == 30
+        assert not os.path.exists(path)
+
+    def test_load_preview_unreadable_file(self):
+        """Test a file that can't be previewed returns None and is kept."""
+        fd, path = tempfile.mkstemp(suffix=".xyz")
+        os.close(fd)
+
+        assert load_preview(path, "xyz") is None
+        assert os.path.exists(path)
+        os.remove(path)
+
+    def test_preview_table_labels_types(self):
+        """Test preview columns are labelled with their types."""
+        preview = {
+            "schema": [("id", "int64")],
+            "rows": pd.DataFrame({"id": [1]}),
+        }
+        assert list(preview_table(preview).columns) == ["id (int64)"]
+
+
 class TestDatasetPipeline:
     """Test cases for DatasetPipeline class."""
 
     def setup_method(self):
         """Set up test fixtures."""
-        self.pipeline = DatasetPipeline()
+        self.root = tempfile.mkdtemp()
+        self.job_store = SQLiteJobStore(os.path.join(self.root, "jobs.sqlite3"))
+        self.pipeline = DatasetPipeline(
+            job_store=self.job_store, artifact_store=LocalArtifactStore(self.root)
+        )
+
+    def teardown_method(self):
+        """Remove the temporary job store."""
+        shutil.rmtree(self.root, ignore_errors=True)
 
     def test_initialization(self):
         """Test pipeline initialization."""
@@ -162,6 +227,11 @@ class TestDatasetPipeline:
             "dataset_type": "Text",
             "output_format": "JSON",
             "num_samples": 100,
+            "job_id": ANY,
+            "on_preview": ANY,
+            "stats": ANY,
+            "cancel_token": ANY,
+            "on_progress": ANY,
         }
         mock_generator.generate_dataset.assert_called_once_with(**expected_params)
 
@@ -182,3 +252,263 @@ class TestDatasetPipeline:
         assert "❌ Error: File not created or path invalid" in error_result[2]
         assert error_result[0]["visible"] is False
         assert error_result[1]["visible"] is True
+
+    @patch("src.pipeline.load_preview")
+    @patch("src.pipeline.threading.Timer")
+    @patch("src.pipeline.os.path.exists")
+    def test_dry_run_preview_is_shown(self, mock_exists, mock_timer, mock_preview):
+        """Test the dry-run preview is yielded before the final result."""
+
+        def generate_dataset(on_preview, **input_data):
+            on_preview("preview.csv")
+            return "test_file.csv"
+
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = generate_dataset
+        self.pipeline.generator = mock_generator
+        mock_exists.return_value = True
+        mock_preview.return_value = {
+            "schema": [("id", "int64")],
+            "num_rows": 50,
+            "rows": pd.DataFrame({"id": [1, 2]}),
+        }
+
+        results = list(self.pipeline.generate("Test problem", "Tabular", "csv", 50))
+
+        assert "Preview ready" in results[1][2]
+        assert results[1][3]["visible"] is True
+        mock_preview.assert_any_call("preview.csv", "csv", delete=True)
+        # Final message confirms the row count from the real file
+        assert "✅ Dataset ready for download" in results[2][2]
+        assert "50 rows × 1 columns, as requested" in results[2][2]
+
+    @patch("src.pipeline.remove_workspace")
+    def test_failed_job_workspace_is_removed(self, mock_remove):
+        """Test a failed job's workspace is cleaned up right away."""
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = Exception("boom")
+        mock_generator.workspace_for.side_effect = lambda job_id: "out/" + job_id
+        self.pipeline.generator = mock_generator
+
+        list(self.pipeline.generate("Test problem", "Tabular", "csv", 10))
+
+        job_id = mock_generator.generate_dataset.call_args[1]["job_id"]
+        mock_remove.assert_called_once_with("out/" + job_id)
+
+    @patch("src.pipeline.threading.Timer")
+    @patch("src.pipeline.os.path.exists")
+    def test_successful_job_workspace_is_scheduled_for_cleanup(
+        self, mock_exists, mock_timer
+    ):
+        """Test the whole workspace is removed after the cleanup delay."""
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.return_value = "out/job/test_file.csv"
+        mock_generator.workspace_for.return_value = "out/job"
+        self.pipeline.generator = mock_generator
+        mock_exists.return_value = True
+
+        list(self.pipeline.generate("Test problem", "Tabular", "csv", 10))
+
+        assert mock_timer.call_args[1]["args"] == ["out/job"]
+
+    @patch("src.pipeline.threading.Timer")
+    @patch("src.pipeline.os.path.exists")
+    def test_validation_issues_are_shown(self, mock_exists, mock_timer):
+        """Test problems found in the finished file are shown with it."""
+
+        def generate_dataset(stats, **kwargs):
+            stats["validation"] = {"valid": False, "issues": ["8 rows instead of 10"]}
+            return "out/job/test_file.csv"
+
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = generate_dataset
+        self.pipeline.generator = mock_generator
+        mock_exists.return_value = True
+
+        results = list(self.pipeline.generate("Test problem", "Tabular", "csv", 10))
+
+        assert "✅ Dataset ready for download" in results[-1][2]
+        assert "⚠️ Validation found: 8 rows instead of 10" in results[-1][2]
+
+    @patch("src.pipeline.threading.Timer")
+    @patch("src.pipeline.os.path.exists")
+    def test_job_state_is_recorded(self, mock_exists, mock_timer):
+        """Test a finished job is visible to other workers through the store."""
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.return_value = "out/job/test_file.csv"
+        self.pipeline.generator = mock_generator
+        mock_exists.return_value = True
+
+        list(self.pipeline.generate("Test problem", "Tabular", "csv", 10))
+
+        job_id = mock_generator.generate_dataset.call_args[1]["job_id"]
+        job = self.job_store.get_job(job_id)
+        assert job["status"] == DONE
+        assert job["spec"]["business_problem"] == "Test problem"
+        assert job["result"]["file_path"] == "out/job/test_file.csv"
+
+    def test_failed_job_state_is_recorded(self):
+        """Test a failed job is marked as failed with its error."""
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = Exception("boom")
+        self.pipeline.generator = mock_generator
+
+        list(self.pipeline.generate("Test problem", "Tabular", "csv", 10))
+
+        job_id = mock_generator.generate_dataset.call_args[1]["job_id"]
+        job = self.job_store.get_job(job_id)
+        assert job["status"] == FAILED
+        assert job["error"] == "boom"
+
+    @patch("src.pipeline.os.path.exists")
+    def test_queued_job_is_run_by_a_worker(self, mock_exists):
+        """Test a worker claims a queued job and records its result."""
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.return_value = "out/job/test_file.csv"
+        self.pipeline.generator = mock_generator
+        mock_exists.return_value = True
+
+        job_id = self.pipeline.enqueue_job(
+            business_problem="Test problem",
+            dataset_type="Tabular",
+            output_format="csv",
+            num_samples=10,
+        )
+        job = self.pipeline.run_queued_job("worker-2")
+
+        assert job["job_id"] == job_id
+        assert job["status"] == DONE
+        assert job["worker_id"] == "worker-2"
+        assert mock_generator.generate_dataset.call_args[1]["job_id"] == job_id
+        # Nothing left to claim
+        assert self.pipeline.run_queued_job("worker-2") is None
+
+    def test_cancel_aborts_the_session_job(self):
+        """Test the cancel button cancels the token of the caller's session."""
+        request = MagicMock(session_hash="abc")
+        tokens = []
+
+        def generate_dataset(cancel_token, **input_data):
+            tokens.append(cancel_token)
+            self.pipeline.cancel(request)
+            cancel_token.raise_if_cancelled()
+
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = generate_dataset
+        mock_generator.workspace_for.side_effect = lambda job_id: "out/" + job_id
+        self.pipeline.generator = mock_generator
+
+        with patch("src.pipeline.remove_workspace") as mock_remove:
+            results = list(
+                self.pipeline.generate("Test problem", "Tabular", "csv", 10, request)
+            )
+
+        assert tokens[0].cancelled
+        assert "🛑 Generation cancelled." in results[-1][2]
+        assert results[-1][1]["visible"] is True
+        mock_remove.assert_called()
+        job_id = mock_generator.generate_dataset.call_args[1]["job_id"]
+        assert self.job_store.get_job(job_id)["status"] == FAILED
+        assert self.pipeline.active_tokens == {}
+
+    def test_warmed_catalog_spec_is_served_without_generating(self):
+        """Test a request matching a warmed spec returns its files at once."""
+        source = os.path.join(self.root, "warm", "data.csv")
+        os.makedirs(os.path.dirname(source))
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("a,b\n1,2\n")
+        warmer = MagicMock()
+        warmer.serve.side_effect = lambda entry, job_id: (
+            source,
+            {"files": [{"name": "data.csv"}]},
+        )
+        self.pipeline.warmer = warmer
+        self.pipeline.generator = MagicMock()
+
+        with patch("src.pipeline.threading.Timer"):
+            results = list(self.pipeline.generate("Job postings", "Tabular", "csv", 10))
+
+        assert "✅ Dataset ready for download." in results[-1][2]
+        assert results[-1][0]["value"] == source
+        self.pipeline.generator.generate_dataset.assert_not_called()
+
+    def test_jobs_are_charged_to_their_client(self):
+        """Test a job's usage counts against its client's quota."""
+        self.pipeline.scheduler = FairScheduler(token_quota=1000, weights={})
+        request = MagicMock(session_hash="abc", headers={}, client=None)
+
+        def generate_dataset(stats, **input_data):
+            stats["llm"] = [{"prompt_tokens": 900, "completion_tokens": 300}]
+            return None
+
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = generate_dataset
+        self.pipeline.generator = mock_generator
+
+        with patch("src.pipeline.remove_workspace"):
+            list(self.pipeline.generate("Test problem", "Tabular", "csv", 10, request))
+            results = list(
+                self.pipeline.generate("Test problem", "Tabular", "csv", 10, request)
+            )
+
+        assert mock_generator.generate_dataset.call_count == 1
+        assert "Token quota reached" in results[-1][2]
+
+    def test_closing_generator_cancels_job(self):
+        """Test a client that goes away cancels the job it started."""
+        tokens = []
+        stopped = threading.Event()
+
+        def generate_dataset(cancel_token, on_preview, **input_data):
+            tokens.append(cancel_token)
+            on_preview("preview.csv")
+            # Stands in for a running script that cancellation kills
+            cancel_token.register(stopped.set)
+            stopped.wait(5)
+            cancel_token.raise_if_cancelled()
+
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = generate_dataset
+        self.pipeline.generator = mock_generator
+
+        with patch("src.pipeline.load_preview") as mock_preview:
+            mock_preview.return_value = {
+                "schema": [("id", "int64")],
+                "num_rows": 10,
+                "rows": pd.DataFrame({"id": [1]}),
+            }
+            generator = self.pipeline.generate("Test problem", "Tabular", "csv", 10)
+            next(generator)
+            assert "Preview ready" in next(generator)[2]
+            generator.close()
+
+        assert tokens[0].cancelled
+        assert stopped.is_set()
+
+    @patch("src.pipeline.threading.Timer")
+    @patch("src.pipeline.os.path.exists")
+    def test_progress_is_streamed(self, mock_exists, mock_timer):
+        """Test each new stage is shown as a progress bar and recorded."""
+
+        def generate_dataset(on_progress, **input_data):
+            on_progress("llm", tokens=10)
+            on_progress("llm", tokens=20)
+            on_progress("rows", rows=5)
+            return "test_file.csv"
+
+        mock_generator = MagicMock()
+        mock_generator.generate_dataset.side_effect = generate_dataset
+        self.pipeline.generator = mock_generator
+        mock_exists.return_value = True
+
+        with patch.object(self.job_store, "update_progress") as mock_update:
+            results = list(self.pipeline.generate("Test problem", "Tabular", "csv", 10))
+
+        messages = [result[2] for result in results]
+        assert "Writing the script · 10 tokens received" in messages[1]
+        # Counts within a stage are throttled
+        assert not any("20 tokens" in message for message in messages)
+        assert "Writing rows · 5 / 10 rows" in messages[2]
+        assert "✅ Dataset ready for download" in messages[3]
+        stages = [c[0][1] for c in mock_update.call_args_list]
+        assert stages == ["llm", "rows"]
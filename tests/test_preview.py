@@ -0,0 +1,136 @@
+"""Tests for fast dataset previews."""
+
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+import pytest  # type: ignore
+from src.preview import count_lines, describe_row_count, read_head, read_preview
+
+
+class TestPreview:
+    """Test cases for preview readers."""
+
+    def setup_method(self):
+        """Create a temporary directory and a sample dataframe."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame({"id": range(100), "score": [0.5] * 100})
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        """Return a path inside the temporary directory."""
+        return os.path.join(self.temp_dir, name)
+
+    def test_count_lines(self):
+        """Test line counting with and without a trailing newline."""
+        with open(self.path("a.txt"), "w") as f:
+            f.write("a\nb\nc")
+        with open(self.path("b.txt"), "w") as f:
+            f.write("a\nb\n")
+        open(self.path("empty.txt"), "w").close()
+
+        assert count_lines(self.path("a.txt")) == 3
+        assert count_lines(self.path("b.txt")) == 2
+        assert count_lines(self.path("empty.txt")) == 0
+
+    def test_read_head_stops_at_complete_line(self):
+        """Test the head never ends in a partial line."""
+        with open(self.path("a.txt"), "w") as f:
+            f.write("line one\nline two\n")
+        assert read_head(self.path("a.txt"), max_bytes=12) == "line one\n"
+
+    def test_parquet_preview(self):
+        """Test Parquet schema, row count and first rows."""
+        self.df.to_parquet(self.path("d.parquet"), index=False)
+
+        preview = read_preview(self.path("d.parquet"), "Parquet", max_rows=5)
+
+        assert preview["num_rows"] == 100
+        assert preview["schema"] == [("id", "int64"), ("score", "double")]
+        assert len(preview["rows"]) == 5
+
+    def test_csv_preview_reads_only_the_head(self):
+        """Test a malformed line past the head doesn't affect the preview."""
+        self.df.to_csv(self.path("d.csv"), index=False)
+        with open(self.path("d.csv"), "a") as f:
+            f.write("x" * 200_000 + ',"unterminated\n')
+
+        preview = read_preview(self.path("d.csv"), "csv", max_rows=5)
+
+        assert preview["num_rows"] == 101
+        assert list(preview["rows"].columns) == ["id", "score"]
+        assert len(preview["rows"]) == 5
+
+    def test_ndjson_preview(self):
+        """Test newline-delimited JSON preview."""
+        self.df.to_json(self.path("d.ndjson"), orient="records", lines=True)
+
+        preview = read_preview(self.path("d.ndjson"), "NDJSON", max_rows=3)
+
+        assert preview["num_rows"] == 100
+        assert len(preview["rows"]) == 3
+
+    def test_json_preview(self):
+        """Test JSON array preview."""
+        with open(self.path("d.json"), "w") as f:
+            json.dump(self.df.to_dict(orient="records"), f, indent=2)
+
+        preview = read_preview(self.path("d.json"), "JSON", max_rows=3)
+
+        assert preview["num_rows"] == 100
+        assert len(preview["rows"]) == 3
+
+    def test_compressed_csv_preview(self):
+        """Test gzip CSV preview decompresses the head and counts all rows."""
+        self.df.to_csv(self.path("d.csv.gz"), index=False, compression="gzip")
+
+        preview = read_preview(self.path("d.csv.gz"), "csv.gz", max_rows=5)
+
+        assert preview["num_rows"] == 100
+        assert len(preview["rows"]) == 5
+
+    def test_feather_preview(self):
+        """Test Arrow IPC preview reads the schema and first batch."""
+        self.df.to_feather(self.path("d.feather"), compression="zstd")
+
+        preview = read_preview(self.path("d.feather"), "Feather", max_rows=5)
+
+        assert preview["num_rows"] == 100
+        assert preview["schema"] == [("id", "int64"), ("score", "double")]
+        assert len(preview["rows"]) == 5
+
+    def test_orc_preview(self):
+        """Test ORC preview reads the footer and first stripe."""
+        self.df.to_orc(self.path("d.orc"))
+
+        preview = read_preview(self.path("d.orc"), "ORC", max_rows=5)
+
+        assert preview["num_rows"] == 100
+        assert len(preview["rows"]) == 5
+
+    def test_markdown_preview(self):
+        """Test text previews have no rows."""
+        with open(self.path("d.md"), "w") as f:
+            f.write("# Title\nBody")
+
+        preview = read_preview(self.path("d.md"), "Markdown")
+
+        assert preview["num_rows"] is None
+        assert preview["text"] == "# Title\nBody"
+
+    def test_unknown_format(self):
+        """Test unknown formats are rejected."""
+        with pytest.raises(ValueError, match="No preview reader"):
+            read_preview(self.path("d.xyz"), "xyz")
+
+
+def test_describe_row_count():
+    """Test row count summaries flag mismatches."""
+    preview = {"num_rows": 1000, "schema": [("a", "int64")]}
+    assert "as requested" in describe_row_count(preview, 1000)
+    assert "expected 2,000" in describe_row_count(preview, 2000)
+    assert describe_row_count({"num_rows": None, "schema": []}, 10) == ""
@@ -0,0 +1,116 @@
+"""Tests for profiling generated scripts."""
+
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+from src.profiling import build_report, format_report, read_profile
+from src.utils import execute_code_in_virtualenv, run_script
+
+# A busy loop on line 3, a large allocation on line 5
+SCRIPT = (
+    "import time\n"
+    "end = time.monotonic() + 0.3\n"
+    "while time.monotonic() < end: pass\n"
+    "\n"
+    "blocks = [bytearray(1024) for _ in range(5000)]\n"
+)
+
+
+class TestProfiledRun:
+    """Test cases for scripts run under the profiler."""
+
+    def test_hot_line_and_allocations(self):
+        """Test the busy line and the allocating line are found."""
+        profiles = []
+
+        assert run_script(SCRIPT, sys.executable, on_profile=profiles.append) is None
+
+        report = profiles[0]
+        assert report["samples"] > 0
+        assert report["hot_lines"][0]["line"] == 3
+        assert report["hot_lines"][0]["share"] > 0.5
+        assert report["hot_lines"][0]["code"].startswith("while time.monotonic()")
+        assert report["allocations"][0]["line"] == 5
+        assert report["allocations"][0]["size_mb"] >= 4
+        assert report["peak_memory_mb"] >= 4
+
+    @patch("src.profiling.PROFILE_COLLAPSED_STACKS", True)
+    def test_collapsed_stacks(self):
+        """Test stacks are kept in collapsed flamegraph format when asked."""
+        profiles = []
+
+        run_script(SCRIPT, sys.executable, on_profile=profiles.append)
+
+        frames, count = profiles[0]["stacks"][0].rsplit(" ", 1)
+        assert frames.endswith("script:<module>:3")
+        assert int(count) > 0
+
+    def test_profiling_works_with_progress(self):
+        """Test rows are still reported from a profiled run."""
+        events, profiles = [], []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            code = (
+                "```python\nimport os\nimport pandas as pd\n"
+                "df = pd.DataFrame({'a': range(30)})\n"
+                f"df.to_csv(os.path.join('{temp_dir}', 'out.csv'), index=False)\n```"
+            )
+            result = execute_code_in_virtualenv(
+                code,
+                on_progress=lambda stage, **details: events.append((stage, details)),
+                on_profile=profiles.append,
+            )
+
+        assert result.endswith("out.csv")
+        assert events == [("rows", {"rows": 30})]
+        assert len(profiles) == 1
+
+    def test_failed_script_still_reports(self):
+        """Test a script that raises is profiled up to the error."""
+        profiles = []
+
+        error = run_script(
+            "x = 1\nraise ValueError('boom')\n",
+            sys.executable,
+            on_profile=profiles.append,
+        )
+
+        assert "ValueError: boom" in error[0]
+        assert len(profiles) == 1
+
+
+class TestReport:
+    """Test cases for turning raw samples into a report."""
+
+    def test_build_report(self):
+        """Test lines are ranked and shown with their code."""
+        raw = {
+            "interval_ms": 5,
+            "samples": 4,
+            "hot": {"2": 3, "1": 1},
+            "peak_bytes": 3 * 2**20,
+            "allocations": {"1": [2**20, 10]},
+            "stacks": {},
+        }
+
+        report = build_report(raw, "a = []\nfor i in range(9): a.append(i)\n")
+
+        assert report["sampled_seconds"] == 0.02
+        assert report["hot_lines"][0] == {
+            "line": 2,
+            "share": 0.75,
+            "code": "for i in range(9): a.append(i)",
+        }
+        assert report["allocations"] == [
+            {"line": 1, "size_mb": 1.0, "blocks": 10, "code": "a = []"}
+        ]
+        assert "stacks" not in report
+        assert "line 2 75%" in format_report(report)
+
+    def test_missing_output(self):
+        """Test a child killed before writing its profile gives no report."""
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        assert read_profile(path, "") is None
+        assert not os.path.exists(path)
@@ -0,0 +1,42 @@
+"""Tests for job progress reporting."""
+
+import os
+from src.progress import describe_details, render_progress, start_row_reader
+
+
+def test_render_progress_fills_bar_by_stage():
+    """Test later stages fill more of the bar and show their details."""
+    early = render_progress("llm", {"tokens": 1200}, 3.2)
+    late = render_progress("rows", {"rows": 500}, 12.0, num_samples=1000)
+
+    assert "Writing the script" in early
+    assert "1,200 tokens received" in early
+    assert early.endswith("3s")
+    assert "500 / 1,000 rows" in late
+    assert late.count("█") > early.count("█")
+
+
+def test_render_progress_unknown_stage():
+    """Test an unknown stage falls back to a plain message."""
+    assert render_progress("mystery", {}, 5).startswith("⏳ Generating dataset")
+
+
+def test_describe_details():
+    """Test each stage describes its own numbers."""
+    assert describe_details("queued", {"ahead": 2}) == "2 job(s) ahead"
+    assert describe_details("rows", {"rows": 42}) == "42 rows"
+    assert describe_details("finalized", {"files": 3}) == "3 file(s)"
+    assert describe_details("validated", {}) == ""
+
+
+def test_row_reader_forwards_reports():
+    """Test row counts written to the pipe become progress events."""
+    events = []
+    write_fd, reader = start_row_reader(
+        lambda stage, **details: events.append((stage, details))
+    )
+    with os.fdopen(write_fd, "w") as pipe:
+        pipe.write("rows 10\nrows 25\ngarbage\n")
+    reader.join(timeout=1)
+
+    assert events == [("rows", {"rows": 10}), ("rows", {"rows": 25})]
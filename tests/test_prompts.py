@@ -2,7 +2,14 @@
 
 import pytest  # type: ignore
 from unittest.mock import patch
-from src.prompts import build_user_prompt, system_message
+from src.prompts import (
+    build_repair_prompt,
+    build_system_message,
+    build_user_prompt,
+    repair_message,
+    system_message,
+)
+from src.utils import apply_patch
 
 
 def test_system_message_exists():
@@ -21,6 +28,29 @@ def test_system_message_contains_key_instructions():
     assert "Markdown" in system_message
 
 
+def test_system_message_covers_compact_formats():
+    """Test the system message explains how to save every output format."""
+    for label in ("NDJSON", "CSV.GZ", "CSV.ZST", "Feather", "ORC"):
+        assert label in system_message
+    assert 'compression="zstd"' in system_message
+    assert "row_group_size=100000" in system_message
+
+
+def test_build_system_message_keeps_only_requested_format():
+    """Test the trimmed system message carries one save recipe."""
+    result = build_system_message("Parquet")
+
+    assert "Parquet:" in result
+    assert "CSV:" not in result
+    assert "NDJSON" not in result
+    assert len(result) < len(system_message)
+
+
+def test_build_system_message_unknown_format_gets_every_recipe():
+    """Test an unknown format falls back to the full system message."""
+    assert build_system_message("xlsx") == system_message
+
+
 @patch("src.prompts.datetime")
 def test_build_user_prompt_basic(mock_datetime):
     """Test basic user prompt building functionality."""
@@ -127,3 +157,29 @@ def test_build_user_prompt_timestamp_format(mock_datetime):
     assert "Timestamp: 20250101_235959" in result
     # Verify strftime was called with correct format
     mock_datetime.now.return_value.strftime.assert_called_with("%Y%m%d_%H%M%S")
+
+
+def test_build_repair_prompt_contains_code_and_error():
+    """Test the repair prompt carries the failing script and its error."""
+    result = build_repair_prompt("print(x)", "NameError: name 'x' is not defined")
+
+    assert "```python\nprint(x)\n```" in result
+    assert "NameError" in result
+
+
+def test_repair_message_describes_edit_blocks():
+    """Test the repair system message explains the edit block format."""
+    assert "<<<<<<< SEARCH" in repair_message
+    assert ">>>>>>> REPLACE" in repair_message
+
+
+def test_repair_message_example_applies():
+    """Test a reply copying the prompt's example edit block patches the script."""
+    start = repair_message.index("<<<<<<< SEARCH")
+    end = repair_message.index(">>>>>>> REPLACE") + len(">>>>>>> REPLACE")
+    example = repair_message[start:end]
+    code = "rows = []\ndf = pd.DataFrame(rows)\n"
+
+    patched = apply_patch(code, f"```diff\n{example}\n```")
+
+    assert patched == "rows = []\ndf = pd.DataFrame(rows, columns=columns)\n"
@@ -0,0 +1,206 @@
+"""Tests for relational multi-table datasets."""
+
+import ast
+import os
+import shutil
+import sys
+import tempfile
+import pandas as pd
+import pytest  # type: ignore
+from src.relational import build_script, check_integrity, parse_entities
+from src.utils import (
+    execute_code_in_virtualenv,
+    extract_code,
+    extract_file_paths,
+    make_dry_run_code,
+    run_script,
+)
+
+ENTITIES = [
+    {"name": "customers"},
+    {"name": "orders", "parent": "customers", "per_parent": 4, "fanout": "zipf"},
+    {"name": "products", "rows": 50},
+    {
+        "name": "order_items",
+        "parent": "orders",
+        "per_parent": 2,
+        "min_children": 1,
+        "references": ["products"],
+    },
+]
+
+COLUMNS = """
+import numpy as np
+
+def customers_columns(n, rng):
+    return {"segment": rng.choice(["retail", "business"], size=n)}
+
+def orders_columns(n, rng):
+    return {"amount": rng.gamma(2.0, 30.0, size=n).round(2)}
+
+def products_columns(n, rng):
+    return {"price": rng.uniform(1, 100, size=n).round(2)}
+
+def order_items_columns(n, rng):
+    return {"quantity": rng.integers(1, 5, size=n)}
+"""
+
+
+class TestParseEntities:
+    """Test cases for checking and ordering entity specs."""
+
+    def test_order_keys_and_rows(self):
+        """Test parents come first and rows follow the cardinalities."""
+        entities = parse_entities(ENTITIES[:1] + list(reversed(ENTITIES[1:])), 100)
+
+        assert [e["name"] for e in entities] == [
+            "customers",
+            "orders",
+            "products",
+            "order_items",
+        ]
+        items = entities[-1]
+        assert items["key"] == "order_item_id"
+        assert items["rows"] == 800
+        assert [fk["column"] for fk in items["foreign_keys"]] == [
+            "order_id",
+            "product_id",
+        ]
+
+    @pytest.mark.parametrize(
+        "entities, message",
+        [
+            ([{"name": "a"}, {"name": "b", "parent": "c"}], "unknown entity c"),
+            ([{"name": "a"}, {"name": "a"}], "defined twice"),
+            ([{"name": "Bad name"}], "Invalid entity name"),
+            ([{"name": "customers", "key": 'cust"id'}], "Invalid key column"),
+            (
+                [
+                    {"name": "a"},
+                    {"name": "b", "parent": "c"},
+                    {"name": "c", "parent": "b"},
+                ],
+                "depends on itself",
+            ),
+            ([{"name": "a"}, {"name": "b", "parent": "a", "fanout": "x"}], "fanout"),
+            (
+                [{"name": "a"}, {"name": "b", "parent": "a", "min_children": 2}],
+                "too few rows",
+            ),
+        ],
+    )
+    def test_invalid_specs(self, entities, message):
+        """Test invalid specs are rejected with a clear message."""
+        with pytest.raises(ValueError, match=message):
+            parse_entities(entities, 10)
+
+    def test_script_parses_with_any_directory(self):
+        """Test quotes and backslashes in the output directory stay in strings."""
+        entities = parse_entities(ENTITIES, 10)
+        directory = 'out/a"b\\c'
+
+        script = extract_code(build_script(entities, COLUMNS, directory, "TS", "csv"))
+
+        ast.parse(script)
+        assert extract_file_paths(script)[0] == os.path.join(
+            directory, "customers_TS.csv"
+        )
+
+    def test_text_formats_are_rejected(self):
+        """Test relational datasets need a tabular format."""
+        with pytest.raises(ValueError, match="markdown"):
+            parse_entities(ENTITIES, 10, "markdown")
+
+
+class TestRelationalScript:
+    """Test cases for the generated multi-table script."""
+
+    def setup_method(self):
+        """Create a temporary output directory."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def run(self, num_samples, output_format="parquet", **options):
+        """Build and run the script, returning its main file and entities."""
+        entities = parse_entities(ENTITIES, num_samples, output_format)
+        code = build_script(
+            entities, COLUMNS, self.temp_dir, "20250101_000000", output_format
+        )
+        result = execute_code_in_virtualenv(
+            code, num_samples=num_samples, output_format=output_format, **options
+        )
+        return result, entities
+
+    def table(self, name, fmt="parquet"):
+        """Read one generated table."""
+        path = os.path.join(self.temp_dir, f"{name}_20250101_000000.{fmt}")
+        return pd.read_parquet(path) if fmt == "parquet" else pd.read_csv(path)
+
+    def test_keys_match_at_scale(self):
+        """Test every foreign key has a parent with 100k parent rows."""
+        result, entities = self.run(100_000)
+
+        assert result.endswith("customers_20250101_000000.parquet")
+        orders, items = self.table("orders"), self.table("order_items")
+        assert len(orders) == 400_000
+        assert len(items) == 800_000
+        assert list(items.columns[:3]) == ["order_item_id", "order_id", "product_id"]
+        paths = [
+            os.path.join(self.temp_dir, f"{e['name']}_20250101_000000.parquet")
+            for e in entities
+        ]
+        assert all(
+            fk["orphans"] == 0 for fk in check_integrity(paths, entities, "parquet")
+        )
+        # min_children: every order has at least one item
+        assert items["order_id"].nunique() == len(orders)
+
+    def test_zipf_fanout_is_skewed(self):
+        """Test zipf fan-out piles children onto a few parents."""
+        self.run(2000)
+
+        counts = self.table("orders")["customer_id"].value_counts()
+        # The busiest customer has far more than the 4 orders of a uniform draw
+        assert counts.iloc[0] > 40
+        uniform = self.table("order_items")["product_id"].value_counts()
+        assert uniform.iloc[0] < 3 * len(self.table("order_items")) / 50
+
+    def test_dry_run_shrinks_every_table(self):
+        """Test the preview run scales all tables from the one row literal."""
+        entities = parse_entities(ENTITIES, 1000, "csv")
+        code = build_script(entities, COLUMNS, self.temp_dir, "20250101_000000", "csv")
+
+        dry_run = make_dry_run_code(extract_code(code), 1000, 5)
+        assert run_script(dry_run, sys.executable) is None
+
+        rows = {
+            name: len(pd.read_csv(os.path.join(self.temp_dir, name)))
+            for name in os.listdir(self.temp_dir)
+        }
+        assert rows == {
+            "customers_20250101_000000_preview.csv": 5,
+            "orders_20250101_000000_preview.csv": 20,
+            "products_20250101_000000_preview.csv": 1,
+            "order_items_20250101_000000_preview.csv": 40,
+        }
+
+    def test_orphans_are_counted(self):
+        """Test a child key without a parent is reported."""
+        entities = parse_entities(ENTITIES[:2], 3, "csv")
+        paths = [os.path.join(self.temp_dir, n) for n in ("c.csv", "o.csv")]
+        pd.DataFrame({"customer_id": [1, 2, 3]}).to_csv(paths[0], index=False)
+        pd.DataFrame({"order_id": [1, 2], "customer_id": [3, 9]}).to_csv(
+            paths[1], index=False
+        )
+
+        assert check_integrity(paths, entities, "csv") == [
+            {
+                "table": "orders",
+                "column": "customer_id",
+                "references": "customers",
+                "orphans": 1,
+            }
+        ]
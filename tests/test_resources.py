@@ -0,0 +1,139 @@
+"""Tests for resource limits and admission control."""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest  # type: ignore
+from src.cancellation import CancellationToken, JobCancelled
+from src.constants import EXECUTION_CPU_SECONDS
+from src.resources import (
+    LIMITS_BOOTSTRAP,
+    AccountedPopen,
+    AdmissionController,
+    limits_env,
+)
+
+
+def test_accounted_popen_records_rusage():
+    """Test the child's rusage is kept after it is reaped."""
+    process = AccountedPopen([sys.executable, "-c", "pass"])
+    process.wait()
+
+    assert process.returncode == 0
+    assert process.rusage is not None
+    assert process.rusage.ru_maxrss > 0
+
+
+def test_accounted_popen_timeout_keeps_child():
+    """Test a wait that times out leaves the child to be reaped later."""
+    process = AccountedPopen([sys.executable, "-c", "import time; time.sleep(0.5)"])
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        process.wait(timeout=0.05)
+    assert process.returncode is None
+    assert process.wait() == 0
+    assert process.rusage is not None
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="rlimits are tested on Linux")
+def test_memory_limit_stops_huge_allocation(monkeypatch):
+    """Test the address space limit is in place before the script starts."""
+    monkeypatch.setattr("src.resources.EXECUTION_MEMORY_MB", 512)
+    process = AccountedPopen(
+        [sys.executable, "-c", LIMITS_BOOTSTRAP + "x = bytearray(2**30)"],
+        stderr=-1,
+        env={**os.environ, **limits_env()},
+    )
+    _, stderr = process.communicate()
+
+    assert process.returncode != 0
+    assert b"MemoryError" in stderr
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="rlimits are tested on Linux")
+def test_limits_are_set_by_the_child():
+    """Test the child applies the CPU limit and hides its settings."""
+    code = (
+        "import os, resource\n"
+        "print(resource.getrlimit(resource.RLIMIT_CPU)[0])\n"
+        "print('DATAGEN_LIMITS' in os.environ)"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", LIMITS_BOOTSTRAP + code],
+        env={**os.environ, **limits_env()},
+        text=True,
+    )
+
+    assert output.split() == [str(EXECUTION_CPU_SECONDS), "False"]
+
+
+class TestAdmissionController:
+    """Test cases for AdmissionController class."""
+
+    def test_admits_within_budget(self):
+        """Test runs are admitted while the budget allows."""
+        controller = AdmissionController(budget_mb=1000, estimate_mb=400)
+
+        first = controller.acquire()
+        second = controller.acquire()
+
+        assert controller.reserved_mb == first + second == 800
+        assert controller.running == 2
+
+    def test_always_admits_first_run(self):
+        """Test a run larger than the budget still runs alone."""
+        controller = AdmissionController(budget_mb=100, estimate_mb=400)
+        assert controller.acquire() == 400
+
+    def test_holds_back_over_budget(self):
+        """Test a run waits until a running job releases its memory."""
+        controller = AdmissionController(budget_mb=1000, estimate_mb=600)
+        reservation = controller.acquire()
+
+        with pytest.raises(TimeoutError):
+            controller.acquire(timeout=0.05)
+
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(controller.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        assert not admitted
+
+        controller.release(reservation)
+        waiter.join(timeout=1)
+        assert admitted == [600]
+
+    def test_cancel_stops_waiting(self):
+        """Test a cancelled job gives up its place in the queue."""
+        controller = AdmissionController(budget_mb=1000, estimate_mb=600)
+        controller.acquire()
+        token = CancellationToken()
+
+        errors = []
+
+        def wait():
+            try:
+                controller.acquire(cancel_token=token)
+            except JobCancelled as e:
+                errors.append(e)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.05)
+        token.cancel()
+        waiter.join(timeout=1)
+
+        assert len(errors) == 1
+        assert controller.waiting == 0
+        assert controller.running == 1
+
+    def test_learns_from_observed_usage(self):
+        """Test the estimate moves toward observed peak memory."""
+        controller = AdmissionController(budget_mb=1000, estimate_mb=300, smoothing=0.5)
+        controller.release(controller.acquire(), {"peak_rss_mb": 100})
+
+        assert controller.estimate_mb == 200
+        assert controller.reserved_mb == 0
+        assert controller.running == 0
@@ -0,0 +1,182 @@
+"""Tests for fair-share scheduling of generation jobs."""
+
+import threading
+import time
+import pytest  # type: ignore
+from types import SimpleNamespace
+from src.cancellation import CancellationToken, JobCancelled
+from src.scheduler import (
+    FairScheduler,
+    QuotaExceeded,
+    client_id,
+    parse_networks,
+    parse_weights,
+    predict_cost,
+)
+
+
+def wait_for_waiting(scheduler, count):
+    """Block until count jobs are queued in the scheduler."""
+    deadline = time.monotonic() + 5
+    while len(scheduler.waiting) < count:
+        assert time.monotonic() < deadline, "jobs never queued"
+        time.sleep(0.01)
+
+
+class TestHelpers:
+    """Test cases for cost prediction and client identification."""
+
+    def test_predict_cost_grows_with_size_and_format(self):
+        """Test bigger and heavier-format jobs are predicted to cost more."""
+        assert predict_cost(100, "csv") < predict_cost(1000, "csv")
+        assert predict_cost(1000, "csv") < predict_cost(1000, "Parquet")
+
+    def test_client_id_prefers_api_key_then_ip_then_session(self):
+        """Test how a request's client is identified."""
+        proxies = parse_networks("10.0.0.0/8")
+        proxy = SimpleNamespace(host="10.0.0.5")
+        keyed = SimpleNamespace(headers={"x-api-key": "secret"}, client=proxy)
+        forwarded = SimpleNamespace(
+            headers={"x-forwarded-for": "198.51.100.7, 10.0.0.9"},
+            client=proxy,
+            session_hash="s1",
+        )
+        session = SimpleNamespace(headers={}, client=None, session_hash="s1")
+
+        assert client_id(keyed, ["secret"], proxies).startswith("key:")
+        assert "secret" not in client_id(keyed, ["secret"], proxies)
+        assert client_id(forwarded, [], proxies) == "ip:198.51.100.7"
+        assert client_id(session, [], proxies) == "session:s1"
+        assert client_id(None) == "anonymous"
+
+    def test_client_id_ignores_untrusted_claims(self):
+        """Test unknown keys and spoofable addresses don't pick the client."""
+        proxies = parse_networks("10.0.0.5")
+        direct = SimpleNamespace(host="203.0.113.9")
+        unknown_key = SimpleNamespace(
+            headers={"x-api-key": "made-up"}, client=direct, session_hash="s1"
+        )
+        spoofed = SimpleNamespace(
+            headers={"x-forwarded-for": "198.51.100.7"},
+            client=direct,
+            session_hash="s2",
+        )
+        proxied = SimpleNamespace(
+            headers={}, client=SimpleNamespace(host="10.0.0.5"), session_hash="s3"
+        )
+
+        assert client_id(unknown_key, ["secret"], proxies) == "session:s1"
+        assert client_id(spoofed, [], proxies) == "session:s2"
+        # Everyone behind the proxy would share its address
+        assert client_id(proxied, [], proxies) == "session:s3"
+        assert client_id(spoofed, [], []) == "session:s2"
+
+    def test_parse_weights(self):
+        """Test weights are parsed and invalid entries skipped."""
+        assert parse_weights("ip:1.2.3.4=2, key:ab=0.5,bad") == {
+            "ip:1.2.3.4": 2.0,
+            "key:ab": 0.5,
+        }
+
+
+class TestFairScheduler:
+    """Test cases for the fair-share scheduler."""
+
+    def run_in_order(self, scheduler, jobs):
+        """Queue jobs behind a held slot and return the order they ran in."""
+        blocker = scheduler.acquire("blocker", 1)
+        order = []
+
+        def run(client, cost):
+            with scheduler.slot(client, cost):
+                order.append((client, cost))
+
+        threads = []
+        for index, job in enumerate(jobs):
+            threads.append(threading.Thread(target=run, args=job))
+            threads[-1].start()
+            wait_for_waiting(scheduler, index + 1)
+        scheduler.release(blocker)
+        for thread in threads:
+            thread.join(timeout=5)
+        return order
+
+    def test_light_client_is_not_starved(self):
+        """Test a client's one job runs before another's backlog."""
+        scheduler = FairScheduler(slots=1, weights={})
+        order = self.run_in_order(
+            scheduler,
+            [("heavy", 1000), ("heavy", 1000), ("heavy", 1000), ("light", 1000)],
+        )
+        assert order.index(("light", 1000)) == 1
+
+    def test_short_jobs_go_first(self):
+        """Test a short job overtakes a long one queued earlier."""
+        scheduler = FairScheduler(slots=1, weights={})
+        order = self.run_in_order(scheduler, [("a", 5000), ("b", 300)])
+        assert order == [("b", 300), ("a", 5000)]
+
+    def test_weights_give_larger_shares(self):
+        """Test a heavier-weighted client's job wins at equal cost."""
+        scheduler = FairScheduler(slots=1, weights={"vip": 4.0})
+        order = self.run_in_order(scheduler, [("a", 1000), ("vip", 1000)])
+        assert order[0] == ("vip", 1000)
+
+    def test_per_client_concurrency_limit(self):
+        """Test a client at its limit waits while others get free slots."""
+        scheduler = FairScheduler(slots=3, max_jobs_per_client=1, weights={})
+        scheduler.acquire("a", 1)
+
+        with pytest.raises(TimeoutError):
+            scheduler.acquire("a", 1, timeout=0.05)
+        ticket = scheduler.acquire("b", 1, timeout=0.05)
+
+        assert ticket.client == "b"
+        assert not scheduler.waiting
+
+    def test_quota_is_enforced(self):
+        """Test a client over its token or CPU quota is turned away."""
+        scheduler = FairScheduler(token_quota=1000, cpu_quota_seconds=60, weights={})
+        scheduler.charge("a", tokens=1200)
+        scheduler.charge("b", cpu_seconds=90)
+
+        with pytest.raises(QuotaExceeded):
+            scheduler.acquire("a", 1)
+        with pytest.raises(QuotaExceeded):
+            scheduler.acquire("b", 1)
+        assert scheduler.acquire("c", 1).client == "c"
+
+    def test_quota_window_slides(self):
+        """Test usage older than the window no longer counts."""
+        scheduler = FairScheduler(token_quota=1000, window_seconds=0, weights={})
+        scheduler.charge("a", tokens=5000)
+        assert scheduler.usage("a") == (0, 0)
+
+    def test_cancel_while_queued(self):
+        """Test cancelling a queued job removes it from the queue."""
+        scheduler = FairScheduler(slots=1, weights={})
+        scheduler.acquire("a", 1)
+        token = CancellationToken()
+        events = []
+        errors = []
+
+        def wait():
+            try:
+                scheduler.acquire(
+                    "b",
+                    1,
+                    cancel_token=token,
+                    on_progress=lambda stage, **details: events.append(stage),
+                )
+            except JobCancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        wait_for_waiting(scheduler, 1)
+        token.cancel()
+        thread.join(timeout=5)
+
+        assert len(errors) == 1
+        assert events == ["queued"]
+        assert not scheduler.waiting
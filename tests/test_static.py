@@ -0,0 +1,146 @@
+"""Tests for precompressed static file serving."""
+
+import gzip
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+import pytest  # type: ignore
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from src.constants import STATIC_CACHE_CONTROL, STATIC_IMMUTABLE_CACHE_CONTROL
+from src.static import PrecompressedStaticFiles, brotli, choose_encoding
+
+CSS = "body { color: #123456; }\n" * 100
+
+
+class TestPrecompressedStaticFiles:
+    """Test cases for serving files with variants, ETags and 304s."""
+
+    def setup_method(self):
+        """Serve a temporary directory with a stylesheet and an image."""
+        self.root = tempfile.mkdtemp()
+        with open(os.path.join(self.root, "styles.css"), "w") as f:
+            f.write(CSS)
+        with open(os.path.join(self.root, "index.html"), "w") as f:
+            f.write("<html>" + "<p>docs</p>" * 100 + "</html>")
+        with open(os.path.join(self.root, "logo.png"), "wb") as f:
+            f.write(os.urandom(2048))
+        self.files = PrecompressedStaticFiles(directory=self.root, html=True)
+        app = Starlette(routes=[Mount("/static", self.files)])
+        self.client = TestClient(app)
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def get(self, path, **headers):
+        """Request a file, with no compression unless asked for."""
+        headers.setdefault("Accept-Encoding", "identity")
+        return self.client.get(path, headers=headers)
+
+    def test_gzip_variant(self):
+        """Test gzip clients get the precompressed body."""
+        response = self.client.get(
+            "/static/styles.css",
+            headers={"Accept-Encoding": "gzip"},
+        )
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"].endswith('-gzip"')
+        assert int(response.headers["content-length"]) < len(CSS)
+        assert response.text == CSS
+
+    @pytest.mark.skipif(brotli is None, reason="brotli not installed")
+    def test_brotli_is_preferred(self):
+        """Test brotli wins over gzip when both are accepted."""
+        response = self.get("/static/styles.css", **{"Accept-Encoding": "gzip, br"})
+
+        assert response.headers["content-encoding"] == "br"
+        assert response.text == CSS
+
+    def test_identity_and_binary_files(self):
+        """Test plain files are served unchanged with a strong ETag."""
+        css = self.get("/static/styles.css")
+        image = self.get("/static/logo.png", **{"Accept-Encoding": "gzip, br"})
+
+        assert "content-encoding" not in css.headers
+        assert css.text == CSS
+        assert not css.headers["etag"].startswith("W/")
+        assert "content-encoding" not in image.headers
+        assert "vary" not in image.headers
+
+    def test_conditional_request(self):
+        """Test a known ETag gets a 304 without a body."""
+        first = self.get("/static/styles.css", **{"Accept-Encoding": "gzip"})
+
+        second = self.get(
+            "/static/styles.css",
+            **{"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]},
+        )
+
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == first.headers["etag"]
+
+    def test_changed_file_gets_a_new_etag(self):
+        """Test an edited file is re-indexed and its old ETag no longer matches."""
+        old = self.get("/static/styles.css").headers["etag"]
+        with open(os.path.join(self.root, "styles.css"), "a") as f:
+            f.write("p { margin: 0; }\n")
+
+        response = self.get("/static/styles.css", **{"If-None-Match": old})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != old
+        assert response.text.endswith("p { margin: 0; }\n")
+
+    def test_versioned_urls_are_immutable(self):
+        """Test only URLs carrying the current version are cached for good."""
+        url = self.files.versioned_url("styles.css", "/static")
+
+        assert self.get(url).headers["cache-control"] == STATIC_IMMUTABLE_CACHE_CONTROL
+        stale = "/static/styles.css?v=0123456789abcdef"
+        assert self.get(stale).headers["cache-control"] == STATIC_CACHE_CONTROL
+        assert (
+            self.get("/static/styles.css").headers["cache-control"]
+            == STATIC_CACHE_CONTROL
+        )
+
+    def test_html_index(self):
+        """Test directory URLs still serve index.html, compressed."""
+        response = self.client.get("/static/", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["content-type"].startswith("text/html")
+        assert "<p>docs</p>" in response.text
+
+    @patch("src.static.brotli", None)
+    def test_gzip_only_without_brotli(self):
+        """Test brotli clients get gzip when the brotli package is missing."""
+        files = PrecompressedStaticFiles(directory=self.root)
+        path = os.path.realpath(os.path.join(self.root, "styles.css"))
+
+        assert set(files.assets[path]["variants"]) == {"gzip"}
+        assert gzip.decompress(files.assets[path]["variants"]["gzip"]) == CSS.encode()
+
+
+class TestChooseEncoding:
+    """Test cases for Accept-Encoding negotiation."""
+
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            ("gzip, deflate, br", "br"),
+            ("gzip;q=1.0, br;q=0.5", "gzip"),
+            ("br;q=0, gzip", "gzip"),
+            ("*", "br"),
+            ("identity", None),
+            (None, None),
+        ],
+    )
+    def test_negotiation(self, header, expected):
+        """Test the accepted coding with the highest q-value is chosen."""
+        assert choose_encoding(header, {"br": b"", "gzip": b""}) == expected
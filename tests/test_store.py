@@ -0,0 +1,212 @@
+"""Tests for the shared job and artifact stores."""
+
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest  # type: ignore
+from src.store import (
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    ContentAddressedArtifactStore,
+    JobStore,
+    LocalArtifactStore,
+    SQLiteJobStore,
+)
+from src.workspace import create_workspace, write_manifest
+
+
+class TestSQLiteJobStore:
+    """Test cases for the SQLite job store."""
+
+    def setup_method(self):
+        """Create a store in a temporary directory."""
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "jobs.sqlite3")
+        self.store = SQLiteJobStore(self.path)
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_create_and_get_job(self):
+        """Test a new job is stored with its spec."""
+        self.store.create_job("a" * 16, {"num_samples": 10})
+
+        job = self.store.get_job("a" * 16)
+        assert job["status"] == QUEUED
+        assert job["spec"] == {"num_samples": 10}
+        assert job["result"] is None
+
+    def test_unknown_job(self):
+        """Test an unknown job id returns None."""
+        assert self.store.get_job("missing") is None
+
+    def test_progress_complete_and_fail(self):
+        """Test progress, results and errors are recorded."""
+        self.store.create_job("a", {}, status=RUNNING)
+        self.store.create_job("b", {}, status=RUNNING)
+
+        self.store.update_progress("a", "preview", "Preview ready")
+        assert self.store.get_job("a")["stage"] == "preview"
+        assert self.store.get_job("a")["message"] == "Preview ready"
+
+        self.store.complete_job("a", {"file_path": "out/a/data.csv"})
+        self.store.fail_job("b", ValueError("bad script"))
+        assert self.store.get_job("a")["status"] == DONE
+        assert self.store.get_job("a")["result"] == {"file_path": "out/a/data.csv"}
+        assert self.store.get_job("b")["status"] == FAILED
+        assert self.store.get_job("b")["error"] == "bad script"
+
+    def test_claim_oldest_queued_job(self):
+        """Test jobs are claimed in order and only once."""
+        self.store.create_job("first", {})
+        self.store.create_job("second", {})
+
+        assert self.store.claim_job("w1")["job_id"] == "first"
+        claimed = self.store.claim_job("w2")
+        assert claimed["job_id"] == "second"
+        assert claimed["status"] == RUNNING
+        assert claimed["worker_id"] == "w2"
+        assert self.store.claim_job("w3") is None
+
+    def test_concurrent_claims_never_share_a_job(self):
+        """Test workers with their own connections claim disjoint jobs."""
+        for i in range(20):
+            self.store.create_job(f"job{i}", {})
+
+        def drain(worker_id):
+            store = SQLiteJobStore(self.path)
+            claimed = []
+            while (job := store.claim_job(worker_id)) is not None:
+                claimed.append(job["job_id"])
+            return claimed
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(drain, ["w1", "w2", "w3", "w4"]))
+
+        claimed = [job_id for result in results for job_id in result]
+        assert sorted(claimed) == sorted(f"job{i}" for i in range(20))
+
+    def test_heartbeat_renews_only_the_owners_lease(self):
+        """Test only the worker holding a running job can renew it."""
+        self.store.create_job("a", {})
+        self.store.claim_job("w1")
+
+        assert self.store.heartbeat("a", "w1")
+        assert not self.store.heartbeat("a", "w2")
+        self.store.complete_job("a", {})
+        assert not self.store.heartbeat("a", "w1")
+
+    def test_reap_stale_jobs(self):
+        """Test expired claims are requeued until their attempts run out."""
+        self.store.create_job("claimed", {})
+        self.store.create_job("web", {}, status=RUNNING, worker_id="web-1")
+        self.store.claim_job("w1")
+        time.sleep(0.05)
+
+        assert self.store.reap_stale_jobs(60) == []
+        assert sorted(self.store.reap_stale_jobs(0.01, max_attempts=2)) == [
+            "claimed",
+            "web",
+        ]
+        assert self.store.get_job("claimed")["status"] == QUEUED
+        assert self.store.get_job("claimed")["worker_id"] is None
+        assert self.store.get_job("web")["status"] == FAILED
+
+        assert self.store.claim_job("w2")["attempts"] == 2
+        time.sleep(0.05)
+        assert self.store.reap_stale_jobs(0.01, max_attempts=2) == ["claimed"]
+        job = self.store.get_job("claimed")
+        assert job["status"] == FAILED
+        assert job["error"] == "Worker stopped responding."
+
+    def test_stores_are_abstract(self):
+        """Test a backend missing a method can't be created."""
+
+        class Partial(JobStore):
+            def get_job(self, job_id):
+                return None
+
+        with pytest.raises(TypeError):
+            Partial()
+
+
+class TestLocalArtifactStore:
+    """Test cases for the local artifact store."""
+
+    def setup_method(self):
+        """Create a temporary root directory."""
+        self.root = tempfile.mkdtemp()
+        self.store = LocalArtifactStore(self.root)
+
+    def teardown_method(self):
+        """Remove the temporary root directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_paths_manifest_and_delete(self):
+        """Test artifacts are found through the job's manifest."""
+        job_id = "0123456789abcdef"
+        workspace = create_workspace(self.root, job_id)
+        with open(os.path.join(workspace, "data.csv"), "w") as f:
+            f.write("a\n1\n")
+        write_manifest(workspace, job_id)
+
+        assert self.store.workspace(job_id) == workspace
+        assert self.store.paths(job_id) == [os.path.join(workspace, "data.csv")]
+        assert self.store.manifest(job_id)["job_id"] == job_id
+
+        self.store.delete(job_id)
+        assert self.store.paths(job_id) == []
+        assert self.store.manifest(job_id) is None
+
+
+class TestContentAddressedArtifactStore:
+    """Test cases for the deduplicating artifact store."""
+
+    def setup_method(self):
+        """Create a store in a temporary root directory."""
+        self.root = tempfile.mkdtemp()
+        self.store = ContentAddressedArtifactStore(
+            self.root, os.path.join(self.root, "blobs")
+        )
+
+    def teardown_method(self):
+        """Remove the temporary root directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def finish_job(self, job_id, content):
+        """Write a job's dataset and manifest, then commit it."""
+        workspace = create_workspace(self.root, job_id)
+        with open(os.path.join(workspace, "data.csv"), "w") as f:
+            f.write(content)
+        write_manifest(workspace, job_id)
+        return self.store.commit(job_id)
+
+    def test_identical_outputs_are_stored_once(self):
+        """Test two jobs with the same output share one file on disk."""
+        first = self.finish_job("0123456789abcdef", "a\n1\n")
+        second = self.finish_job("fedcba9876543210", "a\n1\n")
+
+        digest = first["files"][0]["sha256"]
+        assert second["files"][0]["sha256"] == digest
+        assert self.store.manifest("0123456789abcdef")["files"][0]["sha256"] == digest
+        first_path, second_path = (
+            self.store.paths("0123456789abcdef")[0],
+            self.store.paths("fedcba9876543210")[0],
+        )
+        assert os.path.samefile(first_path, second_path)
+
+    def test_delete_releases_the_job(self):
+        """Test deleting a job removes its workspace but not other jobs' files."""
+        self.finish_job("0123456789abcdef", "a\n1\n")
+        self.finish_job("fedcba9876543210", "a\n1\n")
+
+        self.store.delete("0123456789abcdef")
+
+        assert self.store.manifest("0123456789abcdef") is None
+        with open(self.store.paths("fedcba9876543210")[0]) as f:
+            assert f.read() == "a\n1\n"
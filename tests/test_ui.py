@@ -1,6 +1,15 @@
 """Tests for UI business logic functions."""
 
-from src.ui import update_output_format, PROJECT_NAME_CAP, REPO_URL
+import gradio as gr
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+from src.ui import (
+    MOUNT_TAKES_HEAD,
+    PROJECT_NAME_CAP,
+    REPO_URL,
+    build_ui,
+    update_output_format,
+)
 
 
 class TestUpdateOutputFormat:
@@ -11,7 +20,16 @@ class TestUpdateOutputFormat:
         result = update_output_format("Tabular")
 
         assert isinstance(result, dict)
-        assert result["choices"] == ["JSON", "csv", "Parquet"]
+        assert result["choices"] == [
+            "JSON",
+            "NDJSON",
+            "csv",
+            "csv.gz",
+            "csv.zst",
+            "Parquet",
+            "Feather",
+            "ORC",
+        ]
         assert result["value"] == "JSON"
 
     def test_time_series_dataset_type(self):
@@ -19,7 +37,16 @@ class TestUpdateOutputFormat:
         result = update_output_format("Time-series")
 
         assert isinstance(result, dict)
-        assert result["choices"] == ["JSON", "csv", "Parquet"]
+        assert result["choices"] == [
+            "JSON",
+            "NDJSON",
+            "csv",
+            "csv.gz",
+            "csv.zst",
+            "Parquet",
+            "Feather",
+            "ORC",
+        ]
         assert result["value"] == "JSON"
 
     def test_text_dataset_type(self):
@@ -27,7 +54,7 @@ class TestUpdateOutputFormat:
         result = update_output_format("Text")
 
         assert isinstance(result, dict)
-        assert result["choices"] == ["JSON", "Markdown"]
+        assert result["choices"] == ["JSON", "NDJSON", "Markdown"]
         assert result["value"] == "JSON"
 
     def test_unknown_dataset_type(self):
@@ -56,3 +83,20 @@ class TestConstants:
         """Test that constants are not empty."""
         assert PROJECT_NAME_CAP.strip() != ""
         assert REPO_URL.strip() != ""
+
+
+class TestBuildUI:
+    """Test cases for the mounted interface."""
+
+    def test_head_reaches_the_page(self):
+        """Test the extra <head> is served with the installed Gradio version."""
+        stylesheet = "/assets/styles.css?v=0123456789abcdef"
+        head = f'<link rel="stylesheet" href="{stylesheet}">'
+        options = {"head": head} if MOUNT_TAKES_HEAD else {}
+        app = gr.mount_gradio_app(FastAPI(), build_ui(head), path="", **options)
+
+        response = TestClient(app).get("/")
+
+        assert response.status_code == 200
+        # Gradio hands the head to the page in its JSON config
+        assert stylesheet in response.text
@@ -1,10 +1,27 @@
 """Comprehensive tests for utility functions."""
 
+import os
 import sys
 import subprocess
+import tempfile
+import threading
+import time
 from unittest.mock import patch, MagicMock
 import pytest  # type: ignore
-from src.utils import extract_code, extract_file_path, execute_code_in_virtualenv
+from src.cancellation import CancellationToken, JobCancelled
+from src.profiling import RUN_BOOTSTRAP
+from src.resources import LIMITS_BOOTSTRAP, limits_env
+from src.utils import (
+    apply_patch,
+    execute_code_in_virtualenv,
+    extract_code,
+    extract_file_path,
+    extract_file_paths,
+    make_dry_run_code,
+    make_shard_code,
+    shift_seeds,
+    trim_traceback,
+)
 
 
 def test_extract_code():
@@ -57,6 +74,19 @@ def test_extract_file_path_no_match():
     assert result is None
 
 
+def test_extract_file_paths_multiple_entities():
+    """Test every distinct output path is extracted, in order."""
+    code = (
+        'users = os.path.join("out", "users.csv")\n'
+        'orders = os.path.join("out", "orders.csv")\n'
+        'again = os.path.join("out", "users.csv")'
+    )
+    assert extract_file_paths(code) == [
+        os.path.join("out", "users.csv"),
+        os.path.join("out", "orders.csv"),
+    ]
+
+
 def test_extract_file_path_complex():
     """Test file path extraction with various formats."""
     test_cases = [
@@ -71,17 +101,27 @@ def test_extract_file_path_complex():
         assert expected_file in result
 
 
-@patch("subprocess.run")
+def make_process(returncode=0, stderr=""):
+    """Build a fake child process as returned by AccountedPopen."""
+    process = MagicMock()
+    process.pid = 12345
+    process.returncode = returncode
+    process.rusage = None
+    process.communicate.return_value = ("", stderr)
+    return process
+
+
+@patch("src.utils.AccountedPopen")
 @patch("src.utils.extract_file_path")
 @patch("src.utils.extract_code")
 def test_execute_code_in_virtualenv_success(
-    mock_extract_code, mock_extract_file_path, mock_subprocess
+    mock_extract_code, mock_extract_file_path, mock_popen
 ):
     """Test successful code execution."""
     # Setup mocks
     mock_extract_code.return_value = 'print("hello")'
     mock_extract_file_path.return_value = "output/test.csv"
-    mock_subprocess.return_value = MagicMock()
+    mock_popen.return_value = make_process()
 
     text = "```python\nprint('hello')\n```"
     result = execute_code_in_virtualenv(text)
@@ -89,27 +129,25 @@ def test_execute_code_in_virtualenv_success(
     # Verify calls
     mock_extract_code.assert_called_once_with(text)
     mock_extract_file_path.assert_called_once_with('print("hello")')
-    mock_subprocess.assert_called_once_with(
-        [sys.executable, "-c", 'print("hello")'],
-        check=True,
-        capture_output=True,
+    mock_popen.assert_called_once_with(
+        [sys.executable, "-c", LIMITS_BOOTSTRAP + RUN_BOOTSTRAP, 'print("hello")'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
         text=True,
+        start_new_session=True,
+        env={**os.environ, **limits_env()},
     )
 
     assert result == "output/test.csv"
 
 
-@patch("subprocess.run")
+@patch("src.utils.AccountedPopen")
 @patch("src.utils.extract_code")
-def test_execute_code_in_virtualenv_subprocess_error(
-    mock_extract_code, mock_subprocess
-):
+def test_execute_code_in_virtualenv_subprocess_error(mock_extract_code, mock_popen):
     """Test code execution with subprocess error."""
     # Setup mocks
     mock_extract_code.return_value = "invalid_code()"
-    error = subprocess.CalledProcessError(1, "cmd")
-    error.stderr = "SyntaxError: invalid syntax"
-    mock_subprocess.side_effect = error
+    mock_popen.return_value = make_process(1, "SyntaxError: invalid syntax")
 
     text = "```python\ninvalid_code()\n```"
     result = execute_code_in_virtualenv(text)
@@ -129,42 +167,39 @@ def test_execute_code_in_virtualenv_no_interpreter():
         )
 
 
-@patch("subprocess.run")
+@patch("src.utils.AccountedPopen")
 @patch("src.utils.extract_file_path")
 @patch("src.utils.extract_code")
 def test_execute_code_in_virtualenv_custom_interpreter(
-    mock_extract_code, mock_extract_file_path, mock_subprocess
+    mock_extract_code, mock_extract_file_path, mock_popen
 ):
     """Test code execution with custom Python interpreter."""
     mock_extract_code.return_value = 'print("test")'
     mock_extract_file_path.return_value = "test.csv"
-    mock_subprocess.return_value = MagicMock()
+    mock_popen.return_value = make_process()
 
     custom_interpreter = "/usr/bin/python3.9"
     text = "```python\nprint('test')\n```"
 
     result = execute_code_in_virtualenv(text, python_interpreter=custom_interpreter)
 
-    mock_subprocess.assert_called_once_with(
-        [custom_interpreter, "-c", 'print("test")'],
-        check=True,
-        capture_output=True,
-        text=True,
-    )
+    command = mock_popen.call_args[0][0]
+    assert command[0] == custom_interpreter
+    assert command[-1] == 'print("test")'
 
     assert result == "test.csv"
 
 
-@patch("subprocess.run")
+@patch("src.utils.AccountedPopen")
 @patch("src.utils.extract_file_path")
 @patch("src.utils.extract_code")
 def test_execute_code_in_virtualenv_file_path_none(
-    mock_extract_code, mock_extract_file_path, mock_subprocess
+    mock_extract_code, mock_extract_file_path, mock_popen
 ):
     """Test code execution when extract_file_path returns None."""
     mock_extract_code.return_value = 'print("hello")'
     mock_extract_file_path.return_value = None
-    mock_subprocess.return_value = MagicMock()
+    mock_popen.return_value = make_process()
 
     text = "```python\nprint('hello')\n```"
     result = execute_code_in_virtualenv(text)
@@ -172,9 +207,252 @@ def test_execute_code_in_virtualenv_file_path_none(
     assert result is None
 
 
+@patch("src.utils.EXECUTION_TIMEOUT_SECONDS", 1)
+def test_execute_code_in_virtualenv_timeout_kills_child():
+    """Test a script running past the timeout is killed and reported."""
+    start = time.monotonic()
+    result = execute_code_in_virtualenv("```python\nimport time\ntime.sleep(30)\n```")
+
+    assert time.monotonic() - start < 10
+    assert result[1] is None
+    assert "TimeoutError" in result[0]
+
+
+def test_execute_code_in_virtualenv_cancel_kills_child():
+    """Test cancelling the token kills a running script right away."""
+    token = CancellationToken()
+    threading.Timer(0.5, token.cancel).start()
+    start = time.monotonic()
+
+    with pytest.raises(JobCancelled):
+        execute_code_in_virtualenv(
+            "```python\nimport time\ntime.sleep(30)\n```", cancel_token=token
+        )
+
+    assert time.monotonic() - start < 10
+
+
+def test_execute_code_in_virtualenv_reports_rows_written():
+    """Test the script reports rows written by dataframe writers over a pipe."""
+    events = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        code = (
+            "```python\nimport os\nimport pandas as pd\n"
+            "df = pd.DataFrame({'a': range(30)})\n"
+            "for i in range(0, 30, 10):\n"
+            f"    df.iloc[i:i + 10].to_csv(os.path.join('{temp_dir}', 'out.csv'), "
+            "mode='a', index=False)\n```"
+        )
+        result = execute_code_in_virtualenv(
+            code, on_progress=lambda stage, **details: events.append((stage, details))
+        )
+
+    assert result.endswith("out.csv")
+    assert events == [("rows", {"rows": n}) for n in (10, 20, 30)]
+
+
+def test_execute_code_in_virtualenv_reports_usage():
+    """Test resource usage is recorded for every run."""
+    usage = []
+    execute_code_in_virtualenv(
+        "```python\nx = bytearray(50 * 1024 * 1024)\n```", on_usage=usage.append
+    )
+
+    assert len(usage) == 1
+    assert usage[0]["returncode"] == 0
+    assert usage[0]["peak_rss_mb"] >= 50
+    assert usage[0]["cpu_seconds"] >= 0
+    assert "write_bytes" in usage[0]
+
+
+def test_trim_traceback_keeps_last_lines():
+    """Test that only the end of a traceback is kept."""
+    error = "Traceback:\n  line 1\n  line 2\nKeyError: 'price'"
+    assert trim_traceback(error, 2) == "  line 2\nKeyError: 'price'"
+
+
+def test_apply_patch_search_replace():
+    """Test applying a SEARCH/REPLACE edit block."""
+    code = "import pandas as pd\ndf = pd.DataFrame(data)\ndf.to_csv(path)"
+    reply = (
+        "```diff\n<<<<<<< SEARCH\ndf = pd.DataFrame(data)\n=======\n"
+        "df = pd.DataFrame(rows)\n>>>>>>> REPLACE\n```"
+    )
+    result = apply_patch(code, reply)
+    assert result == "import pandas as pd\ndf = pd.DataFrame(rows)\ndf.to_csv(path)"
+
+
+def test_apply_patch_multiple_blocks():
+    """Test that every edit block is applied in order."""
+    code = "a = 1\nb = 2"
+    reply = (
+        "<<<<<<< SEARCH\na = 1\n=======\na = 10\n>>>>>>> REPLACE\n"
+        "<<<<<<< SEARCH\nb = 2\n=======\nb = 20\n>>>>>>> REPLACE"
+    )
+    assert apply_patch(code, reply) == "a = 10\nb = 20"
+
+
+def test_apply_patch_full_script_reply():
+    """Test a reply with a whole script replaces the original."""
+    reply = "```python\nprint('fixed')\n```"
+    assert apply_patch("print('broken'", reply) == "print('fixed')"
+
+
+def test_apply_patch_unmatched_block():
+    """Test that a block not found in the script is rejected."""
+    reply = "<<<<<<< SEARCH\nmissing\n=======\nx\n>>>>>>> REPLACE"
+    with pytest.raises(ValueError, match="does not match"):
+        apply_patch("a = 1", reply)
+
+
+def test_apply_patch_empty_reply():
+    """Test that a reply without edits or code is rejected."""
+    with pytest.raises(ValueError, match="No edit blocks"):
+        apply_patch("a = 1", "Sorry, I can't help.")
+
+
+def test_make_dry_run_code_shrinks_sample_count():
+    """Test the sample count literal is replaced but other numbers are kept."""
+    code = "n = 1000\nprices = uniform(1.0, 1000.5, size=1000)\nm = 10000"
+    result = make_dry_run_code(code, 1000, 20)
+    assert result == "n = 20\nprices = uniform(1.0, 1000.5, size=20)\nm = 10000"
+
+
+def test_make_dry_run_code_keeps_values_equal_to_the_count():
+    """Test only count positions change when other literals equal the count."""
+    code = (
+        "n = 100\n"
+        "ages = np.random.randint(0, 100, n)\n"
+        "scores = rng.integers(0, 100, 100)\n"
+        "pct = x * 100\n"
+        "max_price = 100\n"
+        "ids = range(1, 100 + 1)\n"
+        "grid = np.linspace(0, 100, 100)"
+    )
+    result = make_dry_run_code(code, 100, 5)
+    assert result == (
+        "n = 5\n"
+        "ages = np.random.randint(0, 100, n)\n"
+        "scores = rng.integers(0, 100, 5)\n"
+        "pct = x * 100\n"
+        "max_price = 100\n"
+        "ids = range(1, 5 + 1)\n"
+        "grid = np.linspace(0, 100, 5)"
+    )
+
+
+def test_execute_with_dry_run_warns_on_schema_change():
+    """Test a preview with other columns than the full run is reported."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        text = (
+            "```python\nimport os\nimport pandas as pd\nn = 1000\n"
+            "df = pd.DataFrame({'id': range(n)})\n"
+            "if n > 100:\n    df['extra'] = 1\n"
+            f'df.to_csv(os.path.join("{temp_dir}", "data.csv"), index=False)\n```'
+        )
+        with patch("src.utils.logger") as logger:
+            result = execute_code_in_virtualenv(
+                text,
+                num_samples=1000,
+                output_format="csv",
+                dry_run_samples=10,
+            )
+    assert result.endswith("data.csv")
+    assert any(
+        "doesn't match" in call.args[0] for call in logger.warning.call_args_list
+    )
+
+
+def test_make_dry_run_code_renames_every_output():
+    """Test every output file gets a preview suffix."""
+    code = (
+        'a = os.path.join("out", "users_1.csv")\n'
+        "b = os.path.join('out', 'orders_1.csv')"
+    )
+    result = make_dry_run_code(code, 1000, 20)
+    assert '"users_1_preview.csv"' in result
+    assert "'orders_1_preview.csv'" in result
+
+
+def test_make_dry_run_code_keeps_compound_extension():
+    """Test compressed CSV previews keep their .csv.gz extension."""
+    code = 'p = os.path.join("out", "sales_1.csv.gz")'
+    assert '"sales_1_preview.csv.gz"' in make_dry_run_code(code, 1000, 20)
+
+
+def write_csv_script(directory, rows_expr):
+    """Build a script that writes a CSV with the given row count expression."""
+    return (
+        "```python\nimport os\nimport pandas as pd\n"
+        f"df = pd.DataFrame({{'id': range({rows_expr})}})\n"
+        f'df.to_csv(os.path.join("{directory}", "data.csv"), index=False)\n```'
+    )
+
+
+def test_execute_with_dry_run_reports_preview():
+    """Test the dry run writes a small preview before the full run."""
+    directory = tempfile.mkdtemp().replace("\\", "/")
+    previews = []
+
+    result = execute_code_in_virtualenv(
+        write_csv_script(directory, "500"),
+        num_samples=500,
+        output_format="csv",
+        dry_run_samples=20,
+        on_preview=previews.append,
+    )
+
+    assert result == os.path.join(directory, "data.csv")
+    assert previews == [os.path.join(directory, "data_preview.csv")]
+    with open(previews[0]) as f:
+        assert len(f.readlines()) == 21  # header + 20 rows
+    with open(result) as f:
+        assert len(f.readlines()) == 501
+
+
+def test_execute_with_failing_dry_run_skips_full_run():
+    """Test a crash in the dry run is reported without running at full size."""
+    directory = tempfile.mkdtemp().replace("\\", "/")
+    text = write_csv_script(directory, "500")
+    text = text.replace("import pandas as pd", "import pandas as pd\nraise KeyError(1)")
+
+    result = execute_code_in_virtualenv(
+        text, num_samples=500, output_format="csv", dry_run_samples=20
+    )
+
+    assert result[1] is None
+    assert "KeyError" in result[0]
+    assert not os.listdir(directory)
+
+
 def test_logging_setup():
     """Test that logging is properly configured."""
     from src.utils import logger
 
     assert logger.name == "src.utils"
     assert logger.level <= 20  # INFO level or below
+
+
+def test_shift_seeds():
+    """Test literal seeds of common generators are shifted."""
+    code = (
+        "random.seed(42)\nnp.random.seed(seed=7)\nFaker.seed(0)\n"
+        "rng = np.random.default_rng(123)\nx = seed_value(5)\n"
+    )
+    result = shift_seeds(code, 3)
+
+    assert "random.seed(45)" in result
+    assert "np.random.seed(seed=10)" in result
+    assert "Faker.seed(3)" in result
+    assert "default_rng(126)" in result
+    assert "seed_value(5)" in result
+
+
+def test_make_shard_code():
+    """Test a shard writes the extra rows to part files with new seeds."""
+    code = "random.seed(42)\nn = 1000\ndf.to_csv(os.path.join('out', 'sales.csv.gz'))\n"
+    result = make_shard_code(code, 1000, 250, part=2, seed_offset=2)
+
+    assert "n = 250" in result
+    assert "random.seed(44)" in result
+    assert "'sales_part2.csv.gz'" in result
@@ -0,0 +1,244 @@
+"""Tests for dataset output validation."""
+
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+import pytest  # type: ignore
+from src.validation import (
+    check_output,
+    count_rows,
+    iter_batches,
+    iter_json_array,
+    split_extension,
+    validate_dataset,
+)
+
+
+class TestValidation:
+    """Test cases for output validation helpers."""
+
+    def setup_method(self):
+        """Create a temporary directory with a small dataframe."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame({"id": range(5), "name": list("abcde")})
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        """Return a path inside the temporary directory."""
+        return os.path.join(self.temp_dir, name)
+
+    def test_count_rows_csv(self):
+        """Test counting rows in a CSV file."""
+        self.df.to_csv(self.path("data.csv"), index=False)
+        assert count_rows(self.path("data.csv"), "csv") == 5
+
+    def test_count_rows_json(self):
+        """Test counting records in a JSON array file."""
+        with open(self.path("data.json"), "w") as f:
+            json.dump(self.df.to_dict(orient="records"), f)
+        assert count_rows(self.path("data.json"), "JSON") == 5
+
+    def test_count_rows_parquet(self):
+        """Test counting rows in a Parquet file from its metadata."""
+        self.df.to_parquet(self.path("data.parquet"), index=False)
+        assert count_rows(self.path("data.parquet"), "Parquet") == 5
+
+    def test_count_rows_markdown(self):
+        """Test free text has no row count."""
+        with open(self.path("notes.md"), "w") as f:
+            f.write("# Notes")
+        assert count_rows(self.path("notes.md"), "Markdown") is None
+
+    @pytest.mark.parametrize(
+        "output_format, name, write",
+        [
+            ("csv.gz", "d.csv.gz", lambda df, p: df.to_csv(p, compression="gzip")),
+            (
+                "NDJSON",
+                "d.ndjson",
+                lambda df, p: df.to_json(p, orient="records", lines=True),
+            ),
+            (
+                "Feather",
+                "d.feather",
+                lambda df, p: df.to_feather(p, compression="zstd"),
+            ),
+            ("ORC", "d.orc", lambda df, p: df.to_orc(p)),
+        ],
+    )
+    def test_count_rows_compact_formats(self, output_format, name, write):
+        """Test counting rows in compressed and binary formats."""
+        write(self.df, self.path(name))
+        assert count_rows(self.path(name), output_format) == 5
+        assert check_output(self.path(name), output_format, 5)
+
+    def test_count_rows_csv_zst(self):
+        """Test counting rows in a zstd-compressed CSV written with pyarrow."""
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        table = pa.Table.from_pandas(self.df, preserve_index=False)
+        with pa.CompressedOutputStream(self.path("d.csv.zst"), "zstd") as out:
+            pacsv.write_csv(table, out)
+        assert count_rows(self.path("d.csv.zst"), "csv.zst") == 5
+
+    def test_count_rows_csv_quoted_newlines(self):
+        """Test quoted line breaks inside values don't add rows."""
+        df = pd.DataFrame({"review": ["great\nshoes", "too small"]})
+        df.to_csv(self.path("d.csv"), index=False)
+        assert count_rows(self.path("d.csv"), "csv") == 2
+
+    def test_check_output_valid(self):
+        """Test a matching file passes."""
+        self.df.to_csv(self.path("data.csv"), index=False)
+        assert check_output(self.path("data.csv"), "csv", 5)
+
+    def test_check_output_wrong_row_count(self):
+        """Test a file with too few rows fails."""
+        self.df.to_csv(self.path("data.csv"), index=False)
+        assert not check_output(self.path("data.csv"), "csv", 10)
+
+    def test_check_output_wrong_extension(self):
+        """Test a file saved in another format fails."""
+        self.df.to_csv(self.path("data.csv"), index=False)
+        assert not check_output(self.path("data.csv"), "JSON", 5)
+
+    def test_check_output_malformed(self):
+        """Test a file that doesn't parse fails."""
+        with open(self.path("data.json"), "w") as f:
+            f.write("[{broken")
+        assert not check_output(self.path("data.json"), "JSON", 5)
+
+    def test_check_output_missing(self):
+        """Test missing files and error results fail."""
+        assert not check_output(self.path("missing.csv"), "csv", 5)
+        assert not check_output(("Execution error:\nboom", None), "csv", 5)
+
+
+class TestValidateDataset:
+    """Test cases for the streaming validation report."""
+
+    def setup_method(self):
+        """Create a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        """Return a path inside the temporary directory."""
+        return os.path.join(self.temp_dir, name)
+
+    def test_valid_parquet_report(self):
+        """Test a good file gets a clean report with column statistics."""
+        df = pd.DataFrame({"id": range(300_000), "score": [0.5, None] * 150_000})
+        df.to_parquet(self.path("data.parquet"), index=False)
+
+        report = validate_dataset(self.path("data.parquet"), "Parquet", 300_000)
+
+        assert report["valid"]
+        assert report["issues"] == []
+        assert report["rows"] == 300_000
+        assert report["key"] == "id"
+        assert report["columns"][1] == {
+            "name": "score",
+            "type": "double",
+            "nulls": 150_000,
+            "null_ratio": 0.5,
+        }
+        # The report is meant to be stored as JSON
+        json.dumps(report)
+
+    def test_wrong_rows_null_column_and_duplicate_keys(self):
+        """Test every problem is reported, not just the first."""
+        pd.DataFrame(
+            {"user_id": [1, 2, 2, 3], "email": [None] * 4, "age": [30, 41, 25, 38]}
+        ).to_csv(self.path("users.csv"), index=False)
+
+        report = validate_dataset(self.path("users.csv"), "CSV", 5)
+
+        assert not report["valid"]
+        assert report["rows"] == 4
+        assert report["duplicate_keys"] == 1
+        assert report["issues"] == [
+            "4 rows instead of 5",
+            "Column 'email' is 100% null",
+            "1 duplicate value(s) in key 'user_id'",
+        ]
+
+    def test_mixed_types_in_json(self):
+        """Test a column holding numbers and strings fails as inconsistent."""
+        with open(self.path("data.json"), "w") as f:
+            json.dump([{"id": 1, "price": 9.5}, {"id": 2, "price": "free"}], f)
+
+        report = validate_dataset(self.path("data.json"), "JSON", 2)
+
+        assert not report["valid"]
+        assert report["issues"][0].startswith("Not valid json")
+
+    def test_json_array_read_in_blocks(self):
+        """Test objects split across blocks, even inside strings, come out whole."""
+        records = [
+            {"id": 1, "note": "}, {", "tags": [{"a": 1}, {"b": 2}]},
+            {"id": 2, "note": None, "tags": []},
+            {"id": 3, "note": "]", "tags": [{}]},
+        ]
+        with open(self.path("data.json"), "w") as f:
+            f.write(" [\n" + ",\n ".join(json.dumps(r) for r in records) + "\n]\n")
+
+        for block_size in (1, 7, 1 << 20):
+            assert list(iter_json_array(self.path("data.json"), block_size)) == records
+
+    @pytest.mark.parametrize(
+        "text",
+        ['{"id": 1}', '[{"id": 1}', '[{"id": 1},]', '[{"id": 1}, 2]', '[{"id": 1}] x'],
+    )
+    def test_malformed_json_array(self, text):
+        """Test anything but a closed array of objects is rejected."""
+        with open(self.path("data.json"), "w") as f:
+            f.write(text)
+
+        for block_size in (3, 1 << 20):
+            with pytest.raises(ValueError):
+                list(iter_json_array(self.path("data.json"), block_size))
+
+    def test_json_type_change_in_a_later_batch(self):
+        """Test later JSON batches must keep the types of the first."""
+        with open(self.path("data.json"), "w") as f:
+            json.dump([{"price": 1.5}, {"price": 2.5}, {"price": "free"}], f)
+
+        with pytest.raises((TypeError, ValueError)):
+            list(iter_batches(self.path("data.json"), "json", batch_rows=2))
+
+    def test_malformed_ndjson(self):
+        """Test a truncated NDJSON file doesn't parse."""
+        with open(self.path("data.ndjson"), "w") as f:
+            f.write('{"id": 1}\n{"id": ')
+
+        report = validate_dataset(self.path("data.ndjson"), "NDJSON", 2)
+
+        assert not report["valid"]
+        assert report["rows"] is None
+
+    def test_markdown_has_no_rows(self):
+        """Test free text only has its extension checked."""
+        with open(self.path("notes.md"), "w") as f:
+            f.write("# Notes")
+
+        report = validate_dataset(self.path("notes.md"), "Markdown", 5)
+
+        assert report["valid"]
+        assert report["rows"] is None
+
+
+def test_split_extension_compound():
+    """Test compressed CSV extensions stay together."""
+    assert split_extension("sales_1.csv.gz") == ("sales_1", ".csv.gz")
+    assert split_extension("sales_1.CSV.ZST") == ("sales_1", ".CSV.ZST")
+    assert split_extension("sales_1.parquet") == ("sales_1", ".parquet")
@@ -0,0 +1,109 @@
+"""Tests for catalog warming and serving of warmed datasets."""
+
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+from src.scheduler import FairScheduler
+from src.warmup import CatalogWarmer
+from src.workspace import read_manifest, workspace_path, write_manifest
+
+SPEC = {
+    "business_problem": "Stock prices with date, ticker, open, close, volume.",
+    "dataset_type": "Tabular",
+    "output_format": "csv",
+    "num_samples": 10,
+}
+
+
+class TestCatalogWarmer:
+    """Test cases for CatalogWarmer."""
+
+    def setup_method(self):
+        """Set up a catalog and a generator that writes a small CSV."""
+        self.root = tempfile.mkdtemp()
+        self.catalog = os.path.join(self.root, "catalog.json")
+        with open(self.catalog, "w", encoding="utf-8") as f:
+            json.dump({"jobs": [SPEC]}, f)
+
+        self.generator = MagicMock(output_dir=self.root)
+        self.generator.workspace_for.side_effect = lambda job_id: workspace_path(
+            self.root, job_id
+        )
+        self.generator.generate_dataset.side_effect = self.generate_dataset
+        self.warmer = CatalogWarmer(
+            self.generator, FairScheduler(weights={}), catalog_path=self.catalog
+        )
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def generate_dataset(self, job_id, **spec):
+        """Write a finished job the way DataGen does."""
+        workspace = workspace_path(self.root, job_id)
+        os.makedirs(workspace)
+        file_path = os.path.join(workspace, "stocks.csv")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("ticker,close\nABC,1.5\n")
+        write_manifest(workspace, job_id, spec=spec)
+        return file_path
+
+    def test_warmed_spec_is_served(self):
+        """Test a similar request gets a copy of the warmed files."""
+        assert self.warmer.warm_catalog() == 1
+
+        entry = self.warmer.lookup(
+            "stock price with date ticker open close volume", "Tabular", "CSV", 10
+        )
+        file_path, manifest = self.warmer.serve(entry, "0123456789abcdef")
+
+        assert file_path == os.path.join(self.root, "0123456789abcdef", "stocks.csv")
+        with open(file_path, encoding="utf-8") as f:
+            assert f.read() == "ticker,close\nABC,1.5\n"
+        assert [f["name"] for f in manifest["files"]] == ["stocks.csv"]
+        assert read_manifest(os.path.dirname(file_path))["spec"] == SPEC
+
+    def test_other_requests_miss(self):
+        """Test requests that differ in problem or size aren't served."""
+        self.warmer.warm_catalog()
+
+        assert self.warmer.lookup("Customer reviews", "Tabular", "csv", 10) is None
+        assert (
+            self.warmer.lookup(SPEC["business_problem"], "Tabular", "csv", 50) is None
+        )
+
+    def test_fresh_specs_are_not_rewarmed(self):
+        """Test a pass skips specs warmed within the refresh interval."""
+        self.warmer.warm_catalog()
+        assert self.warmer.warm_catalog() == 0
+        assert self.generator.generate_dataset.call_count == 1
+
+    def test_refresh_replaces_the_old_output(self):
+        """Test rewarming a spec deletes the files it replaces."""
+        self.warmer.refresh_seconds = 0
+        self.warmer.warm_catalog()
+        old = next(iter(self.warmer.entries.values()))["workspace"]
+
+        self.warmer.warm_catalog()
+
+        assert not os.path.exists(old)
+        assert len(self.warmer.entries) == 1
+
+    def test_failed_spec_is_not_warmed(self):
+        """Test a spec that fails to generate leaves nothing behind."""
+        self.generator.generate_dataset.side_effect = RuntimeError("boom")
+
+        assert self.warmer.warm_catalog() == 0
+        assert self.warmer.entries == {}
+        assert os.listdir(self.root) == ["catalog.json"]
+
+    def test_warming_waits_for_live_jobs(self):
+        """Test warming doesn't start while a live job holds a slot."""
+        ticket = self.warmer.scheduler.acquire("someone", 1)
+        self.warmer._stop.set()
+
+        assert self.warmer.warm_catalog() == 0
+        self.warmer.scheduler.release(ticket)
+        self.generator.generate_dataset.assert_not_called()
@@ -0,0 +1,102 @@
+"""Tests for the queue worker."""
+
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+from src.cancellation import JobCancelled
+from src.store import DONE, QUEUED, RUNNING, LocalArtifactStore, SQLiteJobStore
+from src.worker import Heartbeat, QueueWorker
+
+
+class TestQueueWorker:
+    """Test cases for claiming, running and reaping queued jobs."""
+
+    def setup_method(self):
+        """Create stores in a temporary directory and a fake generator."""
+        self.root = tempfile.mkdtemp()
+        self.job_store = SQLiteJobStore(os.path.join(self.root, "jobs.sqlite3"))
+        self.artifact_store = LocalArtifactStore(self.root)
+        self.generator = MagicMock()
+        self.generator.generate_dataset.side_effect = self.write_dataset
+
+    def teardown_method(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_dataset(self, job_id, **kwargs):
+        """Write a small dataset into the job's workspace."""
+        workspace = self.artifact_store.workspace(job_id)
+        os.makedirs(workspace, exist_ok=True)
+        path = os.path.join(workspace, "data.csv")
+        with open(path, "w") as f:
+            f.write("id\n1\n")
+        return path
+
+    def worker(self, worker_id="w1"):
+        """Build a worker on the test stores."""
+        return QueueWorker(
+            self.generator, self.job_store, self.artifact_store, worker_id
+        )
+
+    def test_runs_queued_job(self):
+        """Test a queued job is claimed, run with its spec and completed."""
+        self.job_store.create_job("a", {"num_samples": 10})
+
+        job = self.worker().run_once()
+
+        assert job["status"] == DONE
+        assert job["result"]["file_path"].endswith("data.csv")
+        assert self.generator.generate_dataset.call_args[1]["num_samples"] == 10
+        assert self.worker().run_once() is None
+
+    @patch("src.worker.JOB_LEASE_SECONDS", 0.01)
+    def test_job_of_a_dead_worker_is_run_again(self):
+        """Test a claim whose lease ran out is requeued and picked up."""
+        self.job_store.create_job("a", {})
+        self.job_store.claim_job("dead-worker")
+        time.sleep(0.05)
+
+        job = self.worker("w2").run_once()
+
+        assert job["status"] == DONE
+        assert job["worker_id"] == "w2"
+        assert job["attempts"] == 2
+
+    @patch("src.worker.JOB_HEARTBEAT_SECONDS", 0.02)
+    def test_lost_lease_cancels_the_job(self):
+        """Test a worker whose job was taken over stops and leaves it alone."""
+        self.job_store.create_job("a", {})
+        self.artifact_store = MagicMock(wraps=self.artifact_store)
+
+        def generate_dataset(cancel_token, job_id, **kwargs):
+            # Another worker reaps and claims the job meanwhile
+            self.job_store.reap_stale_jobs(-1)
+            self.job_store.claim_job("w2")
+            deadline = time.monotonic() + 5
+            while not cancel_token.cancelled and time.monotonic() < deadline:
+                time.sleep(0.01)
+            raise JobCancelled()
+
+        self.generator.generate_dataset.side_effect = generate_dataset
+
+        job = self.worker().run_once()
+
+        assert job["status"] == RUNNING
+        assert job["worker_id"] == "w2"
+        self.artifact_store.delete.assert_not_called()
+
+    @patch("src.worker.JOB_HEARTBEAT_SECONDS", 0.02)
+    def test_heartbeat_keeps_the_lease(self):
+        """Test a job with a live heartbeat is never reaped."""
+        self.job_store.create_job("a", {}, status=RUNNING, worker_id="web-1")
+
+        with Heartbeat(self.job_store, "a", "web-1"):
+            for _ in range(5):
+                time.sleep(0.05)
+                assert self.job_store.reap_stale_jobs(0.2) == []
+
+        time.sleep(0.25)
+        assert self.job_store.reap_stale_jobs(0.2) == ["a"]
+        assert self.job_store.get_job("a")["status"] != QUEUED
@@ -0,0 +1,68 @@
+"""Tests for per-job workspaces."""
+
+import os
+import shutil
+import tempfile
+from src.workspace import (
+    artifact_paths,
+    create_workspace,
+    new_job_id,
+    read_manifest,
+    remove_workspace,
+    save_script,
+    write_manifest,
+)
+
+
+class TestWorkspace:
+    """Test cases for workspace helpers."""
+
+    def setup_method(self):
+        """Create a temporary root directory."""
+        self.root = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Remove the temporary root directory."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_job_ids_are_unique(self):
+        """Test job identifiers don't repeat."""
+        assert len({new_job_id() for _ in range(1000)}) == 1000
+
+    def test_manifest_lists_only_artifacts(self):
+        """Test the manifest skips the script, previews and itself."""
+        workspace = create_workspace(self.root, "job1")
+        save_script(workspace, "print(1)")
+        for name in ("b.csv", "a.csv", "a_preview.csv"):
+            with open(os.path.join(workspace, name), "w") as f:
+                f.write("id\n1\n")
+
+        manifest = write_manifest(workspace, "job1", source="test")
+
+        assert manifest["job_id"] == "job1"
+        assert manifest["source"] == "test"
+        assert manifest["files"] == [
+            {"name": "a.csv", "size": 5},
+            {"name": "b.csv", "size": 5},
+        ]
+        assert read_manifest(workspace) == manifest
+        assert artifact_paths(workspace) == [
+            os.path.join(workspace, "a.csv"),
+            os.path.join(workspace, "b.csv"),
+        ]
+
+    def test_unfinished_job_has_no_manifest(self):
+        """Test a workspace without a manifest reads as None."""
+        workspace = create_workspace(self.root, "job2")
+        assert read_manifest(workspace) is None
+        assert artifact_paths(workspace) == []
+
+    def test_remove_workspace(self):
+        """Test a job's artifacts are removed in one operation."""
+        workspace = create_workspace(self.root, "job3")
+        open(os.path.join(workspace, "data.csv"), "w").close()
+
+        remove_workspace(workspace)
+        remove_workspace(workspace)  # Removing twice is harmless
+
+        assert not os.path.exists(workspace)